@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# A content-addressed store of per-package install trees. Each entry is keyed on a fingerprint of
+# everything that goes into building the package (its config.json entry, its patches, its build
+# recipe, the toolchain, and the fingerprints of the packages it depends on), so a package whose
+# inputs have not changed can be restored into the LibPack instead of being rebuilt.
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+from typing import Dict, List, Optional, Tuple
+
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def fingerprint(inputs: dict) -> str:
+    """A stable hash of a JSON-serializable description of a package's build inputs."""
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """The sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot(root: str) -> Snapshot:
+    """Record the size and modification time of every file under root, keyed by relative path."""
+    result: Snapshot = {}
+    if not os.path.isdir(root):
+        return result
+    for dirpath, _dirs, files in os.walk(root):
+        for name in files:
+            full = os.path.join(dirpath, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            result[os.path.relpath(full, root)] = (st.st_size, st.st_mtime_ns)
+    return result
+
+
+def changed_files(before: Snapshot, after: Snapshot) -> List[str]:
+    """The relative paths that were created or modified between two snapshots of the same tree."""
+    return sorted(path for path, stat in after.items() if before.get(path) != stat)
+
+
+def describe_changes(old: dict, new: dict) -> str:
+    """A short human-readable account of why two sets of build inputs differ, for example
+    "changed ref, dependency zlib changed"."""
+    reasons = []
+    old_entry, new_entry = old.get("entry", {}), new.get("entry", {})
+    source_keys = ("git-repo", "git-ref", "git-hash", "url", "url-x64", "url-ARM64")
+    if any(old_entry.get(k) != new_entry.get(k) for k in ("git-ref", "git-hash")):
+        reasons.append("changed ref")
+    if any(
+        old_entry.get(k) != new_entry.get(k) for k in ("git-repo", "url", "url-x64", "url-ARM64")
+    ):
+        reasons.append("changed source URL")
+    others = (set(old_entry) | set(new_entry)) - set(source_keys) - {"patches"}
+    if any(old_entry.get(k) != new_entry.get(k) for k in others):
+        reasons.append("changed config.json entry")
+    if old.get("patches") != new.get("patches"):
+        reasons.append("changed patch")
+    if old.get("recipe") != new.get("recipe"):
+        reasons.append("changed build recipe")
+    if old.get("toolchain") != new.get("toolchain"):
+        reasons.append("changed toolchain")
+    old_deps, new_deps = old.get("dependencies", {}), new.get("dependencies", {})
+    for dep in sorted(set(old_deps) | set(new_deps)):
+        if old_deps.get(dep) != new_deps.get(dep):
+            reasons.append(f"dependency {dep} changed")
+    return ", ".join(reasons) or "changed build inputs"
+
+
+class BuildCache:
+    """The on-disk cache. Each entry lives in <root>/<package>/<fingerprint>/ and contains the
+    files the package installed (under files/) plus a manifest.json listing them."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _entry_dir(self, name: str, key: str) -> str:
+        return os.path.join(self.root, name, key)
+
+    def contains(self, name: str, key: str) -> bool:
+        return os.path.exists(os.path.join(self._entry_dir(name, key), "manifest.json"))
+
+    def save(self, name: str, key: str, install_dir: str, files: List[str], inputs: dict):
+        """Copy the given files (relative to install_dir) into a new cache entry. The entry is
+        assembled in a temporary directory and renamed into place, so an interrupted save never
+        leaves behind an entry that looks complete."""
+        entry = self._entry_dir(name, key)
+        staging = entry + ".tmp"
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        files_dir = os.path.join(staging, "files")
+        os.makedirs(files_dir)
+        for relative in files:
+            source = os.path.join(install_dir, relative)
+            if not os.path.isfile(source):
+                continue
+            target = os.path.join(files_dir, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+        with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": name, "fingerprint": key, "files": files, "inputs": inputs}, f)
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.replace(staging, entry)
+
+    def restore(self, name: str, key: str, install_dir: str) -> List[str]:
+        """Copy a cached install tree into install_dir. Returns the relative paths restored."""
+        entry = self._entry_dir(name, key)
+        with open(os.path.join(entry, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        files_dir = os.path.join(entry, "files")
+        restored = []
+        for relative in manifest["files"]:
+            source = os.path.join(files_dir, relative)
+            if not os.path.isfile(source):
+                continue
+            target = os.path.join(install_dir, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.exists(target):
+                os.chmod(target, stat.S_IWRITE)
+            shutil.copy2(source, target)
+            restored.append(relative)
+        return restored
+
+
+class InstallState:
+    """Which fingerprint of each package is currently installed in a LibPack directory. Stored in
+    a JSON file beside (not inside) the LibPack so that it is never shipped."""
+
+    def __init__(self, install_dir: str):
+        self.path = os.path.abspath(install_dir) + ".packages.json"
+        self.packages: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.packages = json.load(f)
+
+    def installed(self, name: str) -> Optional[str]:
+        return self.packages.get(name, {}).get("fingerprint")
+
+    def record(self, name: str, key: str, inputs: dict):
+        self.packages[name] = {"fingerprint": key, "inputs": inputs}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.packages, f, indent="    ")
+        os.replace(temp_path, self.path)
+
+
+def merge_tree(staging_root: str, install_dir: str) -> List[str]:
+    """Move every file under staging_root to the same relative path under install_dir, replacing
+    whatever is there, and return the relative paths moved. The staging root is expected to be on
+    the same volume as install_dir, so each file is renamed rather than copied."""
+    moved = []
+    for dirpath, _dirs, files in os.walk(staging_root):
+        for name in files:
+            source = os.path.join(dirpath, name)
+            relative = os.path.relpath(source, staging_root)
+            target = os.path.join(install_dir, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.exists(target):
+                os.chmod(target, stat.S_IWRITE)
+            os.replace(source, target)
+            moved.append(relative)
+    return sorted(moved)
+
+
+class FileIndex:
+    """Which package installed each file in a LibPack directory, keyed by path relative to the
+    LibPack. Stored in a JSON file beside the LibPack, like InstallState. A file installed by more
+    than one package belongs to the last one to install it."""
+
+    def __init__(self, install_dir: str):
+        self.install_dir = os.path.abspath(install_dir)
+        self.path = self.install_dir + ".files.json"
+        self.owners: Dict[str, str] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.owners = json.load(f)
+
+    def files_of(self, name: str) -> List[str]:
+        return sorted(path for path, owner in self.owners.items() if owner == name)
+
+    def claim(self, name: str, files: List[str]) -> List[Tuple[str, str]]:
+        """Make name the owner of exactly these files, in place of whatever it owned before, and
+        save the index. Returns (path, previous owner) for each file taken over from another
+        package."""
+        taken = [(path, self.owners[path]) for path in files if self.owners.get(path, name) != name]
+        for path in self.files_of(name):
+            del self.owners[path]
+        for path in files:
+            self.owners[path] = name
+        self.save()
+        return taken
+
+    def uninstall(self, name: str) -> int:
+        """Delete the files name owns from the LibPack, along with any directories that leaves
+        empty, and forget them. Returns the number of files deleted. The index is not saved: the
+        package is being rebuilt, and claiming its new files saves it (this also keeps package
+        builds running in worker processes from writing the index)."""
+        removed = 0
+        directories = set()
+        for relative in self.files_of(name):
+            del self.owners[relative]
+            path = os.path.join(self.install_dir, relative)
+            if os.path.isfile(path):
+                os.chmod(path, stat.S_IWRITE)
+                os.remove(path)
+                removed += 1
+            directories.add(os.path.dirname(path))
+        for directory in sorted(directories, key=len, reverse=True):
+            while directory.startswith(self.install_dir + os.sep):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+        return removed
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.owners, f, indent="    ", sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# The dependency graph between LibPack components, as declared by the "depends" field of each
+# entry in config.json, and a small scheduler that runs independent components concurrently.
+
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+import heapq
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+
+class BuildGraph:
+    """The components of a LibPack and the components each one needs installed before it can be
+    built. An entry that declares no "depends" field is conservatively assumed to depend on every
+    entry listed above it, which is exactly the guarantee the strictly sequential build has always
+    provided, so configuration files written before the field existed keep building correctly."""
+
+    def __init__(self, content: List[dict]):
+        self.order: List[str] = [item["name"] for item in content]
+        self.dependencies: Dict[str, Set[str]] = {}
+        self.dependents: Dict[str, Set[str]] = {name: set() for name in self.order}
+        seen: List[str] = []
+        for item in content:
+            name = item["name"]
+            if name in self.dependencies:
+                raise ValueError(f"config.json lists '{name}' more than once")
+            if "depends" in item:
+                deps = set(item["depends"])
+            else:
+                deps = set(seen)
+            unknown = deps - set(self.order)
+            if unknown:
+                raise ValueError(
+                    f"'{name}' depends on unknown package(s): {', '.join(sorted(unknown))}"
+                )
+            if name in deps:
+                raise ValueError(f"'{name}' cannot depend on itself")
+            # Requiring dependencies to be listed first keeps the top-to-bottom order of
+            # config.json a valid build order, so the sequential build remains correct and no
+            # cycle can be expressed.
+            later = deps - set(seen)
+            if later:
+                raise ValueError(
+                    f"'{name}' depends on {', '.join(sorted(later))}, which must be listed above "
+                    "it in config.json"
+                )
+            self.dependencies[name] = deps
+            for dep in deps:
+                self.dependents[dep].add(name)
+            seen.append(name)
+
+    def with_dependents(self, names: Set[str]) -> Set[str]:
+        """The given packages plus everything that depends on them, directly or transitively."""
+        result = set(names)
+        pending = list(names)
+        while pending:
+            for dependent in self.dependents[pending.pop()]:
+                if dependent not in result:
+                    result.add(dependent)
+                    pending.append(dependent)
+        return result
+
+    def ready(self, done: Set[str], started: Set[str]) -> List[str]:
+        """Packages that have not been started yet and whose dependencies are all done, in
+        config.json order."""
+        return [
+            name for name in self.order if name not in started and self.dependencies[name] <= done
+        ]
+
+    def bottom_levels(self, durations: Dict[str, float]) -> Dict[str, float]:
+        """For each package, the length of the longest chain of package durations from the start
+        of that package to the end of the build, the package itself included. Scheduling the
+        package with the highest value first keeps the critical path moving."""
+        levels: Dict[str, float] = {}
+        for name in reversed(self.order):
+            tail = max((levels[dependent] for dependent in self.dependents[name]), default=0.0)
+            levels[name] = durations.get(name, 0.0) + tail
+        return levels
+
+    def critical_path(self, durations: Dict[str, float]) -> List[str]:
+        """The longest chain of dependent packages, by total duration. No build can finish
+        sooner than the sum of its durations, however many cores are available."""
+        if not self.order:
+            return []
+        levels = self.bottom_levels(durations)
+        name = max(self.order, key=lambda n: levels[n])
+        path = [name]
+        while self.dependents[name]:
+            name = max(sorted(self.dependents[name], key=self.order.index), key=lambda n: levels[n])
+            path.append(name)
+        return path
+
+    def simulate(
+        self,
+        durations: Dict[str, float],
+        max_parallel: int,
+        priority: Optional[Dict[str, float]] = None,
+    ) -> float:
+        """The wall-clock time run_graph would take with the given durations and priorities."""
+        done: Set[str] = set()
+        started: Set[str] = set()
+        running: List[Tuple[float, int, str]] = []
+        now = 0.0
+        while True:
+            for name in _by_priority(self.ready(done, started), priority):
+                if len(running) >= max(1, max_parallel):
+                    break
+                started.add(name)
+                heapq.heappush(
+                    running, (now + durations.get(name, 0.0), self.order.index(name), name)
+                )
+            if not running:
+                return now
+            now, _, name = heapq.heappop(running)
+            done.add(name)
+
+
+def _by_priority(names: List[str], priority: Optional[Dict[str, float]]) -> List[str]:
+    """Highest priority first, keeping config.json order between equal priorities."""
+    if priority is None:
+        return names
+    return sorted(names, key=lambda name: -priority.get(name, 0.0))
+
+
+def run_graph(
+    graph: BuildGraph,
+    launch: Callable[[str], Future],
+    max_parallel: int,
+    on_success: Optional[Callable[[str], None]] = None,
+    priority: Optional[Dict[str, float]] = None,
+    gate: Optional[Callable[[str], Optional[Future]]] = None,
+) -> List[Tuple[str, BaseException]]:
+    """Launch every package in the graph as soon as all of its dependencies have finished, with at
+    most max_parallel packages in flight at once. launch(name) must start the work and return a
+    Future for it; on_success(name), if given, is called from the scheduling thread as each package
+    completes successfully, before any of its dependents are launched. Among the packages that are
+    ready, those with the highest priority (if given) start first. If gate is given, gate(name)
+    returns a Future that must complete before the package can start, or None if it can start at
+    once (create_libpack.py --pipeline gates each package on its sources): a package whose gate is
+    still open is passed over in favor of the other ready packages until it completes. After the
+    first failure no new packages are started, but the ones already running are allowed to finish.
+    Returns a list of (name, exception) for every failed package, which is empty on success."""
+    done: Set[str] = set()
+    started: Set[str] = set()
+    running: Dict[Future, str] = {}
+    gates: Dict[str, Optional[Future]] = {}
+    failures: List[Tuple[str, BaseException]] = []
+    max_parallel = max(1, max_parallel)
+    while True:
+        waiting = []
+        if not failures:
+            for name in _by_priority(graph.ready(done, started), priority):
+                if len(running) >= max_parallel:
+                    break
+                if gate is not None:
+                    if name not in gates:
+                        gates[name] = gate(name)
+                    if gates[name] is not None and not gates[name].done():
+                        waiting.append(gates[name])
+                        continue
+                started.add(name)
+                running[launch(name)] = name
+        if not running and not waiting:
+            break
+        finished, _ = wait([*running, *waiting], return_when=FIRST_COMPLETED)
+        for future in finished:
+            if future not in running:
+                continue  # A gate, which lets its package start on the next pass
+            name = running.pop(future)
+            error: Optional[BaseException] = future.exception()
+            if error is None:
+                if on_success is not None:
+                    on_success(name)
+                done.add(name)
+            else:
+                failures.append((name, error))
+    return failures
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# A record of how far each package's build got, so that a build that was interrupted (a crash, a
+# reboot, a failed install step) can pick up where it left off rather than wiping the package's
+# build directory and starting over from configure.
+
+import json
+import os
+from typing import List, Optional
+
+
+class BuildJournal:
+    """One JSON file per package in a journal directory, listing the steps of that package's build
+    that have completed, in order, together with the fingerprint of the package's build inputs.
+    A package's entry exists only while its build is in progress or after it was interrupted: it
+    is removed once the package builds successfully. An entry whose fingerprint does not match the
+    current inputs is ignored, so nothing is ever resumed from a build of different sources."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name + ".json")
+
+    def completed_steps(self, name: str, fingerprint: str) -> Optional[List[str]]:
+        """The steps an interrupted build of this package with the same fingerprint completed, or
+        None if there is no such interrupted build."""
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("fingerprint") != fingerprint:
+            return None
+        return list(entry.get("steps", []))
+
+    def record(self, name: str, fingerprint: str, steps: List[str]):
+        """Replace the package's entry. Written to a temporary file and renamed into place, so an
+        interruption never leaves a truncated journal behind."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(name)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "steps": steps}, f, indent="    ")
+        os.replace(temp_path, path)
+
+    def clear(self, name: str):
+        if os.path.exists(self._path(name)):
+            os.remove(self._path(name))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# Writing the output of build commands to log files. By default each command's output is appended
+# to a plain text log beside the package's sources (build_log.txt, pip_log.txt, configure_log.txt),
+# as it always has been. With a LogStore, output goes instead to gzip-compressed logs, one per
+# package, build phase and run, with an index of where each command's section starts, and only the
+# logs of the most recent runs are kept.
+
+from contextlib import contextmanager
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Iterator, List, Optional
+
+
+class LogWriter:
+    """Appends lines to a log file from a background thread, writing whatever has accumulated since
+    the previous write in one batch, so that neither a slow disk nor a flush per line holds up the
+    command whose output is being logged. A plain log is flushed after every batch. A compressed
+    log is written as one gzip member, flushed at most once every FLUSH_INTERVAL seconds (each
+    flush costs compression), and offset and length give where in the file the member is. At most
+    QUEUE_SIZE lines wait to be written, after which write() waits for the thread to catch up. If
+    writing fails, the rest of the output is discarded and the error raised on leaving the with
+    block."""
+
+    FLUSH_INTERVAL = 1.0
+    QUEUE_SIZE = 10000
+
+    def __init__(self, filename: str, compressed: bool = False):
+        self.filename = filename
+        self._compressed = compressed
+        if compressed:
+            self._raw = open(filename, "ab")
+            self.offset = self._raw.tell()
+            self._file = io.TextIOWrapper(
+                gzip.GzipFile(fileobj=self._raw, mode="wb"), encoding="utf-8"
+            )
+        else:
+            self._raw = None
+            self.offset = 0
+            self._file = open(filename, "a", encoding="utf-8")
+        self.length = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._write_batches, daemon=True)
+        self._thread.start()
+
+    def write(self, line: str):
+        self._queue.put(line)
+
+    def _write_batches(self):
+        last_flush = 0.0
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if self._error is not None:
+                continue  # Keep emptying the queue, so that write() never waits forever
+            try:
+                self._file.write("".join(batch))
+                if not self._compressed or time.monotonic() - last_flush >= self.FLUSH_INTERVAL:
+                    self._file.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                self._error = e
+
+    def __enter__(self) -> "LogWriter":
+        return self
+
+    def __exit__(self, *_):
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self._file.close()
+        except OSError:
+            if self._error is None:
+                raise
+        finally:
+            if self._raw is not None:
+                self.length = self._raw.tell() - self.offset
+                self._raw.close()
+        if self._error is not None:
+            raise self._error
+
+
+class LogStore:
+    """Compressed logs under a root directory, laid out as <package>/<run>-<phase>.log.gz, where
+    run is the time the build started, plus a <package>/index.json listing each command's section:
+    its run, phase, file, the offset and length of its gzip member, the command line, and when it
+    started and how long it took. Each section can be read on its own with read_section. Only the
+    logs of the retention most recent runs of each package are kept."""
+
+    def __init__(self, root: str, retention: int = 5, run: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.retention = max(1, retention)
+        self.run = run or time.strftime("%Y%m%d-%H%M%S")
+
+    @contextmanager
+    def section(self, package: str, phase: str, command: str) -> Iterator[LogWriter]:
+        """A LogWriter for the output of one command run as part of building package, which is
+        added to the index once the command's output is complete."""
+        directory = os.path.join(self.root, package)
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{self.run}-{phase}.log.gz"
+        start = time.time()
+        writer = LogWriter(os.path.join(directory, filename), compressed=True)
+        try:
+            with writer:
+                yield writer
+        finally:
+            self._record(
+                directory,
+                {
+                    "run": self.run,
+                    "phase": phase,
+                    "file": filename,
+                    "offset": writer.offset,
+                    "length": writer.length,
+                    "command": command,
+                    "start": start,
+                    "seconds": time.time() - start,
+                },
+            )
+
+    def _record(self, directory: str, entry: dict):
+        index_path = os.path.join(directory, "index.json")
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index: List[dict] = json.load(f)
+        except (OSError, ValueError):
+            index = []
+        index.append(entry)
+        keep = set(sorted({e["run"] for e in index})[-self.retention :])
+        for filename in os.listdir(directory):
+            run = filename.rsplit("-", 1)[0]
+            if filename.endswith(".log.gz") and run not in keep:
+                os.remove(os.path.join(directory, filename))
+        index = [e for e in index if e["run"] in keep]
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+
+
+def read_section(path: str, offset: int) -> str:
+    """The text of the one gzip member of a compressed log starting at offset."""
+    decompressor = zlib.decompressobj(wbits=31)
+    chunks = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while not decompressor.eof:
+            data = f.read(1 << 16)
+            if not data:
+                break
+            chunks.append(decompressor.decompress(data))
+    return b"".join(chunks).decode("utf-8", errors="replace")
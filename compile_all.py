@@ -6,10 +6,16 @@
 # build script for each one.
 
 from diff_match_patch import diff_match_patch
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
 from enum import Enum
+import functools
 import glob
+import hashlib
+import inspect
 import os
 import pathlib
 import platform
@@ -19,6 +25,15 @@ import subprocess
 import stat
 import sys
 
+import build_cache
+import build_logs
+from build_journal import BuildJournal
+from build_graph import BuildGraph, run_graph
+import jobserver
+import source_store
+import timeline
+import unified_patch
+
 # Pip requirements skipped in Debug mode because their PyPI distribution is a release-ABI
 # wheel (cp3XX) that cannot install against the Py_DEBUG (cp3XXd) interpreter. These will
 # be source-built against the debug Python in a later phase (debug_build_plan.md Phase 3).
@@ -184,15 +199,28 @@ def remove_readonly(func, path, _) -> None:
     func(path)
 
 
+def patch_text(filename: str, text: str, data: str) -> Tuple[str, List[str]]:
+    """Apply the patch data for one file to its text, returning the patched text and a
+    description of every hunk that did not apply."""
+    dmp = diff_match_patch()
+    patches = dmp.patch_fromText(data)
+    new_text, applied = dmp.patch_apply(patches, text)
+    failed = [
+        f"{filename}: hunk {index} of {len(patches)} ({str(patch).splitlines()[0]})"
+        for index, (patch, ok) in enumerate(zip(patches, applied), start=1)
+        if not ok
+    ]
+    return new_text, failed
+
+
 def patch_single_file(filename, patch_data) -> None:
     with open(filename, "r", encoding="utf-8") as f:
         original_data = f.read()
-    dmp = diff_match_patch()
-    patches = dmp.patch_fromText(patch_data)
-    new_text, applied = dmp.patch_apply(patches, original_data)
-    if not all(applied):
+    new_text, failed = patch_text(filename, original_data, patch_data)
+    if failed:
         print(f"ERROR: Failed to apply some patches to {filename}")
-        # TODO: Someday actually print out what patches failed?
+        for hunk in failed:
+            print(f"  {hunk}")
         exit(1)
     with open(filename, "w", encoding="utf-8") as f:
         f.write(new_text)
@@ -215,24 +243,89 @@ def split_patch_data(patch_data: str) -> List[Dict[str, str]]:
     return result
 
 
-def apply_patch(patch_file_path: str) -> None:
-    """Apply a patch that was generated by the generate_patch.py script"""
+def _file_patches(patch_file_path: str) -> List[Tuple[str, bool, Callable]]:
+    """Read a patch file, in either the format generated by the generate_patch.py script or as a
+    unified diff, and split it by file: a list of (path, creates, apply), where creates is set for
+    a file the patch adds, and apply(text) returns the patched text and the hunks that failed."""
     # Path is relative to *this* file, not our working directory
     absolute_path = os.path.join(pathlib.Path(__file__).parent.absolute(), patch_file_path)
     with open(absolute_path, "r", encoding="utf-8") as f:
         patch_data = f.read()
-    patches = split_patch_data(patch_data)
-    for patch in patches:
-        patch_single_file(patch["file"], patch["data"])
+    if not unified_patch.is_unified(patch_data):
+        return [
+            (entry["file"], False, functools.partial(patch_text, entry["file"], data=entry["data"]))
+            for entry in split_patch_data(patch_data)
+        ]
+    try:
+        files = unified_patch.parse(patch_data)
+    except ValueError as e:
+        print(f"ERROR: Bad patch file {patch_file_path}: {e}")
+        exit(1)
+    return [(fp.path, fp.creates, functools.partial(unified_patch.apply, fp)) for fp in files]
 
 
-def patch_files(patches: List[str]) -> None:
-    """Given a list of patches, apply them sequentially in the current working directory. The patches themselves are
-    expected to be given as paths relative to **this** Python script file"""
+def apply_patch(patch_file_path: str, root: str = ".") -> None:
+    """Apply a patch to the tree at root. The patch is either one generated by the generate_patch.py script, or a
+    unified diff (as output by git diff), which is applied line by line and is much faster on large files.
+    """
+    for path, creates, apply in _file_patches(patch_file_path):
+        filename = os.path.join(root, path)
+        if creates and not os.path.exists(filename):
+            original_data = ""
+        else:
+            with open(filename, "r", encoding="utf-8") as f:
+                original_data = f.read()
+        new_text, failed = apply(original_data)
+        if failed:
+            print(f"ERROR: Failed to apply some patches to {filename}")
+            for hunk in failed:
+                print(f"  {hunk}")
+            exit(1)
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(new_text)
+
+
+def check_patches(patches: List[str], root: str = ".") -> List[str]:
+    """Dry-run a list of patches against the tree at root without changing it, returning a
+    description of every file and hunk that would fail to apply. The patches are applied to an
+    in-memory copy of each file in turn, so a patch that builds on an earlier one is checked
+    against the result of that earlier one."""
+    texts: Dict[str, str] = {}
+    problems = []
+    for patch in patches:
+        for path, creates, apply in _file_patches(patch):
+            filename = os.path.join(root, path)
+            if filename not in texts:
+                try:
+                    with open(filename, "r", encoding="utf-8") as f:
+                        texts[filename] = f.read()
+                except OSError:
+                    if not creates:
+                        problems.append(f"{patch}: {path} does not exist")
+                        continue
+                    texts[filename] = ""
+            texts[filename], failed = apply(texts[filename])
+            problems.extend(f"{patch}: {hunk}" for hunk in failed)
+    return problems
+
+
+def patch_files(patches: List[str], root: str = ".") -> None:
+    """Given a list of patches, apply them sequentially to the tree at root (by default the current working
+    directory). The patches themselves are expected to be given as paths relative to **this** Python script file.
+    All of them are checked first (see check_patches), and if any would fail, every failing file and hunk is
+    reported and nothing is changed.
+    """
+    problems = check_patches(patches, root)
+    if problems:
+        print(f"ERROR: {len(problems)} patch hunk(s) do not apply to {root}:")
+        for problem in problems:
+            print(f"  {problem}")
+        exit(1)
     for patch in patches:
         start = len("patches/")
         print(f"  Applying patch {patch[start:]}")
-        apply_patch(patch)
+        apply_patch(patch, root)
 
 
 def libpack_arch_label() -> str:
@@ -276,7 +369,111 @@ def to_dynamic(base: str = ""):
     return base + ".dll" if sys.platform.startswith("win32") else ".so"
 
 
+def _build_package_in_worker(
+    compiler: "Compiler", item: dict, force: bool = False
+) -> Tuple[List[dict], List[str]]:
+    """Entry point for a package build running in a scheduler worker process. Returns the timeline
+    events recorded by the build and the files it merged into the LibPack from its staging root;
+    if the build fails the events are attached to the exception instead."""
+    try:
+        compiler.build_package(item, force)
+    except BaseException as e:
+        e.timeline_events = timeline.take()
+        raise
+    finally:
+        sys.stdout.flush()
+    return timeline.take(), compiler._staged_files
+
+
+def _merge_worker_timeline(future: Future):
+    """Done-callback that adds a worker's timeline events to this process's timeline."""
+    error = future.exception()
+    timeline.merge(future.result()[0] if error is None else getattr(error, "timeline_events", []))
+
+
+# How much of a command's output _run_streaming keeps in memory, to attach to the error if the
+# command fails. The full output is always in the command's log file.
+STREAMING_TAIL_LINES = 2000
+STREAMING_TAIL_CHARS = 1 << 20
+
+
+class _TailBuffer:
+    """The last lines appended to it, up to a maximum number of lines and of characters."""
+
+    def __init__(self, max_lines: int, max_chars: int):
+        self._lines: Deque[str] = deque()
+        self._chars = 0
+        self._max_lines = max_lines
+        self._max_chars = max_chars
+        self.dropped = 0
+
+    def append(self, line: str):
+        self._lines.append(line)
+        self._chars += len(line)
+        while len(self._lines) > self._max_lines or (
+            self._chars > self._max_chars and len(self._lines) > 1
+        ):
+            self._chars -= len(self._lines.popleft())
+            self.dropped += 1
+
+    def text(self) -> str:
+        return "".join(self._lines)
+
+
 class Compiler:
+    # For each package, the file or directory (relative to the install directory) whose presence
+    # shows the package is already in the LibPack, and that the build methods check when
+    # skip_existing is in effect. Packages whose check is not a single path (Python, Boost) are
+    # handled by _sentinel_path.
+    _SKIP_SENTINELS = {
+        "libiconv": ("include", "iconv.h"),
+        "libxml2": ("include", "libxml2", "libxml", "xmlversion.h"),
+        "libxslt": ("include", "libxslt", "xslt.h"),
+        "libjpeg": ("include", "jpeglib.h"),
+        "openblas": ("include", "openblas", "cblas.h"),
+        "qt": ("metatypes",),
+        "zlib": ("include", "zlib.h"),
+        "bzip2": ("include", "bzlib.h"),
+        "expat": ("include", "expat.h"),
+        "pcre2": ("include", "pcre2.h"),
+        "swig": ("bin", "swig" + to_exe()),
+        "pyside": ("bin", "Lib", "site-packages", "PySide6"),
+        "vtk": ("share", "licenses", "VTK"),
+        "harfbuzz": ("include", "harfbuzz"),
+        "libpng": ("lib", "libpng"),
+        "zstd": ("include", "zstd.h"),
+        "pybind11": ("include", "pybind11"),
+        "freetype": ("include", "freetype2"),
+        "tcl": ("include", "tcl.h"),
+        "tk": ("include", "tk.h"),
+        "opencascade": ("cmake", "OpenCASCADEConfig.cmake"),
+        "netgen": ("share", "netgen"),
+        "hdf5": ("include", "hdf5.h"),
+        "medfile": ("include", "medfile.h"),
+        "gmsh": ("bin", "gmsh" + to_exe()),
+        "pycxx": ("bin", "Lib", "site-packages", "CXX"),
+        "icu": ("include", "unicode"),
+        "xercesc": ("include", "xercesc"),
+        "libfmt": ("include", "fmt"),
+        "eigen3": ("include", "eigen3"),
+        "yamlcpp": ("include", "yaml-cpp"),
+        "cpptrace": ("include", "cpptrace"),
+        "calculix": ("bin", "ccx.exe"),
+        "libE57Format": ("include", "E57Format"),
+        "googletest": ("include", "gtest"),
+        "opencamlib": ("bin", "Lib", "site-packages", "opencamlib", "ocl.pyd"),
+    }
+
+    # Packages whose build writes into the source tree rather than only into a mode-suffixed build
+    # directory beside it, and that therefore need a checkout of their own in each working
+    # directory instead of one shared by both modes (see create_libpack.py --shared-sources). Qt
+    # is among them because its configure initializes its submodules.
+    IN_SOURCE_BUILDS = {"python", "bzip2", "tcl", "tk", "icu", "pyside", "pycxx", "qt"}
+
+    # Packages whose build methods return without building anything in Release mode, because the
+    # PyPI wheels that would use them bundle their own copies
+    DEBUG_ONLY = {"libiconv", "libxml2", "libxslt", "libjpeg", "openblas"}
+
     def __init__(
         self,
         config,
@@ -284,6 +481,11 @@ class Compiler:
         skip_existing: bool = False,
         mode: BuildMode = BuildMode.RELEASE,
         force_rebuild: set = None,
+        jobs: Optional[int] = None,
+        parallel_packages: int = 1,
+        cache_dir: Optional[str] = None,
+        compressed_logs: bool = False,
+        log_retention: int = 5,
     ):
         self.config = config
         self.bison_path = bison_path
@@ -300,11 +502,72 @@ class Compiler:
         self.msvc_tools_version = None
         self.mode = mode
         self.strict_mode = True
+        # Global core budget, and how many packages may build at once within it. With the default
+        # of one package at a time the build walks config.json top to bottom exactly as it always
+        # has; with more, independent packages build concurrently in worker processes (see
+        # compile_all). The budget is enforced across every build subprocess by a shared job
+        # server, see _reserve_jobs.
+        self.jobs = jobs
+        self.parallel_packages = max(1, parallel_packages)
+        # Optional store of per-package install trees keyed on a fingerprint of each package's
+        # build inputs. When enabled it replaces the sentinel-file skip checks: a package is
+        # skipped only if the installed copy was built from identical inputs, restored from the
+        # cache if some earlier build used identical inputs, and otherwise always rebuilt.
+        self.build_cache = build_cache.BuildCache(cache_dir) if cache_dir else None
+        self.install_state = None
+        self._package_inputs: Dict[str, dict] = {}
+        self._fingerprints: Dict[str, str] = {}
+        # Job tokens held by this process for the command currently running, see _reserve_jobs
+        self._granted_jobs: Optional[int] = None
+        # The package build_package is working on, so that the shared CMake and pip helpers know
+        # which package to attribute their timeline phases to
+        self._current_package: Optional[str] = None
+        # The sources as seen from the build directory made by _cmake_create_build_dir
+        self._cmake_source_dir = ".."
+        # Steps of each package's build that have completed, kept beside the LibPack so that an
+        # interrupted build resumes at the step that did not finish. _resume_steps is what is left
+        # to replay from an interrupted build of the current package, _journal_steps what the
+        # current build has done so far (or None outside of build_package).
+        self.journal = BuildJournal(os.path.join(os.path.dirname(self.install_dir), "journal"))
+        self._resume_steps: List[str] = []
+        self._journal_steps: Optional[List[str]] = None
+        self._resuming = False
+        # Which package installed each file in the LibPack, and the files the current package has
+        # merged into the LibPack from its staging root so far, see _cmake_install
+        self.file_index: Optional[build_cache.FileIndex] = None
+        self._staged_files: List[str] = []
+        # How many commands _run_streaming has run, which tells build_package whether a package's
+        # build method built anything
+        self._commands_run = 0
+        # Where command output goes instead of the plain build_log.txt (and similar) files beside
+        # each package's sources, if compressed logs were requested
+        self.log_store = (
+            build_logs.LogStore(
+                os.path.join(os.path.dirname(self.install_dir), "logs"), log_retention
+            )
+            if compressed_logs
+            else None
+        )
+        # Called with a package's name before it is built, to block until its sources have been
+        # fetched when fetching overlaps the build (create_libpack.py --pipeline)
+        self.wait_for_source: Optional[Callable[[str], None]] = None
+        # Called with a package's name to get a Future that completes once its sources have been
+        # fetched, so that parallel builds start the packages whose sources are already in place
+        # rather than wait for the one whose sources are not
+        self.source_fetched: Optional[Callable[[str], Future]] = None
 
         # Boost is the one package where the version number gets coded into the path, so store
         # that path separately from all the other paths we have to track
         self.boost_include_path = None
 
+    def __getstate__(self):
+        # Parallel builds hand each worker process a copy of the compiler. Waiting for sources is
+        # done by the scheduling process before a build is launched, and cannot be pickled.
+        state = self.__dict__.copy()
+        state["wait_for_source"] = None
+        state["source_fetched"] = None
+        return state
+
     def get_cmake_options(self) -> List[str]:
         """Get a comprehensive list of cMake options that can be used in any cMake build. Not all options apply
         to all builds, but none conflict."""
@@ -370,6 +633,10 @@ class Compiler:
                     "-D CMAKE_MODULE_LINKER_FLAGS=/DEBUG /OPT:REF /OPT:ICF",
                 ]
             )
+        if self.boost_include_path is None:
+            # When packages are built in worker processes (or boost was installed by an earlier
+            # run) build_boost did not run in this process, so look for its install instead.
+            self._configure_boost_version()
         if self.boost_include_path:
             base.append(f"-D Boost_INCLUDE_DIR={self.boost_include_path}")
         if sys.platform.startswith("win32"):
@@ -401,30 +668,402 @@ class Compiler:
         )
         os.makedirs(pip_cache_dir, exist_ok=True)
         os.environ["PIP_CACHE_DIR"] = pip_cache_dir
-        base_skip_existing = self.skip_existing
+        if self.jobs is not None:
+            # No single command may take more than its package's share of the budget when every
+            # package slot is busy, however idle the build is when the command starts
+            jobserver.install(
+                jobserver.JobServer(self.jobs, max(1, self.jobs // self.parallel_packages))
+            )
+        self._load_state()
+        if self.parallel_packages > 1:
+            self._compile_all_parallel()
+            return
         for item in self.config["content"]:
-            # All build methods are named using "build_XXX" where XXX is the name of the package in the config file
-            # A package named in force_rebuild always rebuilds, even when skip-existing is otherwise in effect.
-            self.skip_existing = base_skip_existing and item["name"] not in self.force_rebuild
-            os.chdir(item["name"])
+            if self.build_cache is not None and self._restore_from_cache(item):
+                continue
+            if self.wait_for_source is not None:
+                self.wait_for_source(item["name"])
+            before = build_cache.snapshot(self.install_dir)
+            self.build_package(item, force=self.build_cache is not None)
+            files = self._record_install(item["name"], before, self._staged_files)
+            if self.build_cache is not None:
+                self._store_in_cache(item["name"], files)
+
+    def _load_state(self):
+        """Fingerprint every package, load the index of which package installed each file in the
+        LibPack and, if the build cache is in use, which fingerprints are installed there."""
+        self._compute_fingerprints()
+        self.file_index = build_cache.FileIndex(self.install_dir)
+        if self.build_cache is not None:
+            self.install_state = build_cache.InstallState(self.install_dir)
+
+    def plan(self, fresh: bool = False) -> List[Tuple[str, str, str]]:
+        """What compile_all would do with each package, without doing any of it: a list of
+        (name, action, reason) in config.json order, where action is "build", "rebuild",
+        "cached" (restored from the build cache), or "skip". With fresh set, the LibPack
+        directory is treated as empty, as it will be when create_libpack.py starts a new one."""
+        self._load_state()
+        result = []
+        for item in self.config["content"]:
+            name = item["name"]
+            action, reason = self._plan_package(name, fresh)
+            result.append((name, action, reason))
+        return result
+
+    def package_durations(self) -> Dict[str, float]:
+        """The expected time in seconds to build each package, from the timings previous runs
+        recorded in build-history.json. A package that has never been timed is assumed to take
+        the median of those that have (or one second if none has), so that with no history at all
+        scheduling still favors the longest chains of dependencies."""
+        history = timeline.load_history(
+            os.path.join(os.path.dirname(self.install_dir), timeline.HISTORY_FILE)
+        )
+        known = {}
+        for item in self.config["content"]:
+            if item["name"] in self.DEBUG_ONLY and self.mode != BuildMode.DEBUG:
+                known[item["name"]] = 0.0
+                continue
+            seconds = timeline.estimate(history, item["name"], "package")
+            if seconds is not None:
+                known[item["name"]] = seconds
+        timed = sorted(known.values())
+        fallback = timed[len(timed) // 2] if timed else 1.0
+        return {item["name"]: known.get(item["name"], fallback) for item in self.config["content"]}
+
+    def _plan_package(self, name: str, fresh: bool) -> Tuple[str, str]:
+        if name in self.DEBUG_ONLY and self.mode != BuildMode.DEBUG:
+            return "skip", "only built in Debug mode"
+        if name in self.force_rebuild:
+            return "rebuild", "forced by --rebuild"
+        if not self.skip_existing:
+            return "rebuild", "forced by --no-skip-existing-build"
+        if self.build_cache is not None:
+            key = self._fingerprints[name]
+            installed = None if fresh else self.install_state.packages.get(name)
+            if installed is not None and installed["fingerprint"] == key:
+                return "skip", "build inputs unchanged"
+            if self.build_cache.contains(name, key):
+                return "cached", "identical build inputs in the build cache"
+            if installed is None:
+                return "build", "not in the LibPack yet"
+            return "rebuild", build_cache.describe_changes(
+                installed["inputs"], self._package_inputs[name]
+            )
+        sentinel = self._sentinel_path(name)
+        if sentinel is None:
+            return "build", f"no sentinel, build_{name} decides"
+        if fresh:
+            return "build", "new LibPack directory"
+        if os.path.exists(sentinel):
+            return "skip", "sentinel present"
+        return "build", "missing sentinel " + os.path.relpath(sentinel, self.install_dir)
+
+    def _package_recipe(self, name: str) -> str:
+        """The source code that turns a package's inputs into installed files: its build method
+        plus the shared CMake helpers (and, for Python, the pip machinery)."""
+        methods = [
+            "build_" + name,
+            "get_cmake_options",
+            "_build_standard_cmake",
+            "_cmake_configure",
+        ]
+        if name.lower() == "python":
+            methods += ["_build_pip", "_install_python_requirements", "_run_pip_install"]
+        digest = hashlib.sha256()
+        for method in methods:
+            if not hasattr(Compiler, method):
+                continue
+            try:
+                digest.update(inspect.getsource(getattr(Compiler, method)).encode("utf-8"))
+            except (OSError, TypeError):
+                # No source available (a frozen or bytecode-only install): fall back to the name
+                digest.update(method.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _compute_fingerprints(self):
+        """Fingerprint every package's build inputs: its config.json entry, the contents of its
+        patches, its build recipe, the toolchain, and the fingerprints of its dependencies (so a
+        change to zlib also invalidates everything built against it)."""
+        try:
+            graph = BuildGraph(self.config["content"])
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            exit(1)
+        patch_root = pathlib.Path(__file__).parent.absolute()
+        toolchain = {
+            "mode": str(self.mode),
+            "arch": libpack_arch_label(),
+            "platform": sys.platform,
+            "init_script": self.init_script,
+            "msvc_tools_version": self.msvc_tools_version,
+            "bison": str(self.bison_path),
+            "install_dir": self.install_dir,
+        }
+        for item in self.config["content"]:
+            name = item["name"]
+            inputs = {
+                "entry": {k: v for k, v in item.items() if k not in ("note", "depends")},
+                "patches": {
+                    patch: build_cache.file_digest(os.path.join(patch_root, patch))
+                    for patch in item.get("patches", [])
+                },
+                "recipe": self._package_recipe(name),
+                "toolchain": toolchain,
+                "dependencies": {
+                    dep: self._fingerprints[dep] for dep in sorted(graph.dependencies[name])
+                },
+            }
+            self._package_inputs[name] = inputs
+            self._fingerprints[name] = build_cache.fingerprint(inputs)
+
+    def _restore_from_cache(self, item: dict) -> bool:
+        """Satisfy a package without building it, if possible. Returns True if the LibPack already
+        holds (or now holds, after a cache restore) a copy built from identical inputs."""
+        name = item["name"]
+        key = self._fingerprints[name]
+        if name in self.force_rebuild or not self.skip_existing:
+            return False
+        if self.install_state.installed(name) == key:
+            print(f"Not rebuilding {name}, its build inputs are unchanged")
+            return True
+        if self.build_cache.contains(name, key):
+            with timeline.phase(name, "restore"):
+                self.file_index.uninstall(name)
+                files = self.build_cache.restore(name, key, self.install_dir)
+            self.file_index.claim(name, files)
+            self.install_state.record(name, key, self._package_inputs[name])
+            print(f"Restored {name} from the build cache ({len(files)} files)")
+            return True
+        return False
+
+    def _record_install(
+        self, name: str, before: build_cache.Snapshot, staged: List[str], exact: bool = True
+    ) -> Optional[List[str]]:
+        """Claim the files a package just installed in the file index, and return them. These are
+        the files it merged from its staging root plus, when no other package was installing at
+        the same time (exact), anything else that changed in the LibPack since the before
+        snapshot, which catches packages that copy files or pip-install rather than running
+        cmake --install. Of those, a file another package installed is only taken over if it came
+        from the staging root: anything else may just have been rewritten in passing (a header
+        touched by a tool, a file the LibPack's Python updated), and neither is Python bytecode,
+        which the LibPack's Python writes for whatever it imports. Returns None if the package's
+        files are not known exactly."""
+        files = set(staged)
+        if exact:
+            for path in build_cache.changed_files(before, build_cache.snapshot(self.install_dir)):
+                if "__pycache__" in path.split(os.sep):
+                    continue
+                if path in before and self.file_index.owners.get(path, name) != name:
+                    continue
+                files.add(path)
+        if files:
+            for path, owner in self.file_index.claim(name, sorted(files)):
+                print(f"  NOTE: {name} replaced {path}, which was installed by {owner}")
+        return sorted(files) if exact else None
+
+    def _store_in_cache(self, name: str, files: Optional[List[str]]):
+        """Record a freshly-built package as installed and save the files it installed as a cache
+        entry, if they are known exactly."""
+        key = self._fingerprints[name]
+        if files is not None:
+            self.build_cache.save(name, key, self.install_dir, files, self._package_inputs[name])
+        else:
+            print(f"  Not caching {name}: other packages were installing at the same time")
+        self.install_state.record(name, key, self._package_inputs[name])
+
+    def _sentinel_path(self, name: str) -> Optional[str]:
+        """The path whose existence means the package is already built, or None if the package's
+        build method does not use a single sentinel path."""
+        if name in self._SKIP_SENTINELS:
+            return os.path.join(self.install_dir, *self._SKIP_SENTINELS[name])
+        if name.lower() == "python":
+            return self.python_exe()
+        return None
+
+    def _has_sentinel(self, name: str) -> bool:
+        return os.path.exists(self._sentinel_path(name))
+
+    def build_package(self, item: dict, force: bool = False):
+        """Build a single config.json entry, ignoring skip-existing if force is set. The working
+        directory is restored afterwards."""
+        # All build methods are named using "build_XXX" where XXX is the name of the package in the config file
+        # A package named in force_rebuild always rebuilds, even when skip-existing is otherwise in effect.
+        base_skip_existing = self.skip_existing
+        self.skip_existing = (
+            base_skip_existing and not force and item["name"] not in self.force_rebuild
+        )
+        os.chdir(os.path.join(self.base_dir, item["name"]))
+        server = jobserver.current()
+        self._current_package = item["name"]
+        self._staged_files = []
+        self._start_journal(item["name"])
+        if not self.skip_existing and not self._resuming and self.file_index is not None:
+            # Remove the previous build's files first, so that nothing it installed and this
+            # build no longer does is left behind in the LibPack
+            removed = self.file_index.uninstall(item["name"])
+            if removed:
+                print(
+                    f"  Removed {removed} files installed by the previous build of {item['name']}"
+                )
+        try:
             build_function_name = "build_" + item["name"]
             if hasattr(self, build_function_name):
                 print(f"Building {item['name']}")
                 build_function = getattr(self, build_function_name)
-                build_function(item)
-                if item["name"].lower() == "python":
-                    # Check these even if we didn't actually have to build Python
-                    self._build_pip()
-                    if "requirements" in item:
-                        self._install_python_requirements(item["requirements"])
+                with server.building() if server else nullcontext(), timeline.phase(
+                    item["name"], "package"
+                ) as timed:
+                    commands_run = self._commands_run
+                    build_function(item)
+                    if item["name"].lower() == "python":
+                        # Check these even if we didn't actually have to build Python
+                        self._build_pip()
+                        if "requirements" in item:
+                            self._install_python_requirements(item["requirements"])
+                    if self._commands_run == commands_run:
+                        # Nothing was built: the build method returned early, or only copied
+                        # files. Keep the near-zero time that took out of the build history that
+                        # --plan and scheduling rely on.
+                        timed["phase"] = "skipped"
+                self.journal.clear(item["name"])
             else:
                 print(
                     f"No '{build_function_name}' found in compile_all.py -- "
                     "did you forget to add one when adding a dependency?"
                 )
                 exit(2)
+        finally:
+            self.skip_existing = base_skip_existing
+            self._current_package = None
+            self._resume_steps = []
+            self._journal_steps = None
+            self._resuming = False
             os.chdir(self.base_dir)
 
+    def _start_journal(self, name: str):
+        """Pick up the journal of an interrupted build of this package with the same build inputs,
+        if there is one, or start a new journal entry."""
+        fingerprint = self._fingerprints.get(name)
+        if fingerprint is None:
+            return
+        completed = self.journal.completed_steps(name, fingerprint)
+        self._resuming = completed is not None
+        self._resume_steps = completed or []
+        self._journal_steps = []
+        if completed:
+            print(f"  Resuming the interrupted build of {name} after: {', '.join(completed)}")
+        elif completed is None:
+            self.journal.record(name, fingerprint, [])
+
+    def _resume_step(self, step: str, still_valid: bool = True) -> bool:
+        """True if the interrupted build being resumed already completed this step, in which case
+        the caller skips it. The first step that does not match (or whose output is gone, as
+        reported by still_valid) ends the replay, and everything from there on runs again."""
+        if still_valid and self._resume_steps and self._resume_steps[0] == step:
+            self._journal_steps.append(self._resume_steps.pop(0))
+            return True
+        self._resume_steps = []
+        return False
+
+    def _step_completed(self, step: str):
+        """Record a step of the current package's build as complete in the journal."""
+        if self._journal_steps is None:
+            return
+        self._journal_steps.append(step)
+        self.journal.record(
+            self._current_package, self._fingerprints[self._current_package], self._journal_steps
+        )
+
+    def _compile_all_parallel(self):
+        """Build every package as soon as the packages it depends on are installed, running up to
+        parallel_packages builds at once. Each build runs in its own worker process because the
+        build methods change the working directory and the process environment as they go."""
+        try:
+            graph = BuildGraph(self.config["content"])
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            exit(1)
+        items = {item["name"]: item for item in self.config["content"]}
+        for item in self.config["content"]:
+            if not hasattr(self, "build_" + item["name"]):
+                print(
+                    f"No 'build_{item['name']}' found in compile_all.py -- "
+                    "did you forget to add one when adding a dependency?"
+                )
+                exit(2)
+        print(
+            f"Building up to {self.parallel_packages} packages at once"
+            + (f", sharing {self.jobs} cores" if self.jobs else "")
+        )
+        # Of the packages that are ready to build, start the ones heading the longest remaining
+        # chain of dependents first: anything on the critical path that starts late delays the
+        # whole build, while packages off it have slack to absorb the wait.
+        durations = self.package_durations()
+        priority = graph.bottom_levels(durations)
+        print("Critical path: " + " -> ".join(graph.critical_path(durations)))
+        # Cache lookups, snapshots of the install directory and the file index are all handled
+        # here in the scheduling process. Files a package merged from its staging root are always
+        # attributed to it, but the rest of its snapshot difference is only trustworthy if nothing
+        # else was installing while it built, so an overlapping build that installs files any
+        # other way is not cached.
+        snapshots: Dict[str, build_cache.Snapshot] = {}
+        futures: Dict[str, Future] = {}
+        in_flight = set()
+        overlapped = set()
+        force = self.build_cache is not None
+
+        def launch(name: str) -> Future:
+            restoring = force and self.install_state.installed(name) != self._fingerprints[name]
+            if force and self._restore_from_cache(items[name]):
+                if restoring:
+                    # The restored files turn up in the snapshot difference of every package
+                    # still building, which cannot tell them from files it installed itself
+                    overlapped.update(in_flight)
+                future = Future()
+                future.set_result(None)
+                return future
+            if self.wait_for_source is not None:
+                self.wait_for_source(name)
+            if in_flight:
+                overlapped.update(in_flight)
+                overlapped.add(name)
+            in_flight.add(name)
+            snapshots[name] = build_cache.snapshot(self.install_dir)
+            future = executor.submit(_build_package_in_worker, self, items[name], force)
+            future.add_done_callback(_merge_worker_timeline)
+            futures[name] = future
+            return future
+
+        def finished(name: str):
+            if name in in_flight:
+                in_flight.discard(name)
+                _, staged = futures.pop(name).result()
+                files = self._record_install(
+                    name, snapshots.pop(name), staged, name not in overlapped
+                )
+                if self.build_cache is not None:
+                    self._store_in_cache(name, files)
+
+        with ProcessPoolExecutor(
+            max_workers=self.parallel_packages,
+            initializer=jobserver.install,
+            initargs=(jobserver.current(),),
+        ) as executor:
+            failures = run_graph(
+                graph,
+                launch,
+                self.parallel_packages,
+                on_success=finished,
+                priority=priority,
+                gate=self.source_fetched,
+            )
+        if failures:
+            for name, error in failures:
+                print(f"ERROR: Failed to build {name} ({error!r})")
+            first_error = failures[0][1]
+            code = first_error.code if isinstance(first_error, SystemExit) else 1
+            exit(code if isinstance(code, int) and code != 0 else 1)
+
     def build_nonexistent(self, _=None):
         """Used for automated testing to allow easy Mock injection"""
 
@@ -435,11 +1074,9 @@ class Compiler:
         if self.mode != BuildMode.DEBUG:
             print("  Skipping libiconv build in Release mode (lxml wheel bundles its own iconv).")
             return
-        if self.skip_existing:
-            sentinel = os.path.join(self.install_dir, "include", "iconv.h")
-            if os.path.exists(sentinel):
-                print("  Not rebuilding libiconv, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("libiconv"):
+            print("  Not rebuilding libiconv, it is already in the LibPack")
+            return
         extra_args = [
             "-G",
             "Ninja",
@@ -459,13 +1096,9 @@ class Compiler:
         if self.mode != BuildMode.DEBUG:
             print("  Skipping libxml2 build in Release mode (lxml wheel bundles its own libxml2).")
             return
-        if self.skip_existing:
-            sentinel = os.path.join(
-                self.install_dir, "include", "libxml2", "libxml", "xmlversion.h"
-            )
-            if os.path.exists(sentinel):
-                print("  Not rebuilding libxml2, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("libxml2"):
+            print("  Not rebuilding libxml2, it is already in the LibPack")
+            return
         extra_args = [
             "-G",
             "Ninja",
@@ -484,11 +1117,9 @@ class Compiler:
         if self.mode != BuildMode.DEBUG:
             print("  Skipping libxslt build in Release mode (lxml wheel bundles its own libxslt).")
             return
-        if self.skip_existing:
-            sentinel = os.path.join(self.install_dir, "include", "libxslt", "xslt.h")
-            if os.path.exists(sentinel):
-                print("  Not rebuilding libxslt, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("libxslt"):
+            print("  Not rebuilding libxslt, it is already in the LibPack")
+            return
         extra_args = [
             "-G",
             "Ninja",
@@ -512,10 +1143,9 @@ class Compiler:
                 "  Skipping libjpeg-turbo build in Release mode (Pillow wheel bundles its own libjpeg)."
             )
             return
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "jpeglib.h")):
-                print("  Not rebuilding libjpeg-turbo, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("libjpeg"):
+            print("  Not rebuilding libjpeg-turbo, it is already in the LibPack")
+            return
         extra_args = [
             "-G",
             "Ninja",
@@ -544,10 +1174,9 @@ class Compiler:
                 "  Skipping OpenBLAS build in Release mode (numpy/scipy use bundled OpenBLAS from wheels)."
             )
             return
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "openblas", "cblas.h")):
-                print("  Not rebuilding OpenBLAS, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("openblas"):
+            print("  Not rebuilding OpenBLAS, it is already in the LibPack")
+            return
         extra_args = [
             "-G",
             "Ninja",
@@ -610,10 +1239,9 @@ class Compiler:
         return env
 
     def build_python(self, args=None):
-        if self.skip_existing:
-            if os.path.exists(self.python_exe()):
-                print("  Not rebuilding Python, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("python"):
+            print("  Not rebuilding Python, it is already in the LibPack")
+            return
         if sys.platform.startswith("win32"):
             expected_exe_path = self.python_exe()
             arch = "x64" if platform.machine() == "AMD64" else "ARM64"
@@ -646,6 +1274,7 @@ class Compiler:
                     ],
                     "build_log.txt",
                     env=env,
+                    parallel=True,
                 )
             except subprocess.CalledProcessError as e:
                 print("Python build failed")
@@ -1090,8 +1719,16 @@ class Compiler:
         else:
             env = None
             call_args = pip_args
+        # Building packages from source is a parallel build. meson-python runs ninja on every
+        # core whatever MAX_JOBS and NPY_NUM_BUILD_JOBS say, so it is given the grant directly.
+        source_build = bool(no_binary_packages)
         try:
-            self._run_streaming(call_args, "pip_log.txt", env=env)
+            with timeline.phase(self._current_package, "pip"), self._reserve_jobs(
+                source_build
+            ) as jobs:
+                if source_build and jobs is not None:
+                    call_args = [*call_args, f"--config-settings=compile-args=-j{jobs}"]
+                self._run_streaming(call_args, "pip_log.txt", env=env, parallel=source_build)
         except subprocess.CalledProcessError as e:
             print(f"ERROR: Failed to pip install requirements")
             if e.output:
@@ -1123,10 +1760,9 @@ class Compiler:
     def build_qt(self, options: dict):
         """Build Qt from source. Always builds qtbase, qtsvg, qtdeclarative, and qttools
         against the LibPack's own zlib and libpng."""
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "metatypes")):
-                print("  Not rebuilding Qt, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("qt"):
+            print("  Not rebuilding Qt, it is already in the LibPack")
+            return
         self._prepend_runtime_dirs_to_path()
 
         build_dir = os.path.join(os.getcwd(), f"build-{str(self.mode).lower()}")
@@ -1175,6 +1811,12 @@ class Compiler:
             ",".join(submodules),
             "-feature-opengl",
             "-feature-zstd",
+            # Qt uses copies of these from the prefix when it finds them there. They are built
+            # after Qt, so pin the bundled copies rather than depend on how far the build has got.
+            "-qt-pcre",
+            "-qt-harfbuzz",
+            "-qt-freetype",
+            "-no-icu",
             "-prefix",
             self.install_dir,
             "-opengl",
@@ -1212,6 +1854,7 @@ class Compiler:
         extra_args = [
             "-D BOOST_INSTALL_LAYOUT=versioned",
             "-D BOOST_ENABLE_CMAKE=ON",
+            # Keep in step with the "!libs/..." patterns of boost's submodules list in config.json
             "-D BOOST_EXCLUDE_LIBRARIES='mpi;graph_parallel;coroutine'",
             "-D BOOST_ENABLE_PYTHON=ON",
             "-D BOOST_LOCALE_ENABLE_ICU=OFF",
@@ -1227,6 +1870,8 @@ class Compiler:
     def _configure_boost_version(self):
         """Once Boost has been installed, figure out what version it was and set up the correct include path"""
         start_crawl_at = os.path.join(self.install_dir, "include")
+        if not os.path.isdir(start_crawl_at):
+            return
         contents = [
             f for f in os.listdir(start_crawl_at) if os.path.isdir(os.path.join(start_crawl_at, f))
         ]
@@ -1236,20 +1881,96 @@ class Compiler:
                 break
 
     def _cmake_create_build_dir(self):
+        """Create the build directory for the sources in the current directory and change into
+        it. That is build-<mode> beside the sources, except for sources linked from the shared
+        source store (see create_libpack.py --shared-sources), which other working directories
+        may be building too: their build directory is <name>-build-<mode> in this working
+        directory instead."""
         build_dir = "build-" + str(self.mode).lower()
+        self._cmake_source_dir = ".."
+        package_dir = os.path.join(self.base_dir, self._current_package or "")
+        if self._current_package and source_store.linked(package_dir) is not None:
+            self._cmake_source_dir = os.getcwd()
+            build_dir = os.path.join(self.base_dir, f"{self._current_package}-{build_dir}")
+        if self._resume_step("build-dir", os.path.isdir(build_dir)):
+            # Keep the interrupted build's directory, and with it the configure and build results
+            os.chdir(build_dir)
+            return
         if os.path.exists(build_dir):
             shutil.rmtree(build_dir, onerror=remove_readonly)
         os.mkdir(build_dir)
         os.chdir(build_dir)
+        self._step_completed("build-dir")
+
+    @contextmanager
+    def _reserve_jobs(self, parallel: bool = False):
+        """Hold job tokens from the shared job server for the duration of the block, yielding the
+        number granted, or None if there is no --jobs budget. Only a parallel build asks for a
+        share of the budget; anything else (configuring, installing, pip installing wheels) runs
+        one process at a time and takes a single token. Commands run through _run_streaming inside
+        the block share this reservation instead of taking tokens of their own, so a caller that
+        needs to put the grant on a command line (cmake --parallel N, msbuild /m:N, pip's
+        compile-args) reserves first and then builds its arguments."""
+        server = jobserver.current()
+        if server is None or self._granted_jobs is not None:
+            yield self._granted_jobs
+            return
+        self._granted_jobs = server.acquire(None if parallel else 1)
+        try:
+            yield self._granted_jobs
+        finally:
+            server.release(self._granted_jobs)
+            self._granted_jobs = None
 
-    def _run_streaming(self, args, log_filename: str = "build_log.txt", env=None):
-        """Run a subprocess and stream its combined stdout and stderr to log_filename one
-        line at a time. The log file is opened in append mode and line-buffered so an
-        external watcher can tail it in real time. The output of this invocation is also
-        retained in memory so that, on a non-zero exit, it can be attached to the raised
-        CalledProcessError exactly as subprocess.run would have done."""
-        captured_lines: List[str] = []
-        with open(log_filename, "a", encoding="utf-8", buffering=1) as logf:
+    @staticmethod
+    def _job_environment(env: Optional[dict], jobs: int, args) -> dict:
+        """The environment for a command granted the given number of job tokens. Tools that read
+        their parallelism from the environment (CMake, MSBuild's multi-tool task, cl.exe, pip
+        backends) are capped at the grant; variables the caller already set are left alone."""
+        env = dict(os.environ if env is None else env)
+        for name, value in (
+            ("CMAKE_BUILD_PARALLEL_LEVEL", str(jobs)),
+            ("UseMultiToolTask", "true"),
+            ("EnforceProcessCountAcrossBuilds", "true"),
+            ("CL_MPCount", str(jobs)),
+            ("MAX_JOBS", str(jobs)),
+            ("NPY_NUM_BUILD_JOBS", str(jobs)),
+        ):
+            env.setdefault(name, value)
+        if "nmake" in args:
+            # nmake runs one rule at a time; the batch-mode rules of the tcl, tk, and bzip2
+            # makefiles hand many sources to one cl.exe, which /MP then compiles in parallel
+            env["CL"] = f"/MP{jobs} " + env.get("CL", "")
+        return env
+
+    def _run_streaming(
+        self, args, log_filename: str = "build_log.txt", env=None, parallel: bool = False
+    ):
+        """Run a subprocess and stream its combined stdout and stderr to log_filename. The log file
+        is opened in append mode and written by a separate thread in batches, each flushed as soon
+        as it is written, so an external watcher can tail it in real time without the command's
+        output ever waiting on the disk. With compressed logs, the output goes instead to the log
+        store, in the current package's compressed log for the phase log_filename names (see
+        build_logs.LogStore). The last STREAMING_TAIL_LINES lines (at most
+        STREAMING_TAIL_CHARS characters) of the output are also kept in memory so that, on a
+        non-zero exit, they can be attached to the raised CalledProcessError much as subprocess.run
+        would have done; the full output is in the log. When a --jobs budget is in force the
+        command runs under a job-token reservation (see _reserve_jobs), for a share of the budget
+        if it is a parallel build and a single token otherwise."""
+        tail = _TailBuffer(STREAMING_TAIL_LINES, STREAMING_TAIL_CHARS)
+        if self.log_store is not None:
+            phase = os.path.splitext(os.path.basename(log_filename))[0]
+            if phase.endswith("_log"):
+                phase = phase[: -len("_log")]
+            log_context = self.log_store.section(
+                self._current_package or "libpack", phase, subprocess.list2cmdline(args)
+            )
+        else:
+            log_context = build_logs.LogWriter(log_filename)
+        self._commands_run += 1
+        with self._reserve_jobs(parallel) as jobs, log_context as log:
+            if jobs is not None:
+                env = self._job_environment(env, jobs, args)
             proc = subprocess.Popen(
                 args,
                 stdout=subprocess.PIPE,
@@ -1260,19 +1981,23 @@ class Compiler:
                 env=env,
             )
             for line in proc.stdout:
-                logf.write(line)
-                captured_lines.append(line)
+                log.write(line)
+                tail.append(line)
             return_code = proc.wait()
         if return_code != 0:
-            raise subprocess.CalledProcessError(
-                return_code, args, output="".join(captured_lines).encode("utf-8")
-            )
+            output = tail.text()
+            if tail.dropped:
+                output = (
+                    f"[{tail.dropped} earlier lines omitted, see {os.path.abspath(log.filename)}]\n"
+                    + output
+                )
+            raise subprocess.CalledProcessError(return_code, args, output=output.encode("utf-8"))
 
-    def _run_cmake(self, args):
+    def _run_cmake(self, args, env=None, log_filename: str = "build_log.txt"):
         cmake_setup_options = [*self.init_script, "&", "cmake"]
         cmake_setup_options.extend(args)
         try:
-            self._run_streaming(cmake_setup_options, "build_log.txt")
+            self._run_streaming(cmake_setup_options, log_filename, env=env)
         except subprocess.CalledProcessError as e:
             print("ERROR: cMake failed!")
             print(f"Command: {' '.join(cmake_setup_options)}")
@@ -1361,24 +2086,85 @@ class Compiler:
         return ["-A ARM64"]
 
     def _cmake_configure(self, extra_args: List[str] = None):
+        if self._resume_step("configure"):
+            return
         options = self.get_cmake_options()
         if extra_args:
             options.extend(extra_args)
         options.extend(self._arm64_platform_flag(extra_args))
-        options.append(
-            ".."
-        )  # Because the source code is located one directory up from our build location
-        self._run_cmake(options)
+        # Normally the source code is located one directory up from our build location
+        options.append(self._cmake_source_dir)
+        with timeline.phase(self._current_package, "configure"):
+            self._run_cmake(options, log_filename="configure_log.txt")
+        self._step_completed("configure")
 
     def _cmake_build(self, parallel: bool = True):
+        if self._resume_step("build"):
+            return
         cmake_build_options = ["--build", ".", "--config", str(self.mode).lower(), "--verbose"]
-        if parallel:
-            cmake_build_options.append("--parallel")
-        self._run_cmake(cmake_build_options)
+        with self._reserve_jobs(parallel=True) as jobs:
+            env = None
+            if parallel:
+                cmake_build_options.append("--parallel")
+                if jobs is not None:
+                    cmake_build_options.append(str(jobs))
+            elif jobs is not None:
+                # Build one project at a time; the grant still bounds the compiler processes the
+                # project itself spawns (OpenCASCADE compiles with /MP)
+                env = dict(os.environ, CMAKE_BUILD_PARALLEL_LEVEL="1")
+            with timeline.phase(self._current_package, "build"):
+                self._run_cmake(cmake_build_options, env=env)
+        self._step_completed("build")
 
     def _cmake_install(self):
+        """Install the package into its own staging root, a directory beside the LibPack laid out
+        like it, and then move the installed files into the LibPack. Every file the package
+        installed is then known exactly (see _record_install), however many other packages are
+        installing at the same time, and a failed install leaves nothing half-written in the
+        LibPack. Packages configured to install outside the LibPack install directly."""
+        if self._resume_step("install"):
+            return
         cmake_install_options = ["--install", ".", "--config", str(self.mode).lower()]
-        self._run_cmake(cmake_install_options)
+        staging_root, staging_prefix = self._staging_root()
+        if staging_root is not None:
+            if os.path.exists(staging_root):
+                shutil.rmtree(staging_root, onerror=remove_readonly)
+            cmake_install_options += ["--prefix", staging_prefix]
+        with timeline.phase(self._current_package, "install"):
+            self._run_cmake(cmake_install_options, log_filename="install_log.txt")
+            if staging_root is not None:
+                self._staged_files += build_cache.merge_tree(staging_root, self.install_dir)
+                shutil.rmtree(staging_root, onerror=remove_readonly)
+        self._step_completed("install")
+
+    def _staging_root(self) -> Tuple[Optional[str], Optional[str]]:
+        """Where the current package's CMake build should stage its install, and the prefix to
+        install with so that its CMAKE_INSTALL_PREFIX maps to the same place inside the staging
+        root as inside the LibPack. (None, None) if it must install directly: outside of
+        build_package, or when its CMAKE_INSTALL_PREFIX is not inside the LibPack."""
+        prefix = self._configured_install_prefix()
+        if self._current_package is None or prefix is None:
+            return None, None
+        try:
+            relative = os.path.relpath(os.path.abspath(prefix), os.path.abspath(self.install_dir))
+        except ValueError:
+            return None, None  # On a different drive
+        if relative.split(os.sep)[0] == os.pardir:
+            return None, None
+        root = os.path.join(os.path.dirname(self.install_dir), "staging", self._current_package)
+        return root, os.path.normpath(os.path.join(root, relative))
+
+    @staticmethod
+    def _configured_install_prefix() -> Optional[str]:
+        """The CMAKE_INSTALL_PREFIX recorded in the current build directory's CMakeCache.txt."""
+        try:
+            with open("CMakeCache.txt", "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    if line.startswith("CMAKE_INSTALL_PREFIX:"):
+                        return line.split("=", 1)[1].strip()
+        except OSError:
+            pass
+        return None
 
     def _build_standard_cmake(self, extra_args: List[str] = None):
         self._cmake_create_build_dir()
@@ -1417,10 +2203,9 @@ class Compiler:
         self._pip_install(options["pip-install"])
 
     def build_zlib(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "zlib.h")):
-                print("  Not rebuilding zlib, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("zlib"):
+            print("  Not rebuilding zlib, it is already in the LibPack")
+            return
         self._build_standard_cmake()
         # Qt really wants to find these under an alternate name, so just make copies...
         name_mapping = [
@@ -1439,14 +2224,13 @@ class Compiler:
 
     def build_bzip2(self, _=None):
         """The version of BZip2 in widespread use (1.0.8, the most recent official release) do not yet use cMake"""
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "bzlib.h")):
-                print("  Not rebuilding bzip2, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("bzip2"):
+            print("  Not rebuilding bzip2, it is already in the LibPack")
+            return
         if sys.platform.startswith("win32"):
             args = [*self.init_script, "&", "nmake", "/f", "makefile.msc"]
             try:
-                self._run_streaming(args, "build_log.txt")
+                self._run_streaming(args, "build_log.txt", parallel=True)
                 shutil.copyfile("libbz2.lib", os.path.join(self.install_dir, "lib", "libbz2.lib"))
                 shutil.copyfile("bzlib.h", os.path.join(self.install_dir, "include", "bzlib.h"))
                 shutil.copyfile(
@@ -1461,10 +2245,9 @@ class Compiler:
             raise NotImplemented("Non-Windows compilation of bzip2 is not implemented yet")
 
     def build_expat(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "expat.h")):
-                print("  Not rebuilding expat, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("expat"):
+            print("  Not rebuilding expat, it is already in the LibPack")
+            return
         # libexpat's CMake project lives in the expat/ subdirectory of the repository rather
         # than at its root, so descend into it before running the standard CMake build.
         os.chdir("expat")
@@ -1478,17 +2261,15 @@ class Compiler:
         self._build_standard_cmake(extra_args)
 
     def build_pcre2(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "pcre2.h")):
-                print("  Not rebuilding pcre2, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("pcre2"):
+            print("  Not rebuilding pcre2, it is already in the LibPack")
+            return
         self._build_standard_cmake()
 
     def build_swig(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "bin", "swig") + to_exe()):
-                print("  Not rebuilding SWIG, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("swig"):
+            print("  Not rebuilding SWIG, it is already in the LibPack")
+            return
         self._build_standard_cmake()
 
     def build_libclang(self, _=None):
@@ -1529,15 +2310,11 @@ class Compiler:
     def build_pyside(self, _=None):
         # Don't use a pip-install for this, we need the linkable libraries and include files for both PySide and
         # Shiboken, which won't get installed by pip, and it needs to be built against the right Python exe
-        if self.skip_existing:
-            if os.path.exists(
-                os.path.join(self.install_dir, "bin", "Lib", "site-packages", "PySide6")
-            ):
-                print("  Not rebuilding PySide6, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("pyside"):
+            print("  Not rebuilding PySide6, it is already in the LibPack")
+            return
         python = self.python_exe()
         qtpaths = "--qtpaths=" + os.path.join(self.install_dir, "bin", "qtpaths6") + to_exe()
-        parallel = "--parallel=16"
         # Pass environment variables through Python's subprocess env rather than cmd's
         # "set NAME=VALUE & ..." pattern. The cmd form preserves the whitespace before
         # the next "&" separator inside the env value, which historically left a trailing
@@ -1545,38 +2322,41 @@ class Compiler:
         env = os.environ.copy()
         env["CLANG_INSTALL_DIR"] = self.install_dir
         env["VULKAN_SDK"] = "None"
-        if sys.platform.startswith("win32"):
-            ssl = "--openssl=" + os.path.join(self.install_dir, "bin", "DLLs")
-            python_libs = os.path.join(self.install_dir, "bin", "libs")
-            init_call = "call " + subprocess.list2cmdline(self.init_script)
-            setup_cmd = subprocess.list2cmdline(
-                [python, "setup.py", "install", qtpaths, ssl, parallel]
-                + (["--debug"] if self.mode == BuildMode.DEBUG else [])
-            )
-            wrapper_path = os.path.abspath("build_pyside_wrapper.bat")
-            with open(wrapper_path, "w", encoding="utf-8") as f:
-                f.write("@echo off\n")
-                f.write(f"{init_call}\n")
-                f.write("if errorlevel 1 exit /b %ERRORLEVEL%\n")
-                f.write(f"set LIB={python_libs};%LIB%\n")
-                f.write(f"{setup_cmd}\n")
-            args = [wrapper_path]
-        else:
-            ssl = "--openssl=" + os.path.join(self.install_dir, "bin", "DLLs")
-            args = [python, "setup.py", "install", qtpaths, ssl]
-        try:
-            self._run_streaming(args, "build_log.txt", env=env)
-        except subprocess.CalledProcessError as e:
-            print("ERROR: Failed to build Pyside and/or Shiboken")
-            if e.output:
-                print(e.output.decode("utf-8", errors="replace"))
-            exit(1)
+        with self._reserve_jobs(parallel=True) as jobs:
+            parallel = f"--parallel={jobs or 16}"
+            # After an interrupted attempt, let setup.py pick up its existing build tree
+            reuse = ["--reuse-build"] if self._resuming else []
+            if sys.platform.startswith("win32"):
+                ssl = "--openssl=" + os.path.join(self.install_dir, "bin", "DLLs")
+                python_libs = os.path.join(self.install_dir, "bin", "libs")
+                init_call = "call " + subprocess.list2cmdline(self.init_script)
+                setup_cmd = subprocess.list2cmdline(
+                    [python, "setup.py", "install", qtpaths, ssl, parallel, *reuse]
+                    + (["--debug"] if self.mode == BuildMode.DEBUG else [])
+                )
+                wrapper_path = os.path.abspath("build_pyside_wrapper.bat")
+                with open(wrapper_path, "w", encoding="utf-8") as f:
+                    f.write("@echo off\n")
+                    f.write(f"{init_call}\n")
+                    f.write("if errorlevel 1 exit /b %ERRORLEVEL%\n")
+                    f.write(f"set LIB={python_libs};%LIB%\n")
+                    f.write(f"{setup_cmd}\n")
+                args = [wrapper_path]
+            else:
+                ssl = "--openssl=" + os.path.join(self.install_dir, "bin", "DLLs")
+                args = [python, "setup.py", "install", qtpaths, ssl, parallel, *reuse]
+            try:
+                self._run_streaming(args, "build_log.txt", env=env)
+            except subprocess.CalledProcessError as e:
+                print("ERROR: Failed to build Pyside and/or Shiboken")
+                if e.output:
+                    print(e.output.decode("utf-8", errors="replace"))
+                exit(1)
 
     def build_vtk(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "share", "licenses", "VTK")):
-                print("  Not rebuilding VTK, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("vtk"):
+            print("  Not rebuilding VTK, it is already in the LibPack")
+            return
         extra_args = [
             "-D VTK_WRAP_PYTHON=YES",
             "-D VTK_MODULE_ENABLE_VTK_WrappingPythonCore=YES",
@@ -1603,10 +2383,9 @@ class Compiler:
         self.strict_mode = old_strict_mode
 
     def build_harfbuzz(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "harfbuzz")):
-                print("  Not rebuilding harfbuzz, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("harfbuzz"):
+            print("  Not rebuilding harfbuzz, it is already in the LibPack")
+            return
         # The experimental harfbuzz-gpu library was introduced in HarfBuzz 14.x and fails
         # to link as a shared library on Windows because it references private symbols
         # (_hb_NullPool, _hb_CrapPool) that the main harfbuzz DLL does not export.
@@ -1615,17 +2394,15 @@ class Compiler:
         self._build_standard_cmake(extra_args)
 
     def build_libpng(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "lib", "libpng")):
-                print("  Not rebuilding libpng, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("libpng"):
+            print("  Not rebuilding libpng, it is already in the LibPack")
+            return
         self._build_standard_cmake()
 
     def build_zstd(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "zstd.h")):
-                print("  Not rebuilding zstd, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("zstd"):
+            print("  Not rebuilding zstd, it is already in the LibPack")
+            return
         # Zstandard's CMake project lives in the build/cmake subdirectory of the repository
         # rather than at its root, so descend into it before running the standard CMake build.
         os.chdir(os.path.join("build", "cmake"))
@@ -1638,17 +2415,15 @@ class Compiler:
         self._build_standard_cmake(extra_args)
 
     def build_pybind11(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "pybind11")):
-                print("  Not rebuilding pybind11, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("pybind11"):
+            print("  Not rebuilding pybind11, it is already in the LibPack")
+            return
         self._build_standard_cmake()
 
     def build_freetype(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "freetype2")):
-                print("  Not rebuilding freetype, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("freetype"):
+            print("  Not rebuilding freetype, it is already in the LibPack")
+            return
         self._build_standard_cmake()
         if self.mode == BuildMode.DEBUG:
             # OCCT *really* wants these libraries named like this:
@@ -1675,17 +2450,16 @@ class Compiler:
 
     def build_tcl(self, _=None):
         """tcl does not use cMake"""
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "tcl.h")):
-                print("  Not rebuilding tcl, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("tcl"):
+            print("  Not rebuilding tcl, it is already in the LibPack")
+            return
         if sys.platform.startswith("win32"):
             try:
                 os.chdir("win")
                 args = [*self.init_script, "&", "nmake", "/f", "makefile.vc", "release"]
                 if self.mode == BuildMode.DEBUG:
                     args.append("OPTS=symbols")
-                self._run_streaming(args, "build_log.txt")
+                self._run_streaming(args, "build_log.txt", parallel=True)
                 args = [
                     *self.init_script,
                     "&",
@@ -1716,17 +2490,16 @@ class Compiler:
 
     def build_tk(self, _=None):
         """tk does not use cMake"""
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "tk.h")):
-                print("  Not rebuilding tk, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("tk"):
+            print("  Not rebuilding tk, it is already in the LibPack")
+            return
         if sys.platform.startswith("win32"):
             try:
                 os.chdir("win")
                 args = [*self.init_script, "&", "nmake", "/f", "makefile.vc", "release"]
                 if self.mode == BuildMode.DEBUG:
                     args.append("OPTS=symbols")
-                self._run_streaming(args, "build_log.txt")
+                self._run_streaming(args, "build_log.txt", parallel=True)
                 args = [
                     *self.init_script,
                     "&",
@@ -1778,10 +2551,9 @@ class Compiler:
         raise RuntimeError("Could not find VTK include directory for OpenCASCADE")
 
     def build_opencascade(self, _=None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "cmake", "OpenCASCADEConfig.cmake")):
-                print("  Not rebuilding OpenCASCADE, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("opencascade"):
+            print("  Not rebuilding OpenCASCADE, it is already in the LibPack")
+            return
         install_dir = self.install_dir
         vtk_include_dir = self._get_vtk_include_path()
         if os.path.sep == "\\":
@@ -1883,10 +2655,9 @@ class Compiler:
                     f.write(line + "\n")
 
     def build_netgen(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "share", "netgen")):
-                print("  Not rebuilding netgen, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("netgen"):
+            print("  Not rebuilding netgen, it is already in the LibPack")
+            return
         extra_args = [
             f"-D CMAKE_FIND_ROOT_PATH={self.install_dir}",
             "-D USE_SUPERBUILD=OFF",
@@ -1903,10 +2674,9 @@ class Compiler:
         self._build_standard_cmake(extra_args=extra_args)
 
     def build_hdf5(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "hdf5.h")):
-                print("  Not rebuilding hdf5, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("hdf5"):
+            print("  Not rebuilding hdf5, it is already in the LibPack")
+            return
 
         # Per the recommendation of the HDF5 developers, let HDF5 build and link to its own internal
         # copy of ZLib, since their CMake scripts are broken when trying to use a custom compiled
@@ -1929,10 +2699,9 @@ class Compiler:
         self._build_standard_cmake(extra_args)
 
     def build_medfile(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "medfile.h")):
-                print("  Not rebuilding medfile, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("medfile"):
+            print("  Not rebuilding medfile, it is already in the LibPack")
+            return
         extra_args = [
             "-D MEDFILE_USE_UNICODE=On",
             "-D MEDFILE_BUILD_TESTS=OFF",
@@ -1944,10 +2713,9 @@ class Compiler:
         self.strict_mode = old_strict_mode
 
     def build_gmsh(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "bin", "gmsh" + to_exe())):
-                print("  Not rebuilding gmsh, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("gmsh"):
+            print("  Not rebuilding gmsh, it is already in the LibPack")
+            return
         extra_args = []
         if sys.platform.startswith("win32"):
             extra_args = [
@@ -1958,10 +2726,9 @@ class Compiler:
 
     def build_pycxx(self, _: None):
         """PyCXX does not use a cMake-based build system"""
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "bin", "Lib", "site-packages", "CXX")):
-                print("  Not rebuilding PyCXX, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("pycxx"):
+            print("  Not rebuilding PyCXX, it is already in the LibPack")
+            return
         path_to_python = self.python_exe()
         args = [path_to_python, "setup.py", "install"]
         try:
@@ -1974,10 +2741,9 @@ class Compiler:
 
     def build_icu(self, _: None):
         """ICU does not use cMake, but has projects for various OSes"""
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "unicode")):
-                print("  Not rebuilding ICU, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("icu"):
+            print("  Not rebuilding ICU, it is already in the LibPack")
+            return
 
         os.chdir(os.path.join("icu4c", "source"))
         if platform.machine() == "ARM64":
@@ -1988,24 +2754,27 @@ class Compiler:
             os.chdir("allinone")
             # Find the most recent available WindowsTargetPlatformVersion:
             target = Compiler._get_latest_windows_target_platform_version()
-            args = [
-                *self.init_script,
-                "&",
-                "msbuild",
-                f"/p:Configuration={str(self.mode).lower()}",
-                "/t:Build",
-                f"/p:Platform={arch}",
-                f"/p:WindowsTargetPlatformVersion={target}",
-                "/p:SkipUWP=true",
-                "allinone.sln",
-            ]
-            try:
-                self._run_streaming(args, "build_log.txt")
-            except subprocess.CalledProcessError as e:
-                print("ERROR: Failed to build ICU using its custom build script")
-                if e.output:
-                    print(e.output.decode("utf-8", errors="replace"))
-                exit(1)
+            with self._reserve_jobs(parallel=True) as jobs:
+                args = [
+                    *self.init_script,
+                    "&",
+                    "msbuild",
+                    f"/p:Configuration={str(self.mode).lower()}",
+                    "/t:Build",
+                    f"/p:Platform={arch}",
+                    f"/p:WindowsTargetPlatformVersion={target}",
+                    "/p:SkipUWP=true",
+                    "allinone.sln",
+                ]
+                if jobs is not None:
+                    args.append(f"/m:{jobs}")
+                try:
+                    self._run_streaming(args, "build_log.txt")
+                except subprocess.CalledProcessError as e:
+                    print("ERROR: Failed to build ICU using its custom build script")
+                    if e.output:
+                        print(e.output.decode("utf-8", errors="replace"))
+                    exit(1)
             os.chdir(os.path.join("..", ".."))
             bin_dir = os.path.join(self.install_dir, "bin")
             lib_dir = os.path.join(self.install_dir, "lib")
@@ -2045,10 +2814,9 @@ class Compiler:
         return latest_version
 
     def build_xercesc(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "xercesc")):
-                print("  Not rebuilding xerces-c, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("xercesc"):
+            print("  Not rebuilding xerces-c, it is already in the LibPack")
+            return
         extra_args = [
             f"-D ICU_INCLUDE_DIR={self.install_dir}/include",
             f"-D ICU_ROOT={self.install_dir}",
@@ -2057,38 +2825,34 @@ class Compiler:
         self._build_standard_cmake(extra_args)
 
     def build_libfmt(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "fmt")):
-                print("  Not rebuilding libfmt, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("libfmt"):
+            print("  Not rebuilding libfmt, it is already in the LibPack")
+            return
         # fmt 12.2.0 auto-enables FMT_MODULE under C++20/MSVC, exporting a broken fmt::fmt-module
         # target that breaks find_package(fmt). FreeCAD uses fmt as a plain library, so disable it.
         extra_args = ["-D FMT_TEST=OFF", "-D FMT_DOC=OFF", "-D FMT_MODULE=OFF"]
         self._build_standard_cmake(extra_args)
 
     def build_eigen3(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "eigen3")):
-                print("  Not rebuilding Eigen3, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("eigen3"):
+            print("  Not rebuilding Eigen3, it is already in the LibPack")
+            return
         # These BLAS toolchains require a Fortran compiler, which is often not available. We don't
         # actually NEED these, so just turn them off.
         extra_args = ["-D EIGEN_BUILD_BLAS=OFF", "-D EIGEN_BUILD_LAPACK=OFF"]
         self._build_standard_cmake(extra_args)
 
     def build_yamlcpp(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "yaml-cpp")):
-                print("  Not rebuilding yaml-cpp, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("yamlcpp"):
+            print("  Not rebuilding yaml-cpp, it is already in the LibPack")
+            return
         extra_args = ["-D YAML_BUILD_SHARED_LIBS=ON", "-D CMAKE_POLICY_VERSION_MINIMUM=3.5"]
         self._build_standard_cmake(extra_args)
 
     def build_cpptrace(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "cpptrace")):
-                print("  Not rebuilding cpptrace, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("cpptrace"):
+            print("  Not rebuilding cpptrace, it is already in the LibPack")
+            return
         extra_args = [
             "-D CPPTRACE_BUILD_SHARED=ON",
             "-D CPPTRACE_BUILD_TESTING=OFF",
@@ -2110,10 +2874,9 @@ class Compiler:
         # for this one package so its "opencamlib" destination resolves under the
         # LibPack's site-packages.
         site_packages = os.path.join(self.install_dir, "bin", "Lib", "site-packages")
-        if self.skip_existing:
-            if os.path.exists(os.path.join(site_packages, "opencamlib", "ocl.pyd")):
-                print("  Not rebuilding opencamlib, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("opencamlib"):
+            print("  Not rebuilding opencamlib, it is already in the LibPack")
+            return
         extra_args = [
             "-D BUILD_CXX_LIB=OFF",
             "-D BUILD_PY_LIB=ON",
@@ -2126,10 +2889,9 @@ class Compiler:
     def build_calculix(self, _: None):
         """Cannot currently build Calculix (it's in Fortran, and we only support MSVC toolchain right now). Extract
         the relevant files from the downloaded zipfile and copy them"""
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "bin", "ccx.exe")):
-                print("  Not rebuilding Calculix, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("calculix"):
+            print("  Not rebuilding Calculix, it is already in the LibPack")
+            return
         path_to_ccx_bin = os.path.join(os.getcwd(), "CL35-win64", "bin", "ccx", "218")
         if not os.path.exists(path_to_ccx_bin):
             raise RuntimeError("Could not locate Calculix")
@@ -2142,18 +2904,16 @@ class Compiler:
         )
 
     def build_libE57Format(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "E57Format")):
-                print("  Not rebuilding libE57Format, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("libE57Format"):
+            print("  Not rebuilding libE57Format, it is already in the LibPack")
+            return
         extra_args = ["-D E57_BUILD_TEST=OFF"]
         self._build_standard_cmake(extra_args)
 
     def build_googletest(self, _: None):
-        if self.skip_existing:
-            if os.path.exists(os.path.join(self.install_dir, "include", "gtest")):
-                print("  Not rebuilding googletest, it is already in the LibPack")
-                return
+        if self.skip_existing and self._has_sentinel("googletest"):
+            print("  Not rebuilding googletest, it is already in the LibPack")
+            return
         extra_args = []
         if sys.platform == "win32":
             extra_args.extend(["-D GTEST_FORCE_SHARED_CRT=ON", "-D GTEST_DISABLE_PTHREADS=ON"])
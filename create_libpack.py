@@ -25,18 +25,27 @@
 # At present these are not re-used to create the rest of the LibPack -- if needed, they are rebuilt from source
 
 import argparse
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 import ctypes
+import fnmatch
+import hashlib
 import json
+import multiprocessing
 import os
 from pathlib import Path
 import platform
+import queue
 import shutil
 import stat
 import subprocess
 import tarfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 import path_cleaner
+import timeline
 
 try:
     import requests
@@ -50,12 +59,33 @@ except ImportError:
     print("Please pip install diff-match-patch")
     exit(1)
 
+import build_cache
 import compile_all
+from build_graph import BuildGraph
+from download_cache import DownloadCache
+from git_mirror import GitMirror
+import source_store
+from source_store import SourceStore
 
 path_to_7zip = r"C:\Program Files\7-Zip\7z.exe"
 path_to_bison = r"C:\Program Files\win-flex-bison\win_bison.exe"
 vswhere = r"C:\Program Files (x86)\Microsoft Visual Studio\Installer\vswhere.exe"
 
+# Local store of git mirrors that clone() copies from, if --git-mirror was given
+git_mirror: Optional[GitMirror] = None
+
+# Local store of downloaded archives and their extracted trees, if --download-cache was given
+download_cache: Optional[DownloadCache] = None
+
+# Whether download() leaves each archive in its package directory after extracting it
+keep_archives = True
+
+# How many submodules of one clone are fetched at the same time
+submodule_jobs = 8
+
+# Store of patched checkouts shared by the Debug and Release builds, if --shared-sources was given
+shared_sources: Optional[SourceStore] = None
+
 
 def remove_readonly(func, path, _) -> None:
     """Remove a read-only file."""
@@ -107,6 +137,11 @@ def create_libpack_dir(config: dict, mode: compile_all.BuildMode) -> str:
             backup_name = backup_name[:-1] + chr(ord(backup_name[-1]) + 1)
 
         os.rename(dirname, backup_name)
+        # The records of what is installed, and which package installed each file, describe the
+        # directory just moved aside
+        for suffix in (".packages.json", ".files.json"):
+            if os.path.exists(dirname + suffix):
+                os.rename(dirname + suffix, backup_name + suffix)
     if not os.path.exists(dirname):
         os.mkdir(dirname)
     dirname = os.path.join(dirname, "bin")
@@ -165,26 +200,44 @@ def seed_libpack_dir(config: dict, mode: compile_all.BuildMode, seed_source: str
     print(f"Seeding {os.path.basename(target)} from {os.path.basename(seed_source)}")
     print("  (copying prior build artifacts so unchanged packages are not recompiled)")
     shutil.copytree(seed_source, target)
+    # Carry the index of which package installed each file along with the files, so that
+    # rebuilding a package removes what the seed's copy of it installed
+    if os.path.exists(seed_source + ".files.json"):
+        shutil.copy2(seed_source + ".files.json", target + ".files.json")
     bin_dir = os.path.join(target, "bin")
     os.makedirs(bin_dir, exist_ok=True)
     return bin_dir
 
 
-def _select_url(item: dict) -> str | None:
+def _select_url_key(item: dict) -> str | None:
     if "url" in item:
-        return item["url"]
+        return "url"
     if platform.machine() == "ARM64" and "url-ARM64" in item:
-        return item["url-ARM64"]
+        return "url-ARM64"
     if "url-x64" in item:
-        return item["url-x64"]
+        return "url-x64"
     return None
 
 
+def _select_url(item: dict) -> str | None:
+    key = _select_url_key(item)
+    return item[key] if key else None
+
+
+def _select_sha256(item: dict) -> str | None:
+    """The expected sha256 of the archive _select_url picks, from the matching "sha256",
+    "sha256-x64", or "sha256-ARM64" entry, if there is one."""
+    key = _select_url_key(item)
+    return item.get(key.replace("url", "sha256")) if key else None
+
+
 def fetch_remote_data(
     config: dict,
     mode: compile_all.BuildMode,
     skip_existing: bool = False,
     force_rebuild: set = None,
+    max_workers: int = 8,
+    on_fetched: Optional[Callable[[str, Optional[BaseException]], None]] = None,
 ):
     """Clone the required repos and download the URLs.
 
@@ -192,74 +245,472 @@ def fetch_remote_data(
     Debug builds clone the source (so the package can be built locally against
     the Py_DEBUG ABI), Release builds prefer the prebuilt URL, and if no URL
     matches the current architecture nothing is fetched (the build step is
-    expected to handle the package some other way, e.g. via pip)."""
+    expected to handle the package some other way, e.g. via pip).
+
+    Up to max_workers entries are fetched at once, since fetching is mostly
+    waiting on the network. A clone's patches are applied as soon as that clone
+    finishes. A failed fetch does not stop the others: every failure is reported
+    once all of them have finished, and then the script exits.
+
+    If on_fetched is given, on_fetched(name, error) is called for every entry as
+    soon as its sources are in place (or are not needed), with error set to the
+    exception if fetching it failed."""
     content = config["content"]
     is_debug = mode == compile_all.BuildMode.DEBUG
     force_rebuild = force_rebuild or set()
     for item in content:
+        if ("git-ref" in item or "git-hash" in item) and "git-repo" not in item:
+            print(f"ERROR: found a git ref/hash without a git repo for {item['name']}")
+            exit()
+    pending = []
+    updates = set()
+    stale = []
+    for item in content:
+        if _shares_source(item, is_debug):
+            # A shared checkout never changes, so a link to the right one is always up to date
+            if fetch_plan(item, mode, skip_existing, force_rebuild)[0] == "keep":
+                if on_fetched is not None:
+                    on_fetched(item["name"], None)
+            else:
+                _remove_source(item["name"])
+                pending.append(item)
+            continue
         if item["name"] in force_rebuild:
-            if os.path.exists(item["name"]):
+            if fetch_plan(item, mode, True, force_rebuild)[0] == "update":
+                # A moved git-ref only needs the difference fetched into the existing clone
+                updates.add(item["name"])
+            elif os.path.exists(item["name"]):
                 print(f"Refreshing source for {item['name']} (forced rebuild)")
                 shutil.rmtree(item["name"], onerror=remove_readonly)
         elif skip_existing and os.path.exists(item["name"]):
+            if _patched_differently(item):
+                stale.append(item["name"])
+            elif on_fetched is not None:
+                on_fetched(item["name"], None)
             continue
-        has_git = "git-repo" in item
-        has_any_url = any(k in item for k in ("url", "url-ARM64", "url-x64"))
-        url = _select_url(item)
-        if ("git-ref" in item or "git-hash" in item) and not has_git:
-            print(f"ERROR: found a git ref/hash without a git repo for {item['name']}")
-            exit()
-        if has_git and (not has_any_url or is_debug):
-            clone(
-                item["name"],
-                item["git-repo"],
-                item.get("git-ref"),
-                item.get("git-hash"),
-            )
-            if "patches" in item:
-                cwd = os.getcwd()
-                os.chdir(item["name"])
-                compile_all.patch_files(item["patches"])
-                os.chdir(cwd)
-        elif url is not None:
-            download(item["name"], url)
-        else:
+        if fetch_plan(item, mode, False, set())[0] == "none":
             os.makedirs(item["name"], exist_ok=True)
+            if on_fetched is not None:
+                on_fetched(item["name"], None)
+        else:
+            pending.append(item)
+    if stale:
+        # Found before fetching anything, rather than by a build that fails on the old sources
+        for name in stale:
+            print(
+                f"ERROR: The patches listed for {name} have changed since its existing sources "
+                f"were patched, use --rebuild {name} to fetch and patch them again"
+            )
+            if on_fetched is not None:
+                on_fetched(name, RuntimeError("sources patched with different patches"))
+        exit(1)
+    if not pending:
+        return
+    # Fetch the entries with patches first, so that a patch that no longer applies is found as
+    # early as possible (see FetchPipeline.preflight)
+    pending.sort(key=lambda item: "patches" not in item)
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(_fetch_item, item, is_debug, item["name"] in updates): item["name"]
+            for item in pending
+        }
+        for count, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            error = future.exception()
+            if error is None:
+                print(f"[{count}/{len(futures)}] {future.result()} {name}")
+            else:
+                print(f"[{count}/{len(futures)}] Failed to fetch {name}")
+                failures.append((name, error))
+            if on_fetched is not None:
+                on_fetched(name, error)
+    if failures:
+        for name, error in failures:
+            print(f"ERROR: Failed to fetch {name} ({error!r})")
+            # Don't leave a partial clone or download for --skip-existing-clone to mistake for a
+            # complete one on the next run
+            _remove_source(name)
+        exit(1)
+
+
+def _fetch_item(item: dict, is_debug: bool, update: bool = False) -> str:
+    """Clone (and patch) or download a single config.json entry, returning what was done. If
+    update is set, the entry's existing clone is brought to the configured ref instead, and only
+    re-cloned if that fails. Runs on a fetch worker thread, so neither it nor anything it calls may
+    change the working directory."""
+    name = item["name"]
+    has_any_url = any(k in item for k in ("url", "url-ARM64", "url-x64"))
+    if _shares_source(item, is_debug):
+        with timeline.phase(name, "fetch"):
+            source_store.link(
+                shared_sources.add(item, lambda path: _clone_shared(item, path)), name
+            )
+        return "Linked"
+    if "git-repo" in item and (not has_any_url or is_debug):
+        source = (item["git-repo"], item.get("git-ref"), item.get("git-hash"))
+        with timeline.phase(name, "fetch"):
+            if update and update_clone(name, *source, item.get("submodules")):
+                result = "Updated"
+            else:
+                clone(name, *source, item.get("submodules"))
+                result = "Cloned"
+        if "patches" in item:
+            with timeline.phase(name, "patch"):
+                compile_all.patch_files(item["patches"], name)
+        _record_patches(item)
+        return result
+    with timeline.phase(name, "fetch"):
+        download(name, _select_url(item), _select_sha256(item))
+    return "Downloaded"
+
+
+# The file in a clone's .git directory that records which patches were applied to it
+PATCH_RECORD = "libpack-patches.json"
 
 
-def clone(name: str, url: str, ref: str = None, hash: str = None):
-    """Shallow clones a git repo at the given ref using a system-installed git"""
+def _patch_digests(item: dict) -> List[str]:
+    root = os.path.dirname(os.path.abspath(__file__))
+    return [build_cache.file_digest(os.path.join(root, patch)) for patch in item.get("patches", [])]
+
+
+def _record_patches(item: dict):
+    """Record which patches were applied to a fresh clone, in a file inside its .git directory."""
+    git_dir = os.path.join(item["name"], ".git")
+    if os.path.isdir(git_dir):
+        with open(os.path.join(git_dir, PATCH_RECORD), "w", encoding="utf-8") as f:
+            json.dump(_patch_digests(item), f)
+
+
+def _patched_differently(item: dict) -> bool:
+    """Whether an existing clone was patched with other patches than its config.json entry now
+    lists (or different versions of them). A clone without a record of its patches, made before
+    they were recorded, is assumed to be up to date."""
+    try:
+        with open(os.path.join(item["name"], ".git", PATCH_RECORD), "r", encoding="utf-8") as f:
+            return json.load(f) != _patch_digests(item)
+    except (OSError, ValueError):
+        return False
+
+
+def _shares_source(item: dict, is_debug: bool) -> bool:
+    """Whether a config.json entry is cloned into the shared source store and linked into the
+    working directory, rather than cloned into the working directory itself."""
+    if shared_sources is None or item["name"] in compile_all.Compiler.IN_SOURCE_BUILDS:
+        return False
+    has_any_url = any(k in item for k in ("url", "url-ARM64", "url-x64"))
+    return "git-repo" in item and (not has_any_url or is_debug)
+
+
+def _clone_shared(item: dict, path: str):
+    """Clone and patch a config.json entry at path, for the shared source store."""
+    source = (item["git-repo"], item.get("git-ref"), item.get("git-hash"))
+    clone(path, *source, item.get("submodules"))
+    if "patches" in item:
+        with timeline.phase(item["name"], "patch"):
+            compile_all.patch_files(item["patches"], path)
+
+
+def _remove_source(name: str):
+    """Remove a package's sources from the working directory: just the link, if they are linked
+    from the shared source store."""
+    if source_store.linked(name) is not None:
+        source_store.unlink(name)
+    elif os.path.lexists(name):
+        shutil.rmtree(name, onerror=remove_readonly)
+
+
+def _fetch_in_background(settings: dict, args: tuple, results):
+    """Entry point of a FetchPipeline's fetch process: run fetch_remote_data with the given
+    arguments, putting a ("fetched", name, error) message on the results queue for each entry as it
+    finishes, and a final ("done", timeline events) message however fetching ends."""
+    global git_mirror, download_cache, keep_archives, submodule_jobs, path_to_7zip, shared_sources
+    path_to_7zip = settings["7zip"]
+    shared_sources = SourceStore(settings["shared_sources"]) if settings["shared_sources"] else None
+    git_mirror = GitMirror(settings["git_mirror"]) if settings["git_mirror"] else None
+    download_cache = (
+        DownloadCache(settings["download_cache"]) if settings["download_cache"] else None
+    )
+    keep_archives = settings["keep_archives"]
+    submodule_jobs = settings["submodule_jobs"]
+
+    def fetched(name: str, error: Optional[BaseException]):
+        results.put(("fetched", name, None if error is None else repr(error)))
+
+    try:
+        fetch_remote_data(*args, on_fetched=fetched)
+    finally:
+        results.put(("done", timeline.take()))
+
+
+# The error FetchPipeline reports for a package whose fetch never started
+FETCH_STOPPED = "fetching stopped before reaching it"
+
+
+class FetchPipeline:
+    """Fetches the sources of every config.json entry in a separate process while the build runs,
+    so that building starts as soon as the first package's sources are in place and each build
+    waits only for its own sources. The fetch runs in its own process rather than on a thread
+    because the build methods change the working directory as they go."""
+
+    def __init__(
+        self,
+        config: dict,
+        mode: compile_all.BuildMode,
+        skip_existing: bool,
+        force_rebuild: set,
+        max_workers: int,
+    ):
+        self._ready: Dict[str, Future] = {item["name"]: Future() for item in config["content"]}
+        self._patched = [item["name"] for item in config["content"] if "patches" in item]
+        self._errors: Dict[str, str] = {}
+        settings = {
+            "7zip": path_to_7zip,
+            "git_mirror": git_mirror.root if git_mirror is not None else None,
+            "download_cache": download_cache.root if download_cache is not None else None,
+            "keep_archives": keep_archives,
+            "submodule_jobs": submodule_jobs,
+            "shared_sources": shared_sources.root if shared_sources is not None else None,
+        }
+        args = (config, mode, skip_existing, force_rebuild, max_workers)
+        self._results = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_fetch_in_background, args=(settings, args, self._results)
+        )
+        self._process.start()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _collect(self):
+        while True:
+            try:
+                message = self._results.get(timeout=1)
+            except queue.Empty:
+                if self._process.is_alive():
+                    continue
+                message = ("done", [])  # The fetch process died without saying so
+            if message[0] == "fetched":
+                _, name, error = message
+                if error is not None:
+                    self._errors[name] = error
+                if not self._ready[name].done():
+                    self._ready[name].set_result(None)
+            else:
+                timeline.merge(message[1])
+                for name, ready in self._ready.items():
+                    if not ready.done():
+                        self._errors[name] = FETCH_STOPPED
+                        ready.set_result(None)
+                return
+
+    def _report_errors(self):
+        """Print every fetch failure, leaving out the packages that were never reached when there
+        are failures that explain why."""
+        errors = {name: error for name, error in self._errors.items() if error != FETCH_STOPPED}
+        for name, error in sorted((errors or self._errors).items()):
+            print(f"ERROR: Failed to fetch {name} ({error})")
+
+    def preflight(self):
+        """Block until the sources of every entry with patches are in place, which means that
+        their patches have all been checked and applied, and exit if any could not be fetched or
+        patched. These entries are fetched first, so calling this before the first build starts
+        finds a patch that no longer applies within minutes of starting, rather than once the
+        build reaches it, perhaps hours later."""
+        waiting = [name for name in self._patched if not self._ready[name].done()]
+        if waiting:
+            print(f"Waiting for the patched sources of {len(waiting)} package(s)")
+        for name in waiting:
+            self._ready[name].result()
+        if self._errors:
+            self._report_errors()
+            exit(1)
+
+    def fetched(self, name: str) -> Optional[Future]:
+        """A Future that completes once the sources of the named package are in place, or could
+        not be fetched."""
+        return self._ready.get(name)
+
+    def wait(self, name: str):
+        """Block until the sources of the named package are in place. Exits if they, or the sources
+        of any other package fetched so far, could not be fetched (a patch that no longer applies,
+        for example)."""
+        ready = self._ready.get(name)
+        if ready is None:
+            return
+        if not ready.done():
+            print(f"  Waiting for the sources of {name}")
+            with timeline.phase(name, "wait"):
+                ready.result()
+        if name in self._errors:
+            print(f"ERROR: Failed to fetch {name} ({self._errors[name]})")
+            exit(1)
+        if self._errors:
+            # Stop at the next package rather than building on until a package needs the missing
+            # sources, perhaps hours later
+            self._report_errors()
+            exit(1)
+
+    def finish(self):
+        """Wait for the fetch process to end. Exits if any fetch failed, even for a package whose
+        build did not need its sources."""
+        self._collector.join()
+        self._process.join()
+        if self._errors or self._process.exitcode != 0:
+            exit(self._process.exitcode or 1)
+
+
+def fetch_plan(
+    item: dict, mode: compile_all.BuildMode, skip_existing: bool, force_rebuild: set
+) -> Tuple[str, str]:
+    """What fetch_remote_data would do with a config.json entry: an (action, reason) pair, where
+    action is "clone", "update" (bring an existing clone to the configured ref), "link" (to a
+    checkout already in the shared source store), "download", "keep", or "none"."""
+    is_debug = mode == compile_all.BuildMode.DEBUG
+    has_git = "git-repo" in item
+    has_any_url = any(k in item for k in ("url", "url-ARM64", "url-x64"))
+    if has_git and (not has_any_url or is_debug):
+        action = "clone"
+    elif _select_url(item) is not None:
+        action = "download"
+    else:
+        return "none", "nothing to fetch"
+    if _shares_source(item, is_debug):
+        path = os.path.realpath(shared_sources.path(item))
+        if source_store.linked(item["name"]) == path:
+            return "keep", "linked to the shared source store"
+        if os.path.isdir(path):
+            return "link", "in the shared source store"
+        return "clone", "not in the shared source store"
+    if item["name"] in force_rebuild:
+        if action == "clone" and os.path.isdir(os.path.join(item["name"], ".git")):
+            return "update", "forced by --rebuild, existing clone"
+        return action, "forced by --rebuild"
+    if not os.path.exists(item["name"]):
+        return action, "source not present"
+    if not skip_existing:
+        return action, "forced by --no-skip-existing-clone"
+    return "keep", "source present"
+
+
+def _format_duration(seconds: float) -> str:
+    minutes = round(seconds / 60)
+    return f"{minutes // 60}h {minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m"
+
+
+def print_plan(
+    config: dict,
+    mode: compile_all.BuildMode,
+    compiler: compile_all.Compiler,
+    skip_existing_clone: bool,
+    force_rebuild: set,
+):
+    """Report what a build would fetch, rebuild, restore from the cache, or skip, and why, and
+    estimate how long it would take from the timings recorded by previous runs. The estimate
+    accounts for --parallel-packages by simulating the build schedule, and is followed by the
+    critical path: the chain of dependent builds that bounds the build time however many
+    packages are allowed to build at once."""
+    fresh = not skip_existing_clone or not os.path.exists(compiler.install_dir)
+    history = timeline.load_history(
+        os.path.join(os.path.dirname(compiler.install_dir), timeline.HISTORY_FILE)
+    )
+    builds = {name: (action, reason) for name, action, reason in compiler.plan(fresh)}
+    fetch_total = 0.0
+    build_seconds = {}
+    unknown = []
+    print(f"{'Package':<16} {'Fetch':<44} Build")
+    for item in config["content"]:
+        name = item["name"]
+        fetch_action, fetch_reason = fetch_plan(item, mode, skip_existing_clone, force_rebuild)
+        build_action, build_reason = builds[name]
+        phases = []
+        if fetch_action in ("clone", "update", "download"):
+            phases.append("fetch")
+            if "patches" in item and fetch_action != "download":
+                phases.append("patch")
+        if build_action in ("build", "rebuild"):
+            phases.append("package")
+        elif build_action == "cached":
+            phases.append("restore")
+        for phase in phases:
+            seconds = timeline.estimate(history, name, phase)
+            if seconds is None:
+                unknown.append(name)
+            elif phase in ("fetch", "patch"):
+                fetch_total += seconds
+            else:
+                build_seconds[name] = build_seconds.get(name, 0.0) + seconds
+        fetch_column = f"{fetch_action} ({fetch_reason})"
+        print(f"{name:<16} {fetch_column:<44} {build_action} ({build_reason})")
+    # Everything is fetched before anything is built, so fetch time adds to the build schedule
+    try:
+        graph = BuildGraph(config["content"])
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        exit(1)
+    slots = compiler.parallel_packages
+    build_total = sum(build_seconds.values())
+    if slots > 1:
+        build_time = graph.simulate(build_seconds, slots, graph.bottom_levels(build_seconds))
+    else:
+        build_time = build_total
+    print()
+    print(f"Estimated time: {_format_duration(fetch_total + build_time)}")
+    if unknown:
+        print("  Excludes packages with no recorded timings: " + ", ".join(sorted(set(unknown))))
+    path = [name for name in graph.critical_path(build_seconds) if build_seconds.get(name)]
+    if path:
+        path_total = sum(build_seconds[name] for name in path)
+        print(f"Critical path: {' -> '.join(path)} ({_format_duration(path_total)})")
+        print(
+            f"  Building takes at least {_format_duration(max(path_total, build_total / slots))} "
+            f"with {slots} package(s) at once, and never less than the critical path however "
+            "many are allowed"
+        )
+
+
+def clone(name: str, url: str, ref: str = None, hash: str = None, submodules: List[str] = None):
+    """Shallow clones a git repo at the given ref, or at the given commit hash if there is no ref,
+    using a system-installed git. With a git mirror
+    store, the clone is made from the repo's local mirror, which is updated first. If submodules
+    is given, only the submodules whose paths it selects are initialized (see
+    update_submodules)."""
     try:
         if ref is None:
             print(f"Cloning {url}")
         else:
             print(f"Cloning {url} at {ref}")
-        args = ["git", "clone"]
-        if ref is not None:
-            args.extend(["--branch", ref, "--depth", "1"])
-        elif hash is None:
-            args.extend(["--depth", "1"])
-        args.extend([url, name])
-        subprocess.run(args, capture_output=True, check=True)
-
-        if hash is not None:
-            print(f"  Checking out {hash}")
-            os.chdir(name)
-            subprocess.run(["git", "checkout", hash], capture_output=True, check=True)
-            os.chdir("..")
+        if ref is None and hash is not None:
+            _fetch_commit(name, url, hash)
+        else:
+            args = ["git", "clone"]
+            if ref is not None:
+                args.extend(["--branch", ref, "--depth", "1"])
+            else:
+                args.extend(["--depth", "1"])
+            if git_mirror is None:
+                args.extend([url, name])
+            else:
+                args.extend([git_mirror.source(git_mirror.update(url), True), name])
+            subprocess.run(args, capture_output=True, check=True)
+            if git_mirror is not None:
+                subprocess.run(
+                    ["git", "remote", "set-url", "origin", url],
+                    cwd=name,
+                    capture_output=True,
+                    check=True,
+                )
+
+            if hash is not None:
+                print(f"  Checking out {hash}")
+                subprocess.run(["git", "checkout", hash], cwd=name, capture_output=True, check=True)
 
         # Qt's qt5 supermodule contains dozens of submodules and we only build a few. Its
         # configure.bat handles selective submodule initialization via -init-submodules, so
         # cloning the supermodule alone is much faster than recursively initializing every
         # submodule here.
         if name != "qt":
-            os.chdir(name)
-            subprocess.run(
-                ["git", "submodule", "update", "--init", "--recursive", "--depth", "1"],
-                capture_output=True,
-                check=True,
-            )
-            os.chdir("..")
+            update_submodules(name, submodules)
 
     except subprocess.CalledProcessError as e:
         print(f"ERROR: failed to clone git repo {url} at ref {ref}")
@@ -267,48 +718,455 @@ def clone(name: str, url: str, ref: str = None, hash: str = None):
         exit(e.returncode)
 
 
-def download(name: str, url: str):
+def _fetch_commit(name: str, url: str, hash: str):
+    """Create a clone of url at name holding just the commit hash, without its history. A shallow
+    clone can only start from a branch or tag, so instead an empty repo is created and the one
+    commit fetched into it by its hash. Servers that refuse to serve a commit by hash get a full
+    fetch instead."""
+    print(f"  Fetching {hash}")
+    source = url if git_mirror is None else git_mirror.source(git_mirror.update(url), True)
+    subprocess.run(["git", "init", "-q", name], capture_output=True, check=True)
+    subprocess.run(
+        ["git", "remote", "add", "origin", source], cwd=name, capture_output=True, check=True
+    )
+    target = "FETCH_HEAD"
+    try:
+        subprocess.run(
+            ["git", "fetch", "--depth", "1", "origin", hash],
+            cwd=name,
+            capture_output=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError:
+        print(f"  WARNING: {url} did not serve {hash} on its own, fetching its full history")
+        subprocess.run(["git", "fetch", "origin"], cwd=name, capture_output=True, check=True)
+        target = hash
+    subprocess.run(["git", "checkout", "-q", target], cwd=name, capture_output=True, check=True)
+    if git_mirror is not None:
+        subprocess.run(
+            ["git", "remote", "set-url", "origin", url], cwd=name, capture_output=True, check=True
+        )
+
+
+def update_clone(
+    name: str, url: str, ref: str = None, hash: str = None, submodules: List[str] = None
+) -> bool:
+    """Bring the existing clone at name to the given ref (or commit hash) in place: fetch just that
+    commit, reset to it, and discard every local change and untracked file, including applied
+    patches and build directories, in the clone and in its submodules. Returns False, having
+    removed the clone, if it cannot be updated (for example because it was cloned from a different
+    repo), so the caller can clone it afresh."""
+    try:
+        origin = subprocess.run(
+            ["git", "remote", "get-url", "origin"],
+            cwd=name,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        if origin != url:
+            raise subprocess.CalledProcessError(0, "git remote get-url origin", origin)
+        print(f"Updating {name} to {ref if ref is not None else hash}")
+        source = url if git_mirror is None else git_mirror.source(git_mirror.update(url), True)
+        target = ref if ref is not None else hash if hash is not None else "HEAD"
+        for args in (
+            ["git", "fetch", "--depth", "1", source, target],
+            ["git", "reset", "-q", "--hard", "FETCH_HEAD"],
+            ["git", "clean", "-ffdxq"],
+            [
+                "git",
+                "submodule",
+                "foreach",
+                "--recursive",
+                "git reset -q --hard && git clean -ffdxq",
+            ],
+        ):
+            subprocess.run(args, cwd=name, capture_output=True, check=True)
+        if ref is not None and hash is not None:
+            print(f"  Checking out {hash}")
+            subprocess.run(["git", "checkout", hash], cwd=name, capture_output=True, check=True)
+        if name != "qt":  # See clone()
+            update_submodules(name, submodules)
+        return True
+    except subprocess.CalledProcessError:
+        print(f"  Could not update the existing clone of {name}, cloning it again")
+        shutil.rmtree(name, onerror=remove_readonly)
+        return False
+
+
+def update_submodules(repo: str, selection: List[str] = None):
+    """Initialize and shallowly check out the submodules of the clone at repo, recursively, up to
+    submodule_jobs of them at a time, reporting how long each one took. With a git mirror store,
+    each submodule is cloned from its own mirror, and its origin then set back to its upstream URL
+    before its own submodules are handled the same way.
+
+    selection is the "submodules" list of the config.json entry: glob patterns matched against the
+    submodule paths listed in .gitmodules, where a pattern starting with "!" removes the paths it
+    matches. Only the selected submodules are initialized, but every submodule they contain in
+    turn is, since they need those to build."""
+    init = ["git", "submodule", "init"]
+    if selection is not None:
+        paths = [path for path in _declared_submodule_paths(repo) if _selected(path, selection)]
+        if not paths:
+            print(f"  WARNING: none of the submodules of {repo} match its submodules list")
+            return
+        print(f"  Initializing {len(paths)} selected submodules of {repo}")
+        init += ["--"] + paths
+    subprocess.run(init, cwd=repo, capture_output=True, check=True)
+    submodules = _initialized_submodules(repo)
+    if not submodules:
+        return
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, submodule_jobs)) as executor:
+        futures = {
+            executor.submit(_update_submodule, repo, name, path, url): path
+            for name, path, url in submodules
+        }
+        for count, future in enumerate(as_completed(futures), start=1):
+            path = os.path.join(repo, futures[future])
+            error = future.exception()
+            if error is None:
+                print(f"  [{count}/{len(futures)}] {path} ({future.result():.1f}s)")
+            else:
+                print(f"  [{count}/{len(futures)}] {path} failed")
+                errors.append(error)
+    if errors:
+        raise errors[0]
+
+
+def _declared_submodule_paths(repo: str) -> List[str]:
+    """The path of every submodule listed in the .gitmodules file of the clone at repo."""
+    result = subprocess.run(
+        ["git", "config", "-f", ".gitmodules", "--get-regexp", r"^submodule\..*\.path$"],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return []  # No .gitmodules file
+    return [line.split(" ", 1)[1] for line in result.stdout.splitlines()]
+
+
+def _selected(path: str, selection: List[str]) -> bool:
+    """Whether a submodule path matches a "submodules" list: at least one of its plain patterns,
+    and none of its "!" patterns."""
+    included = any(fnmatch.fnmatchcase(path, p) for p in selection if not p.startswith("!"))
+    excluded = any(fnmatch.fnmatchcase(path, p[1:]) for p in selection if p.startswith("!"))
+    return included and not excluded
+
+
+def _initialized_submodules(repo: str) -> List[Tuple[str, str, str]]:
+    """(name, path, URL) of each submodule "git submodule init" has registered in the clone at
+    repo, with relative URLs already resolved against the superproject's origin."""
+    result = subprocess.run(
+        ["git", "config", "--get-regexp", r"^submodule\..*\.url$"],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return []  # No submodules
+    submodules = []
+    for line in result.stdout.splitlines():
+        key, url = line.split(" ", 1)
+        name = key[len("submodule.") : -len(".url")]
+        path = subprocess.run(
+            ["git", "config", "-f", ".gitmodules", f"submodule.{name}.path"],
+            cwd=repo,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        submodules.append((name, path, url))
+    return submodules
+
+
+def _update_submodule(repo: str, name: str, path: str, url: str) -> float:
+    """Check out one submodule (and its submodules), returning how many seconds it took. Runs on a
+    submodule worker thread. Each call names its submodule explicitly, and the mirror URL is given
+    on the command line rather than written to .git/config, so concurrent calls never contend for
+    the superproject's config file."""
+    start = time.time()
+    args = ["git"]
+    if git_mirror is not None:
+        source = git_mirror.source(git_mirror.update(url), True)
+        args += ["-c", "protocol.file.allow=always", "-c", f"submodule.{name}.url={source}"]
+    args += ["submodule", "update", "--depth", "1"]
+    if git_mirror is None:
+        args.append("--recursive")
+    subprocess.run(args + ["--", path], cwd=repo, capture_output=True, check=True)
+    if git_mirror is not None:
+        submodule = os.path.join(repo, path)
+        subprocess.run(
+            ["git", "remote", "set-url", "origin", url],
+            cwd=submodule,
+            capture_output=True,
+            check=True,
+        )
+        update_submodules(submodule)
+    return time.time() - start
+
+
+# How many times a download that breaks off partway is resumed before giving up
+DOWNLOAD_ATTEMPTS = 5
+
+# Archives that download() extracts as they arrive, rather than writing them to disk first
+TAR_SUFFIXES = (".tar.gz", ".tar.bz2", ".tar.xz")
+
+
+def download(name: str, url: str, sha256: str = None):
     """Directly downloads some sort of compressed format file and decompresses it (either using an internal
-    python method, or using a system-installed 7-zip)"""
-    print(f"Downloading {name} from {url}")
-    os.mkdir(name)
-    request_result = requests.get(url)
+    python method, or using a system-installed 7-zip). The file is streamed to disk in chunks, into a
+    <name>-<filename>.part file beside the package directory that is kept if the download fails, so that the
+    next attempt (in this run, or a later one) resumes with an HTTP Range request rather than starting over.
+    Tar archives are instead extracted as they arrive (see _stream_extract), falling back to this if the
+    transfer breaks off. If sha256 is given, the file's checksum, computed as it streams, must match it. With
+    a download cache, an archive the cache already holds is materialized from it without touching the
+    network."""
     parsed_url = urlparse(url)
     filename = parsed_url.path.rsplit("/", 1)[-1]
-    with open(os.path.join(name, filename), "wb") as f:
-        f.write(request_result.content)
+    if download_cache is not None and _download_from_cache(name, url, filename, sha256):
+        if not keep_archives and os.path.exists(os.path.join(name, filename)):
+            os.remove(os.path.join(name, filename))
+        return
+    print(f"Downloading {name} from {url}")
+    partial = f"{name}-{filename}.part"
+    digest = None
+    if filename.endswith(TAR_SUFFIXES) and not os.path.exists(partial):
+        digest = _stream_extract(name, url, filename, partial)
+        if digest is not None:
+            _check_sha256(name, filename, digest, sha256, partial)
+    if digest is None:
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                digest = _download_to(url, partial)
+                break
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                if attempt == DOWNLOAD_ATTEMPTS:
+                    print(f"ERROR: failed to download {url} ({e})")
+                    exit(1)
+                print(f"  Download of {name} interrupted ({e}), resuming")
+            except requests.HTTPError as e:
+                print(f"ERROR: failed to download {url} ({e})")
+                exit(1)
+        _check_sha256(name, filename, digest, sha256, partial)
+        os.mkdir(name)
+        os.replace(partial, os.path.join(name, filename))
+        if download_cache is not None:
+            download_cache.store_archive(url, digest, os.path.join(name, filename))
+        decompress(name, filename)
+    elif download_cache is not None and keep_archives:
+        download_cache.store_archive(url, digest, os.path.join(name, filename))
+    elif download_cache is not None:
+        download_cache.record(url, digest)
+    if download_cache is not None:
+        download_cache.store_tree(digest, name, filename)
+    if not keep_archives and os.path.exists(os.path.join(name, filename)):
+        os.remove(os.path.join(name, filename))
+
+
+def _check_sha256(name: str, filename: str, digest: str, sha256: Optional[str], partial: str):
+    """Exit if the downloaded archive does not have the expected sha256 (if there is one), after
+    removing everything downloaded or extracted so that nothing unverified is used later."""
+    if sha256 is not None and digest != sha256.lower():
+        print(f"ERROR: checksum mismatch for {filename}: expected {sha256}, got {digest}")
+        if os.path.exists(partial):
+            os.remove(partial)
+        if os.path.exists(name):
+            shutil.rmtree(name, onerror=remove_readonly)
+        exit(1)
+
+
+class _StreamReader:
+    """A file-like view of an HTTP response body, for tarfile's stream mode. A background thread
+    pulls chunks off the network into a bounded queue while tarfile decompresses and writes out the
+    earlier ones, so the two overlap. Every chunk is fed to a sha256 and, if copy_to is given,
+    copied to that file."""
+
+    def __init__(self, response, copy_to=None):
+        self.digest = hashlib.sha256()
+        self._copy_to = copy_to
+        self._queue = queue.Queue(maxsize=16)
+        self._closed = threading.Event()
+        self._chunk = b""
+        self._offset = 0
+        self._done = False
+        self._thread = threading.Thread(target=self._receive, args=(response,), daemon=True)
+        self._thread.start()
+
+    def _receive(self, response):
+        try:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                if not self._put(chunk):
+                    return
+        except BaseException as e:
+            self._put(e)
+            return
+        self._put(b"")
+
+    def _put(self, item) -> bool:
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _next_chunk(self) -> bool:
+        if self._done:
+            return False
+        item = self._queue.get()
+        if isinstance(item, BaseException):
+            raise item
+        if not item:
+            self._done = True
+            return False
+        self.digest.update(item)
+        if self._copy_to is not None:
+            self._copy_to.write(item)
+        self._chunk, self._offset = item, 0
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0:
+            if self._offset == len(self._chunk) and not self._next_chunk():
+                break
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._offset + size)
+            parts.append(self._chunk[self._offset : end])
+            if size > 0:
+                size -= end - self._offset
+            self._offset = end
+        return b"".join(parts)
+
+    def close(self):
+        """Stop the receiving thread, if it has not finished."""
+        self._closed.set()
+        self._thread.join()
+
+
+def _stream_extract(name: str, url: str, filename: str, partial: str) -> Optional[str]:
+    """Download a tar archive and extract it into the directory name while it arrives, without
+    writing the archive to disk first. With keep_archives, a copy of the archive is written to
+    partial as it streams, and moved into name once the download completes. Returns the archive's
+    sha256, or None if the transfer broke off, in which case the partly extracted directory is
+    removed and whatever arrived is left in partial for download() to resume."""
+    os.mkdir(name)
+    copy_to = open(partial, "wb") if keep_archives else None
+    try:
+        with requests.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            reader = _StreamReader(response, copy_to)
+            try:
+                with tarfile.open(fileobj=reader, mode="r|*") as archive:
+                    archive.extractall(name, filter="data")
+                # Anything after the end of the tar data still counts toward the sha256
+                while reader.read(1024 * 1024):
+                    pass
+            finally:
+                reader.close()
+    except (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    ) as e:
+        print(f"  Download of {name} interrupted ({e}), resuming without streaming")
+        shutil.rmtree(name, onerror=remove_readonly)
+        return None
+    except requests.HTTPError as e:
+        print(f"ERROR: failed to download {url} ({e})")
+        exit(1)
+    except tarfile.TarError as e:
+        print(f"ERROR: failed to extract {filename} ({e})")
+        exit(1)
+    finally:
+        if copy_to is not None:
+            copy_to.close()
+    if copy_to is not None:
+        os.replace(partial, os.path.join(name, filename))
+    return reader.digest.hexdigest()
+
+
+def _download_from_cache(name: str, url: str, filename: str, sha256: Optional[str]) -> bool:
+    """Materialize the download of url into name from the download cache: a copy of the extracted
+    tree if the cache has one, or else the cached archive, decompressed. Returns False if the cache
+    holds neither."""
+    digest = download_cache.lookup(url, sha256)
+    if digest is None:
+        return False
+    tree = download_cache.tree(digest)
+    if tree is not None:
+        print(f"Copying {name} from the download cache")
+        shutil.copytree(tree, name)
+        return True
+    print(f"Extracting {name} from the download cache")
+    os.mkdir(name)
+    shutil.copy2(download_cache.archive(digest), os.path.join(name, filename))
     decompress(name, filename)
+    download_cache.store_tree(digest, name, filename)
+    return True
+
+
+def _download_to(url: str, partial: str) -> str:
+    """Stream url into the file partial, continuing from its current length if it already exists,
+    and return the sha256 of the whole file."""
+    digest = hashlib.sha256()
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        if offset and response.status_code == 206:
+            mode = "ab"
+            _hash_file(partial, digest)
+        elif offset and response.status_code == 416:
+            # Nothing left to send: the part on disk is already the whole file
+            _hash_file(partial, digest)
+            return digest.hexdigest()
+        else:
+            # A fresh download, or the server ignored the Range header and is sending it all again
+            response.raise_for_status()
+            mode = "wb"
+        with open(partial, mode) as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_file(path: str, digest: "hashlib._Hash"):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
 
 
 def decompress(name: str, filename: str):
-    original_dir = os.getcwd()
-    os.chdir(name)
+    """Unpack the archive name/filename into the directory name. Works relative to the current
+    directory without changing it, so that several downloads can decompress at once."""
     if filename.endswith("7z") or filename.endswith("7zip"):
         try:
-            subprocess.run([path_to_7zip, "x", filename], capture_output=True, check=True)
+            subprocess.run([path_to_7zip, "x", filename], cwd=name, capture_output=True, check=True)
         except subprocess.CalledProcessError as e:
             print(f"ERROR: failed to unzip {filename} at from {name} using {path_to_7zip}")
             print(e.output)
             exit(e.returncode)
-    elif (
-        filename.endswith(".tar.gz")
-        or filename.endswith(".tar.bz2")
-        or filename.endswith(".tar.xz")
-    ):
+    elif filename.endswith(TAR_SUFFIXES):
         try:
-            with tarfile.open(filename) as f:
-                f.extractall(filter="data")
+            with tarfile.open(os.path.join(name, filename)) as f:
+                f.extractall(name, filter="data")
         except tarfile.TarError as e:
             print(e)
             exit(1)
     else:  # Try to use 7-zip to see if it's something understandable to that program
         try:
-            subprocess.run([path_to_7zip, "x", filename], capture_output=True, check=True)
+            subprocess.run([path_to_7zip, "x", filename], cwd=name, capture_output=True, check=True)
         except subprocess.CalledProcessError as e:
-            print("ERROR: failed to unzip {filename} at from {name} using {path_to_7zip}")
+            print(f"ERROR: failed to unzip {filename} at from {name} using {path_to_7zip}")
             print(e.output)
             exit(e.returncode)
-    os.chdir(original_dir)
 
 
 def create_archive(libpack_path: str) -> str:
@@ -428,6 +1286,46 @@ def build_vswhere_args(vs_version: str) -> list:
     return [base[0], "-version", version_range] + base[1:]
 
 
+def configure_toolchain(compiler: compile_all.Compiler, vs_version: str, vcvars_ver: str):
+    """Locate the requested Visual Studio installation and set up the compiler's init script (the
+    vcvars batch file every build command is prefixed with) and MSVC tools version."""
+    vs_install_path = subprocess.check_output(
+        build_vswhere_args(vs_version),
+        text=True,
+    ).strip()
+    if not vs_install_path:
+        print(
+            f"ERROR: vswhere returned no Visual Studio installation matching "
+            f"--vs-version={vs_version!r}"
+        )
+        exit(1)
+
+    base_path = Path(vs_install_path) / "VC" / "Auxiliary" / "Build"
+    if platform.machine() == "ARM64":
+        init_bat = str(base_path / "vcvarsarm64.bat")
+    else:
+        init_bat = str(base_path / "vcvars64.bat")
+    # vcvars internally shells out to vswhere.exe to enumerate installed MSVC tool
+    # versions. If vswhere is not on PATH, vcvars silently ignores -vcvars_ver and
+    # falls back to the latest installed compiler. Prepend the vswhere directory to
+    # PATH so child subprocesses inherit it and -vcvars_ver is honored.
+    vswhere_dir = os.path.dirname(vswhere)
+    if vswhere_dir and vswhere_dir not in os.environ.get("PATH", "").split(os.pathsep):
+        os.environ["PATH"] = vswhere_dir + os.pathsep + os.environ.get("PATH", "")
+    if vcvars_ver:
+        compiler.init_script = [init_bat, f"-vcvars_ver={vcvars_ver}"]
+        compiler.msvc_tools_version = resolve_msvc_tools_version(vs_install_path, vcvars_ver)
+        if not compiler.msvc_tools_version:
+            print(
+                f"ERROR: No installed MSVC tools matching --vcvars-ver={vcvars_ver!r} "
+                f"under {vs_install_path}\\VC\\Tools\\MSVC. Available: "
+                f"{list_msvc_tools_versions(vs_install_path)}"
+            )
+            exit(1)
+    else:
+        compiler.init_script = [init_bat]
+
+
 @contextmanager
 def prevent_sleep_mode():
     system = platform.system()
@@ -489,12 +1387,10 @@ if __name__ == "__main__":
         "--rebuild",
         help=(
             "Comma-separated list of package names to force a fresh clone and rebuild of, even "
-            "when skip-existing is in effect for everything else. Use this to update a single "
-            "dependency and its dependents without disturbing unrelated packages. For example, "
-            "to update OpenCASCADE and the packages that link against it: "
-            "--rebuild opencascade,netgen,gmsh,opencamlib,ifcopenshell. "
-            "(A future enhancement could derive the dependent set automatically from a "
-            "dependency graph in config.json rather than requiring the list to be spelled out.)"
+            "when skip-existing is in effect for everything else. Every package that depends on "
+            "a named package, directly or transitively (per the 'depends' fields in "
+            "config.json), is rebuilt as well, so --rebuild opencascade also rebuilds netgen, "
+            "gmsh, and ifcopenshell. Unrelated packages are not disturbed."
         ),
         default="",
     )
@@ -530,6 +1426,121 @@ if __name__ == "__main__":
             "sibling .7z archive suitable for distribution."
         ),
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help=(
+            "Total number of cores the build may use. The budget is shared by every build command "
+            "(CMake, MSBuild, nmake, pip, PySide): a package building alone gets every core, and "
+            "packages building at once (see --parallel-packages) share them. Defaults to letting "
+            "each build tool choose its own parallelism."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--parallel-packages",
+        type=int,
+        help=(
+            "Maximum number of packages to build at the same time. Packages start as soon as "
+            "every package listed in their config.json 'depends' field is installed. The default "
+            "of 1 builds the packages one at a time in config.json order."
+        ),
+        default=1,
+    )
+    parser.add_argument(
+        "--git-mirror",
+        help=(
+            "Directory of bare git mirrors to clone from. Each repository (and submodule) is "
+            "mirrored there on first use and updated with an incremental fetch afterwards, so "
+            "the store can be shared by Debug and Release builds and by every LibPack version. "
+            "If a mirror cannot be updated, its existing contents are used."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--download-cache",
+        help=(
+            "Directory in which to keep every archive downloaded from a 'url', 'url-x64', or "
+            "'url-ARM64' entry, along with the tree it extracts to, addressed by the archive's "
+            "sha256. A URL the cache has served before (or whose 'sha256' the cache holds) is "
+            "copied from the cache without touching the network. The directory can be shared by "
+            "Debug and Release builds and by every LibPack version."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--no-keep-archives",
+        action="store_false",
+        help=(
+            "Delete each downloaded archive once it has been extracted. Tar archives are then "
+            "never written to disk at all: they are extracted as they download."
+        ),
+    )
+    parser.add_argument(
+        "--submodule-jobs",
+        type=int,
+        help=(
+            "Maximum number of submodules of a single clone (Boost has over 150) to fetch at the "
+            "same time. Each submodule's fetch time is reported as it finishes."
+        ),
+        default=8,
+    )
+    parser.add_argument(
+        "--fetch-jobs",
+        type=int,
+        help=(
+            "Maximum number of git clones and downloads to run at the same time. Failed fetches "
+            "are reported together once the rest have finished."
+        ),
+        default=8,
+    )
+    parser.add_argument(
+        "--shared-sources",
+        help=(
+            "Directory holding one patched, read-only checkout of each cloned package, shared by "
+            "the Debug and Release builds (and by other LibPack versions using the same sources) "
+            "and linked into each working directory. Packages that build inside their source "
+            "tree keep a clone of their own per mode. Created if it does not exist."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help=(
+            "Start building as soon as the sources of every package with patches are in place "
+            "and patched, and fetch the rest in the background while earlier packages build. "
+            "Each build waits only for its own sources."
+        ),
+    )
+    parser.add_argument(
+        "--build-cache",
+        help=(
+            "Directory in which to cache each package's installed files, keyed on a fingerprint "
+            "of its build inputs (config.json entry, patches, build recipe, toolchain, and the "
+            "fingerprints of its dependencies). When set, a package is rebuilt whenever any of "
+            "those inputs change, and restored from the cache instead of being rebuilt when an "
+            "earlier build used identical inputs. Replaces the skip-existing check for builds."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--compressed-logs",
+        action="store_true",
+        help=(
+            "Write the output of build commands to gzip-compressed logs under a logs directory "
+            "beside the working directory, one per package, build phase (configure, build, "
+            "install, pip) and run, each with an index.json of where every command's output "
+            "starts, instead of to plain build_log.txt (and similar) files in the package's sources."
+        ),
+    )
+    parser.add_argument(
+        "--log-retention",
+        type=int,
+        help="With --compressed-logs, the number of most recent runs to keep the logs of (Default: 5)",
+        default=5,
+    )
     parser.add_argument("--7zip", help="Path to 7-zip executable", default=path_to_7zip)
     parser.add_argument("--bison", help="Path to Bison executable", default=path_to_bison)
     parser.add_argument(
@@ -560,6 +1571,15 @@ if __name__ == "__main__":
         ),
         default="",
     )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help=(
+            "Do not build anything. Instead, report which packages would be fetched, rebuilt, "
+            "restored from the build cache, or skipped, and why, and estimate the total time "
+            "from the timings recorded by previous runs."
+        ),
+    )
     parser.add_argument("path-to-final-libpack-dir", nargs="?", default="./")
     args = vars(parser.parse_args())
 
@@ -575,7 +1595,26 @@ if __name__ == "__main__":
         if unknown:
             print(f"ERROR: --rebuild names unknown package(s): {', '.join(sorted(unknown))}")
             exit(1)
+    refetch = force_rebuild
+    if force_rebuild:
+        try:
+            graph = BuildGraph(config_dict["content"])
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            exit(1)
+        force_rebuild = graph.with_dependents(force_rebuild)
+        dependents = force_rebuild - refetch
+        if dependents:
+            print(f"Also rebuilding dependent package(s): {', '.join(sorted(dependents))}")
     path_to_7zip = args["7zip"]
+    if args["git_mirror"]:
+        git_mirror = GitMirror(args["git_mirror"])
+    if args["download_cache"]:
+        download_cache = DownloadCache(args["download_cache"])
+    keep_archives = args["no_keep_archives"]
+    submodule_jobs = args["submodule_jobs"]
+    if args["shared_sources"]:
+        shared_sources = SourceStore(args["shared_sources"])
     path_to_bison = args["bison"]
 
     mode = (
@@ -586,6 +1625,22 @@ if __name__ == "__main__":
     working = compile_all.working_dir_name(mode)
     os.makedirs(working, exist_ok=True)
     os.chdir(working)
+    compiler = compile_all.Compiler(
+        config_dict,
+        bison_path=path_to_bison,
+        skip_existing=args["no_skip_existing_build"],
+        mode=mode,
+        force_rebuild=force_rebuild,
+        jobs=args["jobs"],
+        parallel_packages=args["parallel_packages"],
+        cache_dir=args["build_cache"],
+        compressed_logs=args["compressed_logs"],
+        log_retention=args["log_retention"],
+    )
+    configure_toolchain(compiler, args["vs_version"], args["vcvars_ver"])
+    if args["plan"]:
+        print_plan(config_dict, mode, compiler, args["no_skip_existing_clone"], refetch)
+        exit(0)
     seed_arg = args["seed_from"]
     if args["no_skip_existing_clone"]:
         dirname = compile_all.libpack_dir(config_dict, mode)
@@ -614,89 +1669,73 @@ if __name__ == "__main__":
     else:
         base = create_libpack_dir(config_dict, mode)
     with prevent_sleep_mode():
-        fetch_remote_data(config_dict, mode, args["no_skip_existing_clone"], force_rebuild)
-
-        compiler = compile_all.Compiler(
-            config_dict,
-            bison_path=path_to_bison,
-            skip_existing=args["no_skip_existing_build"],
-            mode=mode,
-            force_rebuild=force_rebuild,
-        )
-        vs_install_path = subprocess.check_output(
-            build_vswhere_args(args["vs_version"]),
-            text=True,
-        ).strip()
-        if not vs_install_path:
-            print(
-                f"ERROR: vswhere returned no Visual Studio installation matching "
-                f"--vs-version={args['vs_version']!r}"
-            )
-            exit(1)
-
-        base_path = Path(vs_install_path) / "VC" / "Auxiliary" / "Build"
-        if platform.machine() == "ARM64":
-            init_bat = str(base_path / "vcvarsarm64.bat")
-        else:
-            init_bat = str(base_path / "vcvars64.bat")
-        # vcvars internally shells out to vswhere.exe to enumerate installed MSVC tool
-        # versions. If vswhere is not on PATH, vcvars silently ignores -vcvars_ver and
-        # falls back to the latest installed compiler. Prepend the vswhere directory to
-        # PATH so child subprocesses inherit it and -vcvars_ver is honored.
-        vswhere_dir = os.path.dirname(vswhere)
-        if vswhere_dir and vswhere_dir not in os.environ.get("PATH", "").split(os.pathsep):
-            os.environ["PATH"] = vswhere_dir + os.pathsep + os.environ.get("PATH", "")
-        if args["vcvars_ver"]:
-            compiler.init_script = [init_bat, f"-vcvars_ver={args['vcvars_ver']}"]
-            compiler.msvc_tools_version = resolve_msvc_tools_version(
-                vs_install_path, args["vcvars_ver"]
+        try:
+            fetch_args = (
+                config_dict,
+                mode,
+                args["no_skip_existing_clone"],
+                refetch,
+                args["fetch_jobs"],
             )
-            if not compiler.msvc_tools_version:
-                print(
-                    f"ERROR: No installed MSVC tools matching --vcvars-ver={args['vcvars_ver']!r} "
-                    f"under {vs_install_path}\\VC\\Tools\\MSVC. Available: "
-                    f"{list_msvc_tools_versions(vs_install_path)}"
-                )
-                exit(1)
-        else:
-            compiler.init_script = [init_bat]
-        # Ignore the per-user site-packages, which the LibPack's Python shares with any
-        # same-version system Python; a user-installed setuptools there shadows our pinned
-        # copy and breaks setup.py-based steps (PySide/Shiboken).
-        os.environ["PYTHONNOUSERSITE"] = "1"
-        compiler.compile_all()
-
-        # Final cleanup: delete extraneous files and remove local path references from the cMake files
-        base_path = compile_all.libpack_dir(config_dict, mode)
-        extra_pdb_search_dirs = [
-            item["fallback-build-dir"]
-            for item in config_dict.get("content", [])
-            if "fallback-build-dir" in item
-        ]
-        path_cleaner.install_pdb_sidecars(base_path, os.getcwd(), extra_pdb_search_dirs)
-        path_cleaner.delete_extraneous_files(base_path)
-        path_cleaner.remove_local_path_from_cmake_files(base_path)
-        path_cleaner.correct_opencascade_freetype_ref(base_path)
-        path_cleaner.delete_qtwebengine(base_path)
-        # path_cleaner.delete_qtquick(base_path)
-        path_cleaner.delete_llvm_executables(base_path)
-        path_cleaner.delete_clang_executables(base_path)
-        path_cleaner.delete_unused_static_libs(base_path)
-        path_cleaner.delete_llvm_cmake_packages(base_path)
-        path_cleaner.delete_lldb(base_path)
-        path_cleaner.delete_bundled_cmake(base_path)
-        path_cleaner.delete_llvm_internal_headers(base_path)
-        path_cleaner.delete_documentation(base_path)
-        path_cleaner.delete_occt_sample_data(base_path)
-        path_cleaner.delete_python_test_suites(base_path)
-        pdb_sidecar_path = None
-        if mode == compile_all.BuildMode.RELEASE:
-            pdb_sidecar_path = base_path + "-PDB"
-            path_cleaner.move_pdbs_to_sidecar(base_path, pdb_sidecar_path)
-
-        write_manifest(config_dict, mode)
-
-        if args["archive"]:
-            create_archive(base_path)
-            if pdb_sidecar_path is not None and os.path.isdir(pdb_sidecar_path):
-                create_archive(pdb_sidecar_path)
+            pipeline = None
+            if args["pipeline"]:
+                pipeline = FetchPipeline(*fetch_args)
+                pipeline.preflight()
+                compiler.wait_for_source = pipeline.wait
+                compiler.source_fetched = pipeline.fetched
+            else:
+                fetch_remote_data(*fetch_args)
+
+            # Ignore the per-user site-packages, which the LibPack's Python shares with any
+            # same-version system Python; a user-installed setuptools there shadows our pinned
+            # copy and breaks setup.py-based steps (PySide/Shiboken).
+            os.environ["PYTHONNOUSERSITE"] = "1"
+            compiler.compile_all()
+            if pipeline is not None:
+                pipeline.finish()
+
+            # Final cleanup: delete extraneous files and remove local path references from the cMake files
+            base_path = compile_all.libpack_dir(config_dict, mode)
+            extra_pdb_search_dirs = [
+                item["fallback-build-dir"]
+                for item in config_dict.get("content", [])
+                if "fallback-build-dir" in item
+            ]
+            with timeline.phase("post-processing", "install_pdb_sidecars"):
+                path_cleaner.install_pdb_sidecars(base_path, os.getcwd(), extra_pdb_search_dirs)
+            for cleanup in (
+                path_cleaner.delete_extraneous_files,
+                path_cleaner.remove_local_path_from_cmake_files,
+                path_cleaner.correct_opencascade_freetype_ref,
+                path_cleaner.delete_qtwebengine,
+                # path_cleaner.delete_qtquick,
+                path_cleaner.delete_llvm_executables,
+                path_cleaner.delete_clang_executables,
+                path_cleaner.delete_unused_static_libs,
+                path_cleaner.delete_llvm_cmake_packages,
+                path_cleaner.delete_lldb,
+                path_cleaner.delete_bundled_cmake,
+                path_cleaner.delete_llvm_internal_headers,
+                path_cleaner.delete_documentation,
+                path_cleaner.delete_occt_sample_data,
+                path_cleaner.delete_python_test_suites,
+            ):
+                with timeline.phase("post-processing", cleanup.__name__):
+                    cleanup(base_path)
+            pdb_sidecar_path = None
+            if mode == compile_all.BuildMode.RELEASE:
+                pdb_sidecar_path = base_path + "-PDB"
+                with timeline.phase("post-processing", "move_pdbs_to_sidecar"):
+                    path_cleaner.move_pdbs_to_sidecar(base_path, pdb_sidecar_path)
+
+            write_manifest(config_dict, mode)
+
+            if args["archive"]:
+                create_archive(base_path)
+                if pdb_sidecar_path is not None and os.path.isdir(pdb_sidecar_path):
+                    create_archive(pdb_sidecar_path)
+        finally:
+            # Written even when the build fails, which is when the timings are most useful
+            timeline.write(compile_all.libpack_dir(config_dict, mode))
+            working_path = os.path.dirname(compile_all.libpack_dir(config_dict, mode))
+            timeline.update_history(os.path.join(working_path, timeline.HISTORY_FILE))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# A store of the prebuilt archives named by the "url", "url-x64" and "url-ARM64" entries of
+# config.json, and of the trees they extract to, shared by every working directory that points at
+# it (Debug and Release, and every LibPack version). Archives and trees are addressed by the
+# sha256 of the archive, and a record per URL remembers which archive each URL last served, so an
+# unchanged URL is materialized from the store without touching the network.
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+
+
+class DownloadCache:
+    """The store rooted at a directory, laid out as archives/<sha256>/<filename>, trees/<sha256>/
+    (the extracted archive), and urls/<hash of URL>.json. Every entry is written to a temporary
+    path and renamed into place, so an interrupted store never leaves a partial entry behind."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _url_record(self, url: str) -> str:
+        return os.path.join(
+            self.root, "urls", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def _archive_dir(self, digest: str) -> str:
+        return os.path.join(self.root, "archives", digest)
+
+    def tree(self, digest: str) -> Optional[str]:
+        """The extracted tree of the archive with this sha256, if the store has it."""
+        path = os.path.join(self.root, "trees", digest)
+        return path if os.path.isdir(path) else None
+
+    def archive(self, digest: str) -> Optional[str]:
+        """The archive with this sha256, if the store has it."""
+        directory = self._archive_dir(digest)
+        if not os.path.isdir(directory):
+            return None
+        files = os.listdir(directory)
+        return os.path.join(directory, files[0]) if len(files) == 1 else None
+
+    def lookup(self, url: str, sha256: Optional[str] = None) -> Optional[str]:
+        """The sha256 of the archive to use for url, if the store has it: the expected sha256 if
+        one is given, otherwise the archive url served when it was last downloaded."""
+        if sha256 is not None:
+            digest = sha256.lower()
+        else:
+            try:
+                with open(self._url_record(url), "r", encoding="utf-8") as f:
+                    digest = json.load(f)["sha256"]
+            except (OSError, ValueError, KeyError):
+                return None
+        if self.tree(digest) is None and self.archive(digest) is None:
+            return None
+        return digest
+
+    def store_archive(self, url: str, digest: str, path: str):
+        """Add the archive at path, whose sha256 is digest, and record that url served it."""
+        directory = self._archive_dir(digest)
+        if not os.path.isdir(directory):
+            temp_dir = directory + ".tmp"
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+            os.makedirs(temp_dir)
+            shutil.copy2(path, os.path.join(temp_dir, os.path.basename(path)))
+            os.replace(temp_dir, directory)
+        self.record(url, digest)
+
+    def record(self, url: str, digest: str):
+        """Record that url served the archive with this sha256. An archive that was extracted as
+        it downloaded, and never written to disk, is in the store only as its extracted tree."""
+        record = self._url_record(url)
+        os.makedirs(os.path.dirname(record), exist_ok=True)
+        with open(record + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"url": url, "sha256": digest}, f)
+        os.replace(record + ".tmp", record)
+
+    def store_tree(self, digest: str, path: str, archive_name: str):
+        """Add the directory at path as the extracted tree of the archive with this sha256. The
+        archive itself (archive_name, at the top of the directory) is already in the store, so it
+        is left out."""
+        if self.tree(digest) is not None:
+            return
+        tree = os.path.join(self.root, "trees", digest)
+        temp_tree = tree + ".tmp"
+        if os.path.exists(temp_tree):
+            shutil.rmtree(temp_tree)
+        shutil.copytree(
+            path,
+            temp_tree,
+            ignore=lambda directory, names: (
+                [archive_name] if os.path.samefile(directory, path) else []
+            ),
+        )
+        os.replace(temp_tree, tree)
@@ -2,8 +2,11 @@
 # SPDX-License-Identifier: LGPL-2.1-or-later
 # SPDX-FileNotice: Part of the FreeCAD project.
 
+from concurrent.futures import ProcessPoolExecutor
 import diff_match_patch
+import os
 import sys
+from typing import List, Optional, Tuple
 
 
 def print_usage():
@@ -11,6 +14,11 @@ def print_usage():
         "Generate a patchfile that can be used with the create_libpack.py script to patch source files"
     )
     print("Usage: python generate_patch.py original_file corrected_file output_patch_file")
+    print("   or: python generate_patch.py original_dir corrected_dir output_patch_file")
+    print(
+        "Given two directories, every file that differs between them is diffed (in parallel, line "
+        "by line) into one patch file with a section per file"
+    )
 
 
 def parse_args():
@@ -19,13 +27,90 @@ def parse_args():
         exit(1)
 
 
-def generate_patch(old, new) -> str:
+def generate_patch(old, new, line_mode: bool = False) -> str:
+    """The diff_match_patch patch from old to new. With line_mode set, whole changed lines are
+    diffed rather than individual characters, which is much faster on large files."""
     dmp = diff_match_patch.diff_match_patch()
-    patches = dmp.patch_make(old, new)
+    if line_mode:
+        old_chars, new_chars, lines = dmp.diff_linesToChars(old, new)
+        diffs = dmp.diff_main(old_chars, new_chars, False)
+        dmp.diff_charsToLines(diffs, lines)
+        patches = dmp.patch_make(old, diffs)
+    else:
+        patches = dmp.patch_make(old, new)
     return dmp.patch_toText(patches)
 
 
+def _changed_files(old_dir: str, new_dir: str) -> List[str]:
+    """Paths (relative, with forward slashes) of the files in new_dir whose contents differ from
+    the file of the same name in old_dir. Files in only one of the trees are reported and skipped,
+    since a patch can only change an existing file, as are git's own metadata directories."""
+    changed = []
+    for root, dirs, files in os.walk(new_dir):
+        dirs[:] = sorted(d for d in dirs if d != ".git")
+        for filename in sorted(files):
+            new_path = os.path.join(root, filename)
+            relative = os.path.relpath(new_path, new_dir).replace(os.sep, "/")
+            old_path = os.path.join(old_dir, relative)
+            if not os.path.isfile(old_path):
+                print(f"  Skipping {relative}, which is not in {old_dir}")
+                continue
+            with open(old_path, "rb") as f:
+                old = f.read()
+            with open(new_path, "rb") as f:
+                new = f.read()
+            if old != new:
+                changed.append(relative)
+    for root, dirs, files in os.walk(old_dir):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for filename in files:
+            relative = os.path.relpath(os.path.join(root, filename), old_dir).replace(os.sep, "/")
+            if not os.path.exists(os.path.join(new_dir, relative)):
+                print(f"  Skipping {relative}, which is not in {new_dir}")
+    return changed
+
+
+def _diff_file(old_dir: str, new_dir: str, relative: str) -> Tuple[str, Optional[str]]:
+    """The line-mode patch for one file of a tree, or None if it is not UTF-8 text."""
+    try:
+        with open(os.path.join(old_dir, relative), "r", encoding="utf-8") as f:
+            old = f.read()
+        with open(os.path.join(new_dir, relative), "r", encoding="utf-8") as f:
+            new = f.read()
+    except UnicodeDecodeError:
+        return relative, None
+    return relative, generate_patch(old, new, line_mode=True)
+
+
+def generate_tree_patch(old_dir: str, new_dir: str, max_workers: Optional[int] = None) -> str:
+    """One patch file, with a "@@@ path @@@" section per file, for every text file that differs
+    between two copies of a source tree. Paths are relative to the top of the trees, which is what
+    the patches listed in config.json are applied relative to. Files are diffed in parallel."""
+    changed = _changed_files(old_dir, new_dir)
+    sections = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_diff_file, old_dir, new_dir, path) for path in changed]
+        for future in futures:
+            relative, patch = future.result()
+            if patch is None:
+                print(f"  Skipping {relative}, which is not UTF-8 text")
+                continue
+            if not patch:
+                continue  # Differs only in its line endings
+            print(f"  Diffed {relative}")
+            sections.append(f"@@@ {relative} @@@\n{patch}")
+    return "".join(sections)
+
+
 def run(old_file, new_file, output_file):
+    if os.path.isdir(old_file) and os.path.isdir(new_file):
+        patch = generate_tree_patch(old_file, new_file)
+        if not patch:
+            print("No changed files found")
+            exit(1)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(patch)
+        return
     with open(old_file, "r", encoding="utf-8") as f:
         old = f.read()
     with open(new_file, "r", encoding="utf-8") as f:
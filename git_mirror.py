@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# A local store of bare mirrors of the git repositories a LibPack is built from, shared by every
+# working directory that points at it (Debug and Release, and every LibPack version). Clones are
+# made from the mirror instead of over the network, and the mirror itself is brought up to date
+# with a fetch, so a repeated clone costs only what changed upstream since the last one.
+
+import hashlib
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import threading
+from typing import Dict
+
+
+class GitMirror:
+    """The mirror store rooted at a directory. Each repository is mirrored once, in a directory
+    named after the last component of its URL plus a hash of the whole URL. If a mirror cannot be
+    updated (for example with no network) its existing contents are used as they are, so a store
+    that already holds every repository works entirely offline."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def path(self, url: str) -> str:
+        """The directory holding the mirror of url."""
+        name = url.rstrip("/").rsplit("/", 1)[-1]
+        if name.endswith(".git"):
+            name = name[: -len(".git")]
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", name)
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.root, f"{name}-{digest}.git")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def update(self, url: str) -> str:
+        """Create the mirror of url, or fetch into it if it already exists, and return its path.
+        Safe to call from several fetch threads at once."""
+        path = self.path(url)
+        with self._lock(path):
+            if not os.path.exists(os.path.join(path, "HEAD")):
+                print(f"  Mirroring {url}")
+                os.makedirs(self.root, exist_ok=True)
+                temp_path = path + ".tmp"
+                if os.path.exists(temp_path):
+                    shutil.rmtree(temp_path)
+                subprocess.run(
+                    ["git", "clone", "--mirror", url, temp_path], capture_output=True, check=True
+                )
+                # Shallow clones of submodules ask for the exact commit the superproject records,
+                # which need not be the tip of any branch
+                subprocess.run(
+                    ["git", "config", "uploadpack.allowAnySHA1InWant", "true"],
+                    cwd=temp_path,
+                    capture_output=True,
+                    check=True,
+                )
+                os.replace(temp_path, path)
+            else:
+                try:
+                    subprocess.run(
+                        ["git", "fetch", "--prune", "origin"],
+                        cwd=path,
+                        capture_output=True,
+                        check=True,
+                    )
+                except subprocess.CalledProcessError:
+                    print(f"  WARNING: could not update the mirror of {url}, using it as it is")
+        return path
+
+    @staticmethod
+    def source(path: str, shallow: bool) -> str:
+        """What to pass to git clone to clone the mirror at path. A plain local path lets git
+        hardlink the objects, but shallow clones are only honored over the file:// transport."""
+        return pathlib.Path(path).as_uri() if shallow else path
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# A pool of job tokens shared by every process taking part in a LibPack build, so that a single
+# --jobs budget bounds the total number of compiler processes no matter how many packages are
+# building at once, or which build tool (CMake, MSBuild, nmake, pip, PySide's setup.py) each one
+# happens to use.
+
+from contextlib import contextmanager
+import multiprocessing
+from typing import Optional
+
+
+class JobServer:
+    """Hands out job tokens from a fixed budget. Each external command asks for tokens before it
+    starts and gives them back when it exits, and is told how many it was granted so that it can
+    be launched with exactly that much parallelism. The grant is a fair share of the budget
+    between the packages currently building: a package building alone receives every core, and
+    when several overlap each gets total // building. Grants are held until the command exits
+    and never rebalanced, so max_share caps every grant (at total // parallel packages, say) to
+    leave tokens for packages that become ready while a long build is running, and a command
+    that only runs one process at a time asks for a single token. A request blocks until at
+    least one token is free, so the budget is never exceeded.
+
+    The synchronization primitives are multiprocessing ones, so a JobServer must reach worker
+    processes by inheritance (as a ProcessPoolExecutor initializer argument, see install()) rather
+    than by being pickled along with a task."""
+
+    def __init__(self, total: int, max_share: Optional[int] = None):
+        self.total = max(1, total)
+        self.max_share = max(1, min(self.total, max_share or self.total))
+        self._condition = multiprocessing.Condition()
+        self._free = multiprocessing.Value("i", self.total, lock=False)
+        self._building = multiprocessing.Value("i", 0, lock=False)
+
+    @contextmanager
+    def building(self):
+        """Count a package as building for the duration of the block, for fair-share purposes."""
+        with self._condition:
+            self._building.value += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._building.value -= 1
+                self._condition.notify_all()
+
+    def acquire(self, limit: Optional[int] = None) -> int:
+        """Block until at least one token is free, then take up to a fair share of the budget, and
+        at most limit tokens if given. Returns the number of tokens granted, which must later be
+        passed to release()."""
+        with self._condition:
+            while self._free.value == 0:
+                self._condition.wait()
+            share = max(1, self.total // max(1, self._building.value))
+            share = min(share, self.max_share, limit or share)
+            granted = min(self._free.value, share)
+            self._free.value -= granted
+            return granted
+
+    def release(self, count: int):
+        with self._condition:
+            self._free.value += count
+            self._condition.notify_all()
+
+    def free(self) -> int:
+        with self._condition:
+            return self._free.value
+
+
+_current: Optional[JobServer] = None
+
+
+def install(server: Optional[JobServer]):
+    """Make server the job server for this process. Passed as the initializer of the package
+    build worker pool so that every worker shares the scheduling process's budget."""
+    global _current
+    _current = server
+
+
+def current() -> Optional[JobServer]:
+    """The job server for this process, or None if the build has no --jobs budget."""
+    return _current
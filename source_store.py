@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# A store of patched source checkouts shared by the Debug and Release working directories (and by
+# every LibPack version that uses the same sources). Each checkout is cloned and patched once, made
+# read-only, and linked into each working directory under the package's name. Out-of-source builds
+# of linked sources put their build directory in the working directory rather than beside the
+# sources (see Compiler._cmake_create_build_dir), so every working directory builds from the one
+# checkout without interfering with the others.
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import stat
+import sys
+from typing import Callable, Optional
+
+import build_cache
+
+
+class SourceStore:
+    """The store rooted at a directory. A checkout is named after its package plus a hash of
+    everything that determines its contents (repo, ref or hash, submodule list and the contents of
+    its patches), so a changed entry gets a new checkout and an existing checkout never changes."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def path(self, item: dict) -> str:
+        """The directory holding the checkout of a config.json entry."""
+        patch_root = pathlib.Path(__file__).parent.absolute()
+        inputs = {
+            "git-repo": item["git-repo"],
+            "git-ref": item.get("git-ref"),
+            "git-hash": item.get("git-hash"),
+            "submodules": item.get("submodules"),
+            "patches": [
+                build_cache.file_digest(os.path.join(patch_root, patch))
+                for patch in item.get("patches", [])
+            ],
+        }
+        digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{item['name']}-{digest[:12]}")
+
+    def add(self, item: dict, populate: Callable[[str], None]) -> str:
+        """Return the checkout of item, first creating it with populate(directory) if the store
+        does not have it yet. populate works in a temporary directory that is renamed into place
+        once it has finished, so several builds (Debug and Release, say) can add the same checkout
+        at once: whichever finishes first wins, and an interrupted one leaves nothing behind."""
+        path = self.path(item)
+        if os.path.isdir(path):
+            return path
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{path}.tmp{os.getpid()}"
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path, onerror=_remove_readonly)
+        try:
+            populate(temp_path)
+            make_read_only(temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path, onerror=_remove_readonly)
+            raise
+        try:
+            os.replace(temp_path, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+            shutil.rmtree(temp_path, onerror=_remove_readonly)  # Someone else added it first
+        return path
+
+
+def linked(name: str) -> Optional[str]:
+    """The directory name links to, if it is a symlink or (on Windows) a junction."""
+    if not os.path.lexists(name):
+        return None
+    name = os.path.abspath(name)
+    target = os.path.realpath(name)
+    unlinked = os.path.join(os.path.realpath(os.path.dirname(name)), os.path.basename(name))
+    return target if target != unlinked else None
+
+
+def link(target: str, name: str):
+    """Make name a link to the directory target: a junction on Windows, which unlike a symlink
+    needs no special privileges, and a symlink elsewhere."""
+    if sys.platform == "win32":
+        import _winapi
+
+        _winapi.CreateJunction(target, os.path.abspath(name))
+    else:
+        os.symlink(target, name, target_is_directory=True)
+
+
+def unlink(name: str):
+    """Remove a link made by link(), leaving the directory it points to alone."""
+    if sys.platform == "win32":
+        os.rmdir(name)
+    else:
+        os.unlink(name)
+
+
+def make_read_only(path: str):
+    """Clear the write permission of every file under path (except git's own metadata), so that a
+    build that writes into its shared sources fails instead of changing them under the other
+    mode. Directories stay writable, so that the checkout can still be removed as a whole."""
+    for root, dirs, files in os.walk(path):
+        if ".git" in dirs:
+            dirs.remove(".git")
+        for filename in files:
+            file_path = os.path.join(root, filename)
+            if os.path.islink(file_path) or filename == ".git":
+                continue
+            mode = os.stat(file_path).st_mode
+            os.chmod(file_path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _remove_readonly(func, path, _) -> None:
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import os
+import tempfile
+import unittest
+
+import build_cache
+
+""" Developer tests for the build_cache module. """
+
+
+def write(path: str, contents: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(contents)
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp = tempfile.TemporaryDirectory()
+        self.install_dir = os.path.join(self.temp.name, "LibPack")
+        self.cache = build_cache.BuildCache(os.path.join(self.temp.name, "cache"))
+
+    def tearDown(self) -> None:
+        self.temp.cleanup()
+        super().tearDown()
+
+    def test_fingerprint_ignores_key_order(self):
+        self.assertEqual(
+            build_cache.fingerprint({"a": 1, "b": [1, 2]}),
+            build_cache.fingerprint({"b": [1, 2], "a": 1}),
+        )
+        self.assertNotEqual(build_cache.fingerprint({"a": 1}), build_cache.fingerprint({"a": 2}))
+
+    def test_changed_files_reports_new_and_modified(self):
+        write(os.path.join(self.install_dir, "bin", "old.dll"), "old")
+        write(os.path.join(self.install_dir, "bin", "same.dll"), "same")
+        before = build_cache.snapshot(self.install_dir)
+        write(os.path.join(self.install_dir, "bin", "old.dll"), "rewritten")
+        write(os.path.join(self.install_dir, "include", "new.h"), "new")
+        changed = build_cache.changed_files(before, build_cache.snapshot(self.install_dir))
+        self.assertEqual(
+            changed, [os.path.join("bin", "old.dll"), os.path.join("include", "new.h")]
+        )
+
+    def test_save_and_restore_round_trip(self):
+        write(os.path.join(self.install_dir, "lib", "zlib.lib"), "zlib")
+        self.assertFalse(self.cache.contains("zlib", "abc"))
+        self.cache.save("zlib", "abc", self.install_dir, [os.path.join("lib", "zlib.lib")], {})
+        self.assertTrue(self.cache.contains("zlib", "abc"))
+        fresh_install = os.path.join(self.temp.name, "Fresh")
+        self.assertEqual(
+            self.cache.restore("zlib", "abc", fresh_install), [os.path.join("lib", "zlib.lib")]
+        )
+        with open(os.path.join(fresh_install, "lib", "zlib.lib"), "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "zlib")
+
+    def test_install_state_persists(self):
+        state = build_cache.InstallState(self.install_dir)
+        self.assertIsNone(state.installed("zlib"))
+        state.record("zlib", "abc", {"entry": {"name": "zlib"}})
+        self.assertEqual(build_cache.InstallState(self.install_dir).installed("zlib"), "abc")
+        self.assertFalse(os.path.exists(os.path.join(self.install_dir, "zlib")))
+
+    def test_merge_tree_moves_staged_files(self):
+        staging = os.path.join(self.temp.name, "staging", "zlib")
+        write(os.path.join(staging, "include", "zlib.h"), "new")
+        write(os.path.join(self.install_dir, "include", "zlib.h"), "old")
+        moved = build_cache.merge_tree(staging, self.install_dir)
+        self.assertEqual(moved, [os.path.join("include", "zlib.h")])
+        with open(os.path.join(self.install_dir, "include", "zlib.h"), "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "new")
+        self.assertFalse(os.path.exists(os.path.join(staging, "include", "zlib.h")))
+
+    def test_file_index_claims_and_uninstalls(self):
+        header = os.path.join("include", "zlib", "zlib.h")
+        library = os.path.join("lib", "zlib.lib")
+        write(os.path.join(self.install_dir, header), "zlib")
+        write(os.path.join(self.install_dir, library), "zlib")
+        index = build_cache.FileIndex(self.install_dir)
+        self.assertEqual(index.claim("zlib", [header, library]), [])
+        self.assertEqual(index.claim("libpng", [library]), [(library, "zlib")])
+        index = build_cache.FileIndex(self.install_dir)
+        self.assertEqual(index.files_of("zlib"), [header])
+        self.assertEqual(index.uninstall("zlib"), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.install_dir, "include")))
+        self.assertTrue(os.path.exists(os.path.join(self.install_dir, library)))
+        self.assertEqual(index.files_of("zlib"), [])
+
+    def test_describe_changes_names_each_difference(self):
+        old = {
+            "entry": {"name": "libpng", "git-ref": "v1.6.49"},
+            "patches": {},
+            "recipe": "a",
+            "toolchain": {},
+            "dependencies": {"zlib": "1"},
+        }
+        new = dict(old, entry={"name": "libpng", "git-ref": "v1.6.50"}, dependencies={"zlib": "2"})
+        self.assertEqual(
+            build_cache.describe_changes(old, new), "changed ref, dependency zlib changed"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
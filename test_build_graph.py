@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+import os
+import threading
+import unittest
+
+import build_graph
+
+""" Developer tests for the build_graph module. """
+
+
+class TestBuildGraph(unittest.TestCase):
+
+    def test_declared_dependencies_are_used(self):
+        graph = build_graph.BuildGraph(
+            [
+                {"name": "zlib", "depends": []},
+                {"name": "libpng", "depends": ["zlib"]},
+                {"name": "tcl", "depends": []},
+            ]
+        )
+        self.assertEqual(graph.dependencies["libpng"], {"zlib"})
+        self.assertEqual(graph.dependents["zlib"], {"libpng"})
+        self.assertEqual(graph.ready(set(), set()), ["zlib", "tcl"])
+
+    def test_with_dependents_is_transitive(self):
+        graph = build_graph.BuildGraph(
+            [
+                {"name": "zlib", "depends": []},
+                {"name": "libpng", "depends": ["zlib"]},
+                {"name": "freetype", "depends": ["libpng"]},
+                {"name": "tcl", "depends": []},
+            ]
+        )
+        self.assertEqual(graph.with_dependents({"zlib"}), {"zlib", "libpng", "freetype"})
+        self.assertEqual(graph.with_dependents({"tcl"}), {"tcl"})
+
+    def test_undeclared_dependencies_default_to_everything_above(self):
+        graph = build_graph.BuildGraph(
+            [{"name": "a", "depends": []}, {"name": "b", "depends": []}, {"name": "c"}]
+        )
+        self.assertEqual(graph.dependencies["c"], {"a", "b"})
+
+    def test_unknown_dependency_is_an_error(self):
+        with self.assertRaises(ValueError):
+            build_graph.BuildGraph([{"name": "a", "depends": ["nope"]}])
+
+    def test_dependency_listed_later_is_an_error(self):
+        with self.assertRaises(ValueError):
+            build_graph.BuildGraph([{"name": "a", "depends": ["b"]}, {"name": "b", "depends": []}])
+
+    def test_critical_path_follows_longest_chain(self):
+        graph = build_graph.BuildGraph(
+            [
+                {"name": "zlib", "depends": []},
+                {"name": "qt", "depends": ["zlib"]},
+                {"name": "tcl", "depends": []},
+                {"name": "pyside", "depends": ["qt"]},
+                {"name": "tk", "depends": ["tcl"]},
+            ]
+        )
+        durations = {"zlib": 1, "qt": 60, "tcl": 5, "pyside": 30, "tk": 10}
+        levels = graph.bottom_levels(durations)
+        self.assertEqual(levels["zlib"], 91)
+        self.assertEqual(levels["tcl"], 15)
+        self.assertEqual(graph.critical_path(durations), ["zlib", "qt", "pyside"])
+
+    def test_simulate_prefers_critical_path(self):
+        graph = build_graph.BuildGraph(
+            [
+                {"name": "short", "depends": []},
+                {"name": "long", "depends": []},
+                {"name": "after_long", "depends": ["long"]},
+            ]
+        )
+        durations = {"short": 10, "long": 10, "after_long": 10}
+        self.assertEqual(graph.simulate(durations, 2), 20)
+        # With one slot, config.json order builds "short" first and delays the long chain
+        self.assertEqual(graph.simulate(durations, 1), 30)
+        priority = graph.bottom_levels(durations)
+        self.assertEqual(build_graph._by_priority(graph.ready(set(), set()), priority)[0], "long")
+
+    def test_repository_config_is_valid(self):
+        config_path = os.path.join(os.path.dirname(__file__), "config.json")
+        with open(config_path, "r", encoding="utf-8") as f:
+            content = json.load(f)["content"]
+        graph = build_graph.BuildGraph(content)
+        for item in content:
+            self.assertIn("depends", item, f"{item['name']} does not declare its dependencies")
+        self.assertEqual(len(graph.order), len(content))
+
+
+class TestRunGraph(unittest.TestCase):
+
+    def test_dependents_start_after_dependencies_finish(self):
+        graph = build_graph.BuildGraph(
+            [
+                {"name": "a", "depends": []},
+                {"name": "b", "depends": []},
+                {"name": "c", "depends": ["a", "b"]},
+            ]
+        )
+        finished = []
+        lock = threading.Lock()
+
+        def work(name):
+            with lock:
+                if name == "c":
+                    self.assertEqual(set(finished), {"a", "b"})
+                finished.append(name)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            failures = build_graph.run_graph(
+                graph, lambda name: executor.submit(work, name), max_parallel=2
+            )
+        self.assertEqual(failures, [])
+        self.assertEqual(finished[-1], "c")
+
+    def test_no_more_than_max_parallel_run_at_once(self):
+        graph = build_graph.BuildGraph([{"name": str(i), "depends": []} for i in range(6)])
+        active = []
+        peak = []
+        lock = threading.Lock()
+        gate = threading.Event()
+
+        def work(_):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            gate.wait(0.01)
+            with lock:
+                active.pop()
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            build_graph.run_graph(graph, lambda name: executor.submit(work, name), max_parallel=2)
+        self.assertLessEqual(max(peak), 2)
+
+    def test_highest_priority_ready_package_starts_first(self):
+        graph = build_graph.BuildGraph(
+            [
+                {"name": "a", "depends": []},
+                {"name": "b", "depends": []},
+                {"name": "c", "depends": []},
+            ]
+        )
+        started = []
+
+        def work(name):
+            started.append(name)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            build_graph.run_graph(
+                graph,
+                lambda name: executor.submit(work, name),
+                max_parallel=1,
+                priority={"a": 1, "b": 5, "c": 3},
+            )
+        self.assertEqual(started, ["b", "c", "a"])
+
+    def test_gated_package_does_not_hold_up_the_others(self):
+        graph = build_graph.BuildGraph(
+            [
+                {"name": "a", "depends": []},
+                {"name": "b", "depends": []},
+                {"name": "c", "depends": ["b"]},
+            ]
+        )
+        sources = Future()
+        started = []
+
+        def work(name):
+            started.append(name)
+            if name == "c":
+                sources.set_result(None)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            failures = build_graph.run_graph(
+                graph,
+                lambda name: executor.submit(work, name),
+                max_parallel=1,
+                priority={"a": 5, "b": 1, "c": 1},
+                gate=lambda name: sources if name == "a" else None,
+            )
+        self.assertEqual(failures, [])
+        self.assertEqual(started, ["b", "c", "a"])
+
+    def test_failure_stops_new_packages_but_reports(self):
+        graph = build_graph.BuildGraph(
+            [{"name": "a", "depends": []}, {"name": "b", "depends": ["a"]}]
+        )
+        started = []
+
+        def work(name):
+            started.append(name)
+            if name == "a":
+                exit(3)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            failures = build_graph.run_graph(
+                graph, lambda name: executor.submit(work, name), max_parallel=1
+            )
+        self.assertEqual(started, ["a"])
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0][0], "a")
+        self.assertIsInstance(failures[0][1], SystemExit)
+
+
+if __name__ == "__main__":
+    unittest.main()
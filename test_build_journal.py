@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import os
+import tempfile
+import unittest
+
+from build_journal import BuildJournal
+
+""" Developer tests for the build_journal module. """
+
+
+class TestBuildJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp = tempfile.TemporaryDirectory()
+        self.journal = BuildJournal(os.path.join(self.temp.name, "journal"))
+
+    def tearDown(self) -> None:
+        self.temp.cleanup()
+        super().tearDown()
+
+    def test_no_entry_means_nothing_to_resume(self):
+        self.assertIsNone(self.journal.completed_steps("vtk", "abc"))
+
+    def test_steps_are_returned_for_matching_fingerprint_only(self):
+        self.journal.record("vtk", "abc", ["build-dir", "configure"])
+        self.assertEqual(self.journal.completed_steps("vtk", "abc"), ["build-dir", "configure"])
+        self.assertIsNone(self.journal.completed_steps("vtk", "def"))
+
+    def test_clear_removes_entry(self):
+        self.journal.record("vtk", "abc", [])
+        self.journal.clear("vtk")
+        self.assertIsNone(self.journal.completed_steps("vtk", "abc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
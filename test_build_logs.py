@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import build_logs
+import compile_all
+
+""" Developer tests for the build_logs module. """
+
+
+class TestLogWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+        super().tearDown()
+
+    def test_plain_log_is_appended_to(self):
+        filename = os.path.join(self.temp_dir, "build_log.txt")
+        with build_logs.LogWriter(filename) as log:
+            log.write("first\n")
+        with build_logs.LogWriter(filename) as log:
+            log.write("second\n")
+        with open(filename, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "first\nsecond\n")
+
+    def test_compressed_log_adds_one_member_per_writer(self):
+        filename = os.path.join(self.temp_dir, "build.log.gz")
+        with build_logs.LogWriter(filename, compressed=True) as first:
+            first.write("first\n")
+        with build_logs.LogWriter(filename, compressed=True) as second:
+            for i in range(1000):
+                second.write(f"line {i}\n")
+        self.assertEqual(first.offset, 0)
+        self.assertEqual(second.offset, first.length)
+        self.assertEqual(os.path.getsize(filename), first.length + second.length)
+        with gzip.open(filename, "rt", encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines()[:2], ["first", "line 0"])
+        self.assertEqual(build_logs.read_section(filename, first.offset), "first\n")
+        section = build_logs.read_section(filename, second.offset)
+        self.assertEqual(section.splitlines()[-1], "line 999")
+
+    @patch.object(build_logs.LogWriter, "QUEUE_SIZE", 10)
+    def test_write_error_is_raised_on_exit(self):
+        log = build_logs.LogWriter(os.path.join(self.temp_dir, "build_log.txt"))
+        log_file, log._file = log._file, MagicMock()
+        log._file.write.side_effect = OSError("disk full")
+        with self.assertRaisesRegex(OSError, "disk full"):
+            with log:
+                for i in range(100):
+                    log.write(f"line {i}\n")
+        log_file.close()
+
+
+class TestLogStore(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+        super().tearDown()
+
+    def _index(self, package: str) -> list:
+        with open(os.path.join(self.temp_dir, package, "index.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_sections_are_indexed(self):
+        store = build_logs.LogStore(self.temp_dir, run="20260101-000000")
+        with store.section("zlib", "configure", "cmake ..") as log:
+            log.write("configuring\n")
+        with store.section("zlib", "build", "cmake --build .") as log:
+            log.write("building\n")
+        with store.section("zlib", "build", "cmake --install .") as log:
+            log.write("installing\n")
+        index = self._index("zlib")
+        self.assertEqual([e["phase"] for e in index], ["configure", "build", "build"])
+        self.assertEqual(index[2]["command"], "cmake --install .")
+        self.assertEqual(index[2]["file"], "20260101-000000-build.log.gz")
+        path = os.path.join(self.temp_dir, "zlib", index[2]["file"])
+        self.assertEqual(build_logs.read_section(path, index[2]["offset"]), "installing\n")
+        self.assertEqual(build_logs.read_section(path, index[1]["offset"]), "building\n")
+
+    def test_only_the_most_recent_runs_are_kept(self):
+        for run in range(4):
+            store = build_logs.LogStore(self.temp_dir, retention=2, run=f"2026010{run}-000000")
+            with store.section("zlib", "build", "cmake --build .") as log:
+                log.write(f"run {run}\n")
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.temp_dir, "zlib"))),
+            ["20260102-000000-build.log.gz", "20260103-000000-build.log.gz", "index.json"],
+        )
+        self.assertEqual(
+            [e["run"] for e in self._index("zlib")], ["20260102-000000", "20260103-000000"]
+        )
+
+    def test_compiler_streams_into_the_store(self):
+        config = {"FreeCAD-version": "0.22", "LibPack-version": "3.0.0", "content": []}
+        compiler = compile_all.Compiler(config, "bison_path", compressed_logs=True, log_retention=3)
+        compiler.log_store.root = self.temp_dir
+        compiler._current_package = "zlib"
+        compiler._run_streaming([sys.executable, "-c", "print('hello')"], "configure_log.txt")
+        index = self._index("zlib")
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index[0]["phase"], "configure")
+        path = os.path.join(self.temp_dir, "zlib", index[0]["file"])
+        self.assertEqual(build_logs.read_section(path, index[0]["offset"]).strip(), "hello")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,11 +2,22 @@
 # SPDX-License-Identifier: LGPL-2.1-or-later
 # SPDX-FileNotice: Part of the FreeCAD project.
 
+from concurrent.futures import ThreadPoolExecutor
 import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 from unittest.mock import MagicMock, patch, mock_open
 
+import build_cache
+from build_journal import BuildJournal
 import compile_all
+from diff_match_patch import diff_match_patch
+import jobserver
+import timeline
 
 """ Developer tests for the compile_all module. """
 
@@ -33,6 +44,304 @@ class TestCompileAll(unittest.TestCase):
         self.compiler.compile_all()
         nonexistent_mock.assert_called_once()
 
+    @patch("os.chdir")
+    @patch("compile_all.Compiler.build_nonexistent")
+    def test_compile_all_waits_for_sources(self, nonexistent_mock: MagicMock, _):
+        calls = []
+        self.compiler.wait_for_source = lambda name: calls.append(("wait", name))
+        nonexistent_mock.side_effect = lambda _: calls.append(("build", "nonexistent"))
+        self.compiler.compile_all()
+        self.assertEqual(calls, [("wait", "nonexistent"), ("build", "nonexistent")])
+        self.compiler.source_fetched = lambda name: None
+        copy = pickle.loads(pickle.dumps(self.compiler))
+        self.assertIsNone(copy.wait_for_source)
+        self.assertIsNone(copy.source_fetched)
+
+    @patch("os.chdir")
+    @patch("compile_all.Compiler.build_nonexistent")
+    def test_build_package_restores_skip_existing(self, nonexistent_mock: MagicMock, _):
+        """A forced rebuild only disables skip-existing for the forced package itself"""
+        self.compiler.skip_existing = True
+        self.compiler.force_rebuild = {"nonexistent"}
+        nonexistent_mock.side_effect = lambda _: self.assertFalse(self.compiler.skip_existing)
+        self.compiler.build_package({"name": "nonexistent"})
+        nonexistent_mock.assert_called_once()
+        self.assertTrue(self.compiler.skip_existing)
+
+    def test_run_streaming_logs_everything_but_keeps_only_the_tail(self):
+        with tempfile.TemporaryDirectory() as temp:
+            log = os.path.join(temp, "build_log.txt")
+            script = "import sys\nfor i in range(5000): print(f'line {i}')\nsys.exit(3)"
+            with patch("compile_all.STREAMING_TAIL_LINES", 100):
+                with self.assertRaises(subprocess.CalledProcessError) as context:
+                    self.compiler._run_streaming([sys.executable, "-c", script], log)
+            with open(log, "r", encoding="utf-8") as f:
+                self.assertEqual(len(f.read().splitlines()), 5000)
+            output = context.exception.output.decode("utf-8").splitlines()
+            self.assertEqual(context.exception.returncode, 3)
+            self.assertIn("4900 earlier lines omitted", output[0])
+            self.assertEqual(output[1:], [f"line {i}" for i in range(4900, 5000)])
+
+    def test_tail_buffer_is_bounded_by_characters(self):
+        tail = compile_all._TailBuffer(1000, 10)
+        for line in ("aaaa\n", "bbbb\n", "cccc\n"):
+            tail.append(line)
+        self.assertEqual(tail.text(), "bbbb\ncccc\n")
+        self.assertEqual(tail.dropped, 1)
+
+    def test_reserve_jobs_is_shared_by_nested_commands(self):
+        server = jobserver.JobServer(8)
+        jobserver.install(server)
+        try:
+            with self.compiler._reserve_jobs(parallel=True) as outer:
+                self.assertEqual(outer, 8)
+                with self.compiler._reserve_jobs() as inner:
+                    self.assertEqual(inner, 8)
+                self.assertEqual(server.free(), 0)
+            self.assertEqual(server.free(), 8)
+        finally:
+            jobserver.install(None)
+        with self.compiler._reserve_jobs() as unbounded:
+            self.assertIsNone(unbounded)
+
+    def test_serial_commands_take_one_job(self):
+        server = jobserver.JobServer(8)
+        jobserver.install(server)
+        try:
+            with self.compiler._reserve_jobs() as serial:
+                self.assertEqual(serial, 1)
+                self.assertEqual(server.free(), 7)
+        finally:
+            jobserver.install(None)
+
+    @patch("compile_all.Compiler._run_streaming")
+    def test_source_built_pip_packages_share_the_budget(self, run_streaming_mock: MagicMock):
+        server = jobserver.JobServer(8, 4)
+        jobserver.install(server)
+        try:
+            self.compiler._run_pip_install(["numpy"], False, ())
+            self.assertNotIn("-j", " ".join(run_streaming_mock.call_args.args[0]))
+            self.compiler._run_pip_install(["numpy"], True, ("numpy",))
+            self.assertEqual(
+                run_streaming_mock.call_args.args[0][-1], "--config-settings=compile-args=-j4"
+            )
+            self.assertTrue(run_streaming_mock.call_args.kwargs["parallel"])
+            self.assertEqual(server.free(), 8)
+        finally:
+            jobserver.install(None)
+
+    def test_job_environment_caps_build_tools(self):
+        env = self.compiler._job_environment({"CL": "/W3"}, 4, ["nmake", "/f", "makefile.vc"])
+        self.assertEqual(env["CMAKE_BUILD_PARALLEL_LEVEL"], "4")
+        self.assertEqual(env["CL_MPCount"], "4")
+        self.assertEqual(env["CL"], "/MP4 /W3")
+
+    @patch("compile_all.ProcessPoolExecutor", ThreadPoolExecutor)
+    @patch("compile_all.Compiler.build_a", create=True)
+    @patch("compile_all.Compiler.build_b", create=True)
+    @patch("compile_all.Compiler.package_durations", lambda _: {"a": 10.0, "b": 1.0})
+    def test_restore_during_a_build_is_not_attributed_to_it(self, *_):
+        with tempfile.TemporaryDirectory() as temp:
+            os.chdir(temp)
+            config = {
+                "FreeCAD-version": "0.22",
+                "LibPack-version": "3.0.0",
+                "content": [{"name": "a", "depends": []}, {"name": "b", "depends": []}],
+            }
+            compiler = compile_all.Compiler(
+                config,
+                "bison_path",
+                skip_existing=True,
+                parallel_packages=2,
+                cache_dir=os.path.join(temp, "cache"),
+            )
+            compiler.install_dir = os.path.join(temp, "LibPack")
+            compiler._load_state()
+            restored = os.path.join(compiler.install_dir, "b.txt")
+            os.makedirs(compiler.install_dir)
+            with open(restored, "w", encoding="utf-8") as f:
+                f.write("b")
+            compiler.build_cache.save(
+                "b", compiler._fingerprints["b"], compiler.install_dir, ["b.txt"], {}
+            )
+            os.remove(restored)
+
+            def build(_, item, force):
+                # a is still building when b is restored from the cache
+                deadline = time.time() + 10
+                while not os.path.exists(restored) and time.time() < deadline:
+                    time.sleep(0.01)
+                open(os.path.join(compiler.install_dir, "a.txt"), "w").close()
+                return [], []
+
+            with patch("compile_all._build_package_in_worker", build), patch("builtins.print"):
+                compiler._compile_all_parallel()
+            self.assertEqual(compiler.file_index.files_of("b"), ["b.txt"])
+            self.assertFalse(compiler.build_cache.contains("a", compiler._fingerprints["a"]))
+            os.chdir(self.original_dir)
+
+    def test_install_record_leaves_other_packages_files_alone(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp = os.path.join(temp_dir, "LibPack")
+            self.compiler.install_dir = temp
+            self.compiler.file_index = build_cache.FileIndex(temp)
+            header = os.path.join("include", "zlib.h")
+            staged = os.path.join("include", "zconf.h")
+            for path in (header, staged):
+                os.makedirs(os.path.join(temp, "include"), exist_ok=True)
+                with open(os.path.join(temp, path), "w", encoding="utf-8") as f:
+                    f.write("zlib")
+            self.compiler.file_index.claim("zlib", [header, staged])
+            before = build_cache.snapshot(temp)
+            for path in (header, staged, "new.h", os.path.join("Lib", "__pycache__", "x.pyc")):
+                os.makedirs(os.path.dirname(os.path.join(temp, path)), exist_ok=True)
+                with open(os.path.join(temp, path), "w", encoding="utf-8") as f:
+                    f.write("rewritten")
+            with patch("builtins.print"):
+                files = self.compiler._record_install("nonexistent", before, [staged])
+            self.assertEqual(files, sorted([staged, "new.h"]))
+            self.assertEqual(self.compiler.file_index.files_of("zlib"), [header])
+
+    def test_dependency_change_changes_dependent_fingerprint(self):
+        content = [
+            {"name": "zlib", "depends": [], "git-ref": "v1.3.1"},
+            {"name": "libpng", "depends": ["zlib"], "git-ref": "v1.6.50"},
+            {"name": "tcl", "depends": [], "git-ref": "core-9-0-2"},
+        ]
+        self.compiler.config = {"content": content}
+        self.compiler._compute_fingerprints()
+        before = dict(self.compiler._fingerprints)
+        content[0]["git-ref"] = "v1.3.2"
+        self.compiler._compute_fingerprints()
+        after = self.compiler._fingerprints
+        self.assertNotEqual(before["zlib"], after["zlib"])
+        self.assertNotEqual(before["libpng"], after["libpng"])
+        self.assertEqual(before["tcl"], after["tcl"])
+
+    @patch("compile_all.Compiler._run_cmake")
+    def test_interrupted_build_resumes_after_last_completed_step(self, run_cmake_mock: MagicMock):
+        with tempfile.TemporaryDirectory() as temp:
+            os.chdir(temp)
+            os.mkdir("build-release")
+            self.compiler.journal = BuildJournal(os.path.join(temp, "journal"))
+            self.compiler.journal.record("nonexistent", "abc", ["build-dir", "configure"])
+            self.compiler._fingerprints = {"nonexistent": "abc"}
+            self.compiler._current_package = "nonexistent"
+            self.compiler._start_journal("nonexistent")
+            self.compiler._cmake_create_build_dir()
+            self.compiler._cmake_configure()
+            run_cmake_mock.assert_not_called()
+            self.compiler._cmake_build()
+            run_cmake_mock.assert_called_once()
+            self.assertEqual(
+                self.compiler.journal.completed_steps("nonexistent", "abc"),
+                ["build-dir", "configure", "build"],
+            )
+            os.chdir(self.original_dir)
+
+    @patch("compile_all.Compiler._run_streaming")
+    def test_cmake_phases_log_separately(self, run_streaming_mock: MagicMock):
+        self.compiler.init_script = ["vcvars64.bat"]
+        self.compiler._current_package = "zlib"
+        self.compiler._cmake_configure()
+        self.compiler._cmake_build()
+        self.assertEqual(
+            [call.args[1] for call in run_streaming_mock.call_args_list],
+            ["configure_log.txt", "build_log.txt"],
+        )
+
+    @patch("compile_all.Compiler._run_cmake")
+    def test_cmake_install_stages_then_merges(self, run_cmake_mock: MagicMock):
+        def install(args, env=None, log_filename="build_log.txt"):
+            self.assertEqual(log_filename, "install_log.txt")
+            prefix = args[args.index("--prefix") + 1]
+            os.makedirs(os.path.join(prefix, "include"))
+            open(os.path.join(prefix, "include", "zlib.h"), "w").close()
+
+        run_cmake_mock.side_effect = install
+        with tempfile.TemporaryDirectory() as temp:
+            self.compiler.install_dir = os.path.join(temp, "LibPack")
+            self.compiler._current_package = "zlib"
+            os.chdir(temp)
+            with open("CMakeCache.txt", "w", encoding="utf-8") as f:
+                f.write(f"CMAKE_INSTALL_PREFIX:PATH={self.compiler.install_dir}\n")
+            self.compiler._cmake_install()
+            os.chdir(self.original_dir)
+            self.assertTrue(os.path.exists(os.path.join(temp, "LibPack", "include", "zlib.h")))
+            self.assertFalse(os.path.exists(os.path.join(temp, "staging", "zlib")))
+        self.assertEqual(self.compiler._staged_files, [os.path.join("include", "zlib.h")])
+
+    def test_plan_reports_sentinels_and_forced_packages(self):
+        with tempfile.TemporaryDirectory() as temp:
+            self.compiler.install_dir = temp
+            self.compiler.skip_existing = True
+            self.compiler.force_rebuild = {"tcl"}
+            self.compiler.config = {
+                "content": [
+                    {"name": "zlib", "depends": []},
+                    {"name": "bzip2", "depends": []},
+                    {"name": "tcl", "depends": []},
+                ]
+            }
+            os.makedirs(os.path.join(temp, "include"))
+            open(os.path.join(temp, "include", "zlib.h"), "w").close()
+            plan = self.compiler.plan()
+        self.assertEqual(plan[0], ("zlib", "skip", "sentinel present"))
+        self.assertEqual(plan[1][:2], ("bzip2", "build"))
+        self.assertEqual(plan[2], ("tcl", "rebuild", "forced by --rebuild"))
+
+    def test_plan_skips_debug_only_packages_in_release(self):
+        with tempfile.TemporaryDirectory() as temp:
+            self.compiler.install_dir = temp
+            self.compiler.config = {"content": [{"name": "openblas", "depends": []}]}
+            self.assertEqual(
+                self.compiler.plan(), [("openblas", "skip", "only built in Debug mode")]
+            )
+            self.compiler.mode = compile_all.BuildMode.DEBUG
+            self.assertEqual(self.compiler.plan()[0][1], "build")
+
+    def test_skipped_packages_are_not_timed_as_builds(self):
+        with tempfile.TemporaryDirectory() as temp:
+            self.compiler.base_dir = temp
+            self.compiler.install_dir = os.path.join(temp, "LibPack")
+            self.compiler.skip_existing = True
+            os.makedirs(os.path.join(temp, "zlib"))
+            os.makedirs(os.path.join(temp, "LibPack", "include"))
+            open(os.path.join(temp, "LibPack", "include", "zlib.h"), "w").close()
+            timeline.take()
+            self.compiler.build_package({"name": "zlib"})
+            events = timeline.take()
+        self.assertEqual([(e["package"], e["phase"]) for e in events], [("zlib", "skipped")])
+
+    @patch("compile_all.Compiler.build_nonexistent")
+    def test_packages_that_run_no_command_are_not_timed_as_builds(self, nonexistent_mock):
+        with tempfile.TemporaryDirectory() as temp:
+            self.compiler.base_dir = temp
+            os.makedirs(os.path.join(temp, "nonexistent"))
+            timeline.take()
+            self.compiler.build_package({"name": "nonexistent"})
+            nonexistent_mock.side_effect = lambda _: self.compiler._run_streaming(
+                [sys.executable, "-c", "pass"]
+            )
+            self.compiler.build_package({"name": "nonexistent"})
+            events = timeline.take()
+        self.assertEqual([e["phase"] for e in events], ["skipped", "package"])
+
+    def test_package_durations_fall_back_to_median(self):
+        with tempfile.TemporaryDirectory() as temp:
+            self.compiler.install_dir = os.path.join(temp, "LibPack")
+            self.compiler.config = {
+                "content": [{"name": "zlib"}, {"name": "qt"}, {"name": "tcl"}, {"name": "tk"}]
+            }
+            with open(os.path.join(temp, "build-history.json"), "w", encoding="utf-8") as f:
+                f.write(
+                    '{"zlib": {"package": [10]}, "qt": {"package": [500, 700]}, '
+                    '"tcl": {"package": [40]}}'
+                )
+            durations = self.compiler.package_durations()
+        self.assertEqual(durations["qt"], 600)
+        self.assertEqual(durations["tk"], 40)
+
     @patch("subprocess.run")
     def test_get_python_version(self, run_mock: MagicMock):
         """Checking the Python version stores the Major and Minor components (but not the Patch)"""
@@ -78,6 +387,32 @@ class TestPatchSingleFile(unittest.TestCase):
         handle = mo()
         handle.write.assert_called_once_with("A End.")
 
+    def test_check_patches_reports_every_failure_without_changing_files(self):
+        with tempfile.TemporaryDirectory() as temp:
+            with open(os.path.join(temp, "a.txt"), "w", encoding="utf-8") as f:
+                f.write("The quick brown fox.")
+            dmp = diff_match_patch()
+
+            def write_patch(name: str, file: str, before: str, after: str) -> str:
+                path = os.path.join(temp, name)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"@@@ {file} @@@\n" + dmp.patch_toText(dmp.patch_make(before, after)))
+                return path
+
+            first = write_patch("01.diff", "a.txt", "The quick brown fox.", "The slow brown fox.")
+            second = write_patch("02.diff", "a.txt", "The slow brown fox.", "The slow red fox.")
+            stale = write_patch("03.diff", "a.txt", "Lorem ipsum dolor.", "Lorem ipsum.")
+            missing = write_patch("04.diff", "b.txt", "x", "y")
+            self.assertEqual(compile_all.check_patches([first, second], temp), [])
+            problems = compile_all.check_patches([first, stale, missing], temp)
+            self.assertEqual(len(problems), 2)
+            self.assertIn("a.txt: hunk 1 of 1", problems[0])
+            self.assertIn("b.txt does not exist", problems[1])
+            with patch("builtins.print"), self.assertRaises(SystemExit):
+                compile_all.patch_files([first, stale], temp)
+            with open(os.path.join(temp, "a.txt"), "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "The quick brown fox.")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,12 +2,17 @@
 # SPDX-License-Identifier: LGPL-2.1-or-later
 # SPDX-FileNotice: Part of the FreeCAD project.
 
+import hashlib
+import io
 import os
 import shutil
+import subprocess
 from subprocess import CalledProcessError
+import tarfile
 import tempfile
 import unittest
 from unittest.mock import MagicMock, patch, mock_open
+import requests
 
 import create_libpack
 from compile_all import BuildMode
@@ -146,7 +151,7 @@ class TestRemoteFetchFunctions(unittest.TestCase):
             ]
         }
         create_libpack.fetch_remote_data(test_config, BuildMode.RELEASE)
-        mock_clone.assert_called_once_with("test1", "test1_repo", None, None)
+        mock_clone.assert_called_once_with("test1", "test1_repo", None, None, None)
 
     @patch("create_libpack.clone")
     def test_non_git_entries_are_ignored(self, mock_clone: MagicMock):
@@ -175,7 +180,7 @@ class TestRemoteFetchFunctions(unittest.TestCase):
             ]
         }
         create_libpack.fetch_remote_data(test_config, BuildMode.DEBUG)
-        clone_mock.assert_called_once_with("hybrid", "hybrid_repo", "hybrid_ref", None)
+        clone_mock.assert_called_once_with("hybrid", "hybrid_repo", "hybrid_ref", None, None)
         download_mock.assert_not_called()
 
     @patch("create_libpack.clone")
@@ -194,7 +199,7 @@ class TestRemoteFetchFunctions(unittest.TestCase):
             ]
         }
         create_libpack.fetch_remote_data(test_config, BuildMode.RELEASE)
-        download_mock.assert_called_once_with("hybrid", "https://example.com/prebuilt.zip")
+        download_mock.assert_called_once_with("hybrid", "https://example.com/prebuilt.zip", None)
         clone_mock.assert_not_called()
 
     @patch("os.chdir")
@@ -237,6 +242,13 @@ class TestRemoteFetchFunctions(unittest.TestCase):
         idx = args.index("-version")
         self.assertEqual(args[idx + 1], "[16.0,17.0)")
 
+    def test_submodule_selection(self):
+        selection = ["libs/*", "tools/cmake", "!libs/mpi"]
+        self.assertTrue(create_libpack._selected("libs/math", selection))
+        self.assertTrue(create_libpack._selected("tools/cmake", selection))
+        self.assertFalse(create_libpack._selected("libs/mpi", selection))
+        self.assertFalse(create_libpack._selected("tools/quickbook", selection))
+
     @patch("os.chdir")
     @patch("subprocess.run")
     def test_clone_qt_skips_submodule_init(self, run_mock: MagicMock, _):
@@ -273,21 +285,238 @@ class TestRemoteFetchFunctions(unittest.TestCase):
         create_libpack.fetch_remote_data(test_config, BuildMode.RELEASE)
         download_mock.assert_called_once()
 
+    def test_pipeline_reports_each_source_as_it_is_ready(self):
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            config = {"content": [{"name": "pip_only"}, {"name": "broken", "git-ref": "v1"}]}
+            with patch("builtins.print"):
+                pipeline = create_libpack.FetchPipeline(config, BuildMode.RELEASE, False, set(), 1)
+                with self.assertRaises(SystemExit):
+                    pipeline.wait("broken")
+                with self.assertRaises(SystemExit):
+                    pipeline.finish()
+            pipeline = create_libpack.FetchPipeline(
+                {"content": [{"name": "pip_only"}]}, BuildMode.RELEASE, False, set(), 1
+            )
+            pipeline.wait("pip_only")
+            pipeline.finish()
+            self.assertTrue(os.path.isdir("pip_only"))
+        finally:
+            os.chdir(cwd)
+
+    def test_kept_sources_with_changed_patches_are_reported(self):
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            patch_file = os.path.join(self.temp_dir.name, "zlib.patch")
+            with open(patch_file, "w", encoding="utf-8") as f:
+                f.write("--- a/zlib.h\n+++ b/zlib.h\n@@ -1 +1 @@\n-old\n+new\n")
+            item = {"name": "zlib", "git-repo": "https://some.url/zlib", "patches": [patch_file]}
+            os.makedirs(os.path.join("zlib", ".git"))
+            create_libpack._record_patches(item)
+            create_libpack.fetch_remote_data({"content": [item]}, BuildMode.RELEASE, True)
+            with open(patch_file, "a", encoding="utf-8") as f:
+                f.write(" context\n")
+            with patch("builtins.print") as print_mock, self.assertRaises(SystemExit):
+                create_libpack.fetch_remote_data({"content": [item]}, BuildMode.RELEASE, True)
+            self.assertIn("--rebuild zlib", print_mock.call_args_list[0][0][0])
+        finally:
+            os.chdir(cwd)
+
+    @unittest.skipIf(shutil.which("git") is None, "git is not installed")
+    def test_pipeline_preflight_stops_on_a_failed_patch(self):
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            upstream = os.path.join(self.temp_dir.name, "upstream")
+            os.makedirs(upstream)
+            for args in (["init", "-q"], ["commit", "-q", "--allow-empty", "-m", "initial"]):
+                subprocess.run(
+                    ["git", "-c", "user.name=test", "-c", "user.email=test@test", *args],
+                    cwd=upstream,
+                    check=True,
+                )
+            patch_file = os.path.join(self.temp_dir.name, "missing.patch")
+            with open(patch_file, "w", encoding="utf-8") as f:
+                f.write("--- a/missing.h\n+++ b/missing.h\n@@ -1 +1 @@\n-old\n+new\n")
+            config = {
+                "content": [
+                    {"name": "pip_only"},
+                    {"name": "zlib", "git-repo": upstream, "patches": [patch_file]},
+                ]
+            }
+            os.makedirs("working")
+            os.chdir("working")
+            with patch("builtins.print"):
+                pipeline = create_libpack.FetchPipeline(config, BuildMode.RELEASE, False, set(), 1)
+                with self.assertRaises(SystemExit):
+                    pipeline.preflight()
+                with self.assertRaises(SystemExit):
+                    pipeline.finish()
+        finally:
+            os.chdir(cwd)
+
+    def test_fetch_plan_mirrors_fetch_decisions(self):
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            os.mkdir("present")
+            git_entry = {"name": "present", "git-repo": "repo", "git-ref": "v1"}
+            self.assertEqual(
+                create_libpack.fetch_plan(git_entry, BuildMode.RELEASE, True, set()),
+                ("keep", "source present"),
+            )
+            self.assertEqual(
+                create_libpack.fetch_plan(git_entry, BuildMode.RELEASE, True, {"present"}),
+                ("clone", "forced by --rebuild"),
+            )
+            os.mkdir(os.path.join("present", ".git"))
+            self.assertEqual(
+                create_libpack.fetch_plan(git_entry, BuildMode.RELEASE, True, {"present"}),
+                ("update", "forced by --rebuild, existing clone"),
+            )
+            url_entry = {"name": "missing", "url": "https://some.url"}
+            self.assertEqual(
+                create_libpack.fetch_plan(url_entry, BuildMode.RELEASE, True, set()),
+                ("download", "source not present"),
+            )
+        finally:
+            os.chdir(cwd)
+
+    @patch("os.replace")  # Patch so the (nonexistent) partial file isn't moved
     @patch("os.mkdir")  # Patch so it doesn't actually make a directory
     @patch("requests.get")  # Patch so no network request is made
     @patch("create_libpack.decompress")  # Patch so no attempt is made to decompress
-    def test_download_creates_file(self, decompress_mock: MagicMock, _1, _2):
+    def test_download_creates_file(self, decompress_mock: MagicMock, _1, _2, replace_mock):
         with patch("builtins.open", mock_open()) as open_mock:
             create_libpack.download("make_this_dir", "https://some.url/test.7z")
-            open_mock.assert_called_once_with(os.path.join("make_this_dir", "test.7z"), "wb")
+            open_mock.assert_called_once_with("make_this_dir-test.7z.part", "wb")
+        replace_mock.assert_called_once_with(
+            "make_this_dir-test.7z.part", os.path.join("make_this_dir", "test.7z")
+        )
         decompress_mock.assert_called_once_with("make_this_dir", "test.7z")
 
+    @patch("create_libpack.decompress")
+    @patch("requests.get")
+    def test_download_resumes_partial_file_and_checks_sha256(
+        self, get_mock: MagicMock, decompress_mock: MagicMock
+    ):
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            with open("pkg-data.7z.part", "wb") as f:
+                f.write(b"first half,")
+            response = get_mock.return_value.__enter__.return_value
+            response.status_code = 206
+            response.iter_content.return_value = [b"second half"]
+            expected = hashlib.sha256(b"first half,second half").hexdigest()
+            create_libpack.download("pkg", "https://some.url/data.7z", expected)
+            self.assertEqual(get_mock.call_args[1]["headers"], {"Range": "bytes=11-"})
+            with open(os.path.join("pkg", "data.7z"), "rb") as f:
+                self.assertEqual(f.read(), b"first half,second half")
+            decompress_mock.assert_called_once_with("pkg", "data.7z")
+
+            response.status_code = 200
+            with patch("builtins.print"), self.assertRaises(SystemExit):
+                create_libpack.download("other", "https://some.url/data.7z", expected)
+            self.assertFalse(os.path.exists("other-data.7z.part"))
+        finally:
+            os.chdir(cwd)
+
+    @staticmethod
+    def _tar_xz(member: str, data: bytes) -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:xz") as archive:
+            info = tarfile.TarInfo(member)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    @patch("requests.get")
+    def test_tar_download_is_extracted_as_it_streams(self, get_mock: MagicMock):
+        archive = self._tar_xz("top/file.txt", b"contents")
+        response = get_mock.return_value.__enter__.return_value
+        response.status_code = 200
+        response.iter_content.return_value = [archive[:100], archive[100:]]
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            with patch("create_libpack.keep_archives", False), patch("builtins.print"):
+                create_libpack.download(
+                    "pkg", "https://some.url/pkg.tar.xz", hashlib.sha256(archive).hexdigest()
+                )
+            with open(os.path.join("pkg", "top", "file.txt"), "rb") as f:
+                self.assertEqual(f.read(), b"contents")
+            self.assertEqual(os.listdir("pkg"), ["top"])
+            self.assertFalse(os.path.exists("pkg-pkg.tar.xz.part"))
+        finally:
+            os.chdir(cwd)
+
+    @patch("requests.get")
+    def test_interrupted_tar_stream_resumes_from_kept_bytes(self, get_mock: MagicMock):
+        archive = self._tar_xz("file.txt", b"contents")
+
+        def broken_stream(chunk_size):
+            yield archive[:50]
+            raise requests.ConnectionError("connection reset")
+
+        streaming = MagicMock()
+        streaming.__enter__.return_value.status_code = 200
+        streaming.__enter__.return_value.iter_content.side_effect = broken_stream
+        resumed = MagicMock()
+        resumed.__enter__.return_value.status_code = 206
+        resumed.__enter__.return_value.iter_content.return_value = [archive[50:]]
+        get_mock.side_effect = [streaming, resumed]
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            with patch("builtins.print"):
+                create_libpack.download("pkg", "https://some.url/pkg.tar.xz")
+            self.assertEqual(get_mock.call_args[1]["headers"], {"Range": "bytes=50-"})
+            with open(os.path.join("pkg", "file.txt"), "rb") as f:
+                self.assertEqual(f.read(), b"contents")
+            self.assertTrue(os.path.exists(os.path.join("pkg", "pkg.tar.xz")))
+        finally:
+            os.chdir(cwd)
+
     @patch("os.chdir")
     @patch("subprocess.run")
     def test_decompress_calls_subprocess(self, run_mock: MagicMock, chdir_mock: MagicMock):
         create_libpack.decompress("path_to_file", "file_name")
         run_mock.assert_called_once()
-        self.assertEqual(chdir_mock.call_count, 2)
+        self.assertEqual(run_mock.call_args[1]["cwd"], "path_to_file")
+        chdir_mock.assert_not_called()
+
+    @patch("create_libpack.clone")
+    def test_fetch_failures_are_collected(self, clone_mock: MagicMock):
+        def fail_test2(name, *_):
+            if name == "test2":
+                exit(128)
+
+        clone_mock.side_effect = fail_test2
+        test_config = {
+            "content": [
+                {"name": "test1", "git-repo": "test1_repo"},
+                {"name": "test2", "git-repo": "test2_repo"},
+                {"name": "test3", "git-repo": "test3_repo"},
+            ]
+        }
+        with patch("builtins.print") as print_mock, self.assertRaises(SystemExit):
+            create_libpack.fetch_remote_data(test_config, BuildMode.RELEASE, max_workers=2)
+        self.assertEqual(clone_mock.call_count, 3)
+        errors = [c[0][0] for c in print_mock.call_args_list if c[0][0].startswith("ERROR")]
+        self.assertEqual(len(errors), 1)
+        self.assertIn("test2", errors[0])
+
+    @patch("create_libpack.clone")
+    @patch("compile_all.patch_files")
+    def test_patches_apply_to_the_clone(self, patch_mock: MagicMock, _):
+        test_config = {
+            "content": [{"name": "test1", "git-repo": "test1_repo", "patches": ["p.patch"]}]
+        }
+        create_libpack.fetch_remote_data(test_config, BuildMode.RELEASE)
+        patch_mock.assert_called_once_with(["p.patch"], "test1")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import create_libpack
+import download_cache
+
+""" Developer tests for the download_cache module. """
+
+
+class TestDownloadCache(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp = tempfile.TemporaryDirectory()
+        self.cache = download_cache.DownloadCache(os.path.join(self.temp.name, "cache"))
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp.name)
+
+    def tearDown(self) -> None:
+        os.chdir(self.original_dir)
+        self.temp.cleanup()
+        super().tearDown()
+
+    def test_lookup_finds_stored_archive_by_url_or_sha256(self):
+        os.makedirs("pkg")
+        with open(os.path.join("pkg", "data.zip"), "wb") as f:
+            f.write(b"archive")
+        digest = hashlib.sha256(b"archive").hexdigest()
+        self.assertIsNone(self.cache.lookup("https://some.url/data.zip"))
+        self.cache.store_archive(
+            "https://some.url/data.zip", digest, os.path.join("pkg", "data.zip")
+        )
+        self.assertEqual(self.cache.lookup("https://some.url/data.zip"), digest)
+        self.assertEqual(self.cache.lookup("https://moved.url/data.zip", digest.upper()), digest)
+        self.assertIsNone(self.cache.lookup("https://other.url/data.zip"))
+        with open(self.cache.archive(digest), "rb") as f:
+            self.assertEqual(f.read(), b"archive")
+
+    def test_stored_tree_leaves_out_the_archive(self):
+        os.makedirs(os.path.join("pkg", "bin"))
+        open(os.path.join("pkg", "data.zip"), "w").close()
+        open(os.path.join("pkg", "bin", "tool.exe"), "w").close()
+        self.cache.store_tree("abc", "pkg", "data.zip")
+        self.assertEqual(sorted(os.listdir(self.cache.tree("abc"))), ["bin"])
+
+    @patch("create_libpack.decompress")
+    @patch("requests.get")
+    def test_second_download_is_materialized_from_the_cache(
+        self, get_mock: MagicMock, decompress_mock: MagicMock
+    ):
+        def extract(name, filename):
+            open(os.path.join(name, "extracted.txt"), "w").close()
+
+        decompress_mock.side_effect = extract
+        response = get_mock.return_value.__enter__.return_value
+        response.status_code = 200
+        response.iter_content.return_value = [b"archive"]
+        with patch("create_libpack.download_cache", self.cache), patch("builtins.print"):
+            create_libpack.download("first", "https://some.url/data.zip")
+            create_libpack.download("second", "https://some.url/data.zip")
+        get_mock.assert_called_once()
+        decompress_mock.assert_called_once()
+        self.assertTrue(os.path.exists(os.path.join("second", "extracted.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
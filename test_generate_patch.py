@@ -3,9 +3,12 @@
 # SPDX-FileNotice: Part of the FreeCAD project.
 
 import diff_match_patch
+import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch, mock_open
 
+import compile_all
 import generate_patch
 
 """ Developer tests for the generate_patch module. """
@@ -51,3 +54,47 @@ class TestGeneratePatch(unittest.TestCase):
             ]
             for call in expected_calls:
                 self.assertIn(call, open_mock.mock_calls)
+
+    def test_tree_patch_turns_the_old_tree_into_the_new_one(self):
+        def write(root: str, relative: str, data: bytes):
+            path = os.path.join(root, *relative.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+
+        def read(root: str, relative: str) -> bytes:
+            with open(os.path.join(root, *relative.split("/")), "rb") as f:
+                return f.read()
+
+        with tempfile.TemporaryDirectory() as temp:
+            old_dir = os.path.join(temp, "old")
+            new_dir = os.path.join(temp, "new")
+            for root, text in ((old_dir, b"Line1\nLine2\nLine4\n"), (new_dir, b"Line1\nLine3\n")):
+                write(root, "top.txt", text)
+                write(root, "src/nested/file.h", text.replace(b"Line", b"int x"))
+            write(old_dir, "endings.txt", b"a\nb\n")
+            write(new_dir, "endings.txt", b"a\r\nb\r\n")
+            write(old_dir, "image.bin", b"\xff\xfe\x00\x01")
+            write(new_dir, "image.bin", b"\xff\xfe\x00\x02")
+            write(new_dir, "only_new.txt", b"new\n")
+            with patch("builtins.print"):
+                self.assertEqual(
+                    generate_patch._changed_files(old_dir, new_dir),
+                    ["endings.txt", "image.bin", "top.txt", "src/nested/file.h"],
+                )
+                patch_data = generate_patch.generate_tree_patch(old_dir, new_dir, max_workers=2)
+            self.assertEqual(
+                [entry["file"] for entry in compile_all.split_patch_data(patch_data)],
+                ["top.txt", "src/nested/file.h"],
+            )
+            patch_path = os.path.join(temp, "tree.patch")
+            with open(patch_path, "w", encoding="utf-8") as f:
+                f.write(patch_data)
+            with patch("builtins.print"):
+                compile_all.apply_patch(patch_path, old_dir)
+            for relative in ("top.txt", "src/nested/file.h"):
+                self.assertEqual(read(old_dir, relative), read(new_dir, relative))
+            # Files a patch cannot express are left alone
+            self.assertEqual(read(old_dir, "endings.txt"), b"a\nb\n")
+            self.assertEqual(read(old_dir, "image.bin"), b"\xff\xfe\x00\x01")
+            self.assertFalse(os.path.exists(os.path.join(old_dir, "only_new.txt")))
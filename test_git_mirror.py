@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import create_libpack
+import git_mirror
+
+""" Developer tests for the git_mirror module. """
+
+GIT_ENV = dict(
+    os.environ,
+    GIT_AUTHOR_NAME="test",
+    GIT_AUTHOR_EMAIL="test@example.com",
+    GIT_COMMITTER_NAME="test",
+    GIT_COMMITTER_EMAIL="test@example.com",
+)
+
+
+def git(cwd: str, *args: str):
+    subprocess.run(["git", *args], cwd=cwd, env=GIT_ENV, capture_output=True, check=True)
+
+
+def make_repo(path: str, filename: str, tag: str = None):
+    os.makedirs(path)
+    git(path, "init", "-q", "-b", "main")
+    with open(os.path.join(path, filename), "w", encoding="utf-8") as f:
+        f.write(filename)
+    git(path, "add", filename)
+    git(path, "commit", "-q", "-m", "initial")
+    if tag:
+        git(path, "tag", tag)
+
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class TestGitMirror(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp = tempfile.TemporaryDirectory()
+        self.upstream = os.path.join(self.temp.name, "upstream", "zlib")
+        self.mirror = git_mirror.GitMirror(os.path.join(self.temp.name, "mirrors"))
+        self.original_dir = os.getcwd()
+        os.makedirs(os.path.join(self.temp.name, "working"))
+        os.chdir(os.path.join(self.temp.name, "working"))
+
+    def tearDown(self) -> None:
+        os.chdir(self.original_dir)
+        self.temp.cleanup()
+        super().tearDown()
+
+    def test_mirror_is_created_then_updated(self):
+        make_repo(self.upstream, "zlib.h", "v1")
+        path = self.mirror.update(self.upstream)
+        self.assertTrue(os.path.basename(path).startswith("zlib-"))
+        git(self.upstream, "tag", "v2")
+        self.assertEqual(self.mirror.update(self.upstream), path)
+        tags = subprocess.run(["git", "tag"], cwd=path, capture_output=True, text=True).stdout
+        self.assertEqual(tags.split(), ["v1", "v2"])
+
+    def test_mirror_is_used_when_upstream_is_gone(self):
+        make_repo(self.upstream, "zlib.h", "v1")
+        self.mirror.update(self.upstream)
+        shutil.rmtree(self.upstream)
+        with patch("builtins.print"):
+            path = self.mirror.update(self.upstream)
+        self.assertTrue(os.path.exists(os.path.join(path, "HEAD")))
+
+    def test_clone_through_mirror_with_submodule(self):
+        submodule = os.path.join(self.temp.name, "upstream", "sub")
+        make_repo(submodule, "sub.h")
+        make_repo(self.upstream, "zlib.h")
+        git(self.upstream, "-c", "protocol.file.allow=always", "submodule", "add", submodule, "sub")
+        git(self.upstream, "commit", "-q", "-m", "add submodule")
+        git(self.upstream, "tag", "v1")
+        with patch("create_libpack.git_mirror", self.mirror), patch("builtins.print"):
+            create_libpack.clone("zlib", self.upstream, "v1")
+        self.assertTrue(os.path.exists(os.path.join("zlib", "zlib.h")))
+        self.assertTrue(os.path.exists(os.path.join("zlib", "sub", "sub.h")))
+        origin = subprocess.run(
+            ["git", "remote", "get-url", "origin"],
+            cwd=os.path.join("zlib", "sub"),
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        self.assertEqual(origin, submodule)
+        self.assertTrue(os.path.exists(self.mirror.path(submodule)))
+
+    def test_submodules_are_fetched_concurrently_and_timed(self):
+        make_repo(self.upstream, "zlib.h")
+        for index in range(3):
+            submodule = os.path.join(self.temp.name, "upstream", f"sub{index}")
+            make_repo(submodule, f"sub{index}.h")
+            git(
+                self.upstream,
+                "-c",
+                "protocol.file.allow=always",
+                "submodule",
+                "add",
+                submodule,
+                f"libs/sub{index}",
+            )
+        git(self.upstream, "commit", "-q", "-m", "add submodules")
+        git(self.upstream, "tag", "v1")
+        # Submodules over local paths are normally refused, so allow them for this test only
+        file_protocol = {
+            "GIT_CONFIG_COUNT": "1",
+            "GIT_CONFIG_KEY_0": "protocol.file.allow",
+            "GIT_CONFIG_VALUE_0": "always",
+        }
+        with patch.dict(os.environ, file_protocol), patch(
+            "create_libpack.submodule_jobs", 3
+        ), patch("builtins.print") as print_mock:
+            create_libpack.clone("zlib", self.upstream, "v1")
+        for index in range(3):
+            self.assertTrue(
+                os.path.exists(os.path.join("zlib", "libs", f"sub{index}", f"sub{index}.h"))
+            )
+        progress = [c.args[0] for c in print_mock.call_args_list if "/3]" in c.args[0]]
+        self.assertEqual(len(progress), 3)
+        self.assertTrue(all(line.endswith("s)") for line in progress))
+
+    def test_only_selected_submodules_are_initialized(self):
+        make_repo(self.upstream, "zlib.h")
+        for path in ("libs/a", "libs/b", "tools/c"):
+            submodule = os.path.join(self.temp.name, "upstream", path.replace("/", "_"))
+            make_repo(submodule, "file.h")
+            git(
+                self.upstream,
+                "-c",
+                "protocol.file.allow=always",
+                "submodule",
+                "add",
+                submodule,
+                path,
+            )
+        git(self.upstream, "commit", "-q", "-m", "add submodules")
+        with patch("create_libpack.git_mirror", self.mirror), patch("builtins.print"):
+            create_libpack.clone("zlib", self.upstream, None, None, ["libs/*", "!libs/b"])
+        self.assertTrue(os.path.exists(os.path.join("zlib", "libs", "a", "file.h")))
+        self.assertFalse(os.path.exists(os.path.join("zlib", "libs", "b", "file.h")))
+        self.assertFalse(os.path.exists(os.path.join("zlib", "tools", "c", "file.h")))
+
+    def test_hash_is_fetched_without_history(self):
+        make_repo(self.upstream, "zlib.h")
+        pinned = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=self.upstream, capture_output=True, text=True
+        ).stdout.strip()
+        git(self.upstream, "commit", "-q", "--allow-empty", "-m", "later")
+        for mirror in (None, self.mirror):
+            with patch("create_libpack.git_mirror", mirror), patch("builtins.print"):
+                create_libpack.clone("zlib", self.upstream, None, pinned)
+
+            def rev_parse(*args):
+                return subprocess.run(
+                    ["git", "rev-parse", *args], cwd="zlib", capture_output=True, text=True
+                ).stdout.strip()
+
+            self.assertEqual(rev_parse("HEAD"), pinned)
+            self.assertEqual(rev_parse("--is-shallow-repository"), "true")
+            shutil.rmtree("zlib")
+
+    def test_existing_clone_is_updated_in_place(self):
+        make_repo(self.upstream, "zlib.h", "v1")
+        with patch("builtins.print"):
+            create_libpack.clone("zlib", self.upstream, "v1")
+        with open(os.path.join("zlib", "zlib.h"), "w", encoding="utf-8") as f:
+            f.write("patched")
+        open(os.path.join("zlib", "untracked.txt"), "w").close()
+        with open(os.path.join(self.upstream, "zlib.c"), "w", encoding="utf-8") as f:
+            f.write("zlib.c")
+        git(self.upstream, "add", "zlib.c")
+        git(self.upstream, "commit", "-q", "-m", "second")
+        git(self.upstream, "tag", "v2")
+        with patch("builtins.print"):
+            self.assertTrue(create_libpack.update_clone("zlib", self.upstream, "v2"))
+        self.assertTrue(os.path.exists(os.path.join("zlib", "zlib.c")))
+        self.assertFalse(os.path.exists(os.path.join("zlib", "untracked.txt")))
+        with open(os.path.join("zlib", "zlib.h"), "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "zlib.h")
+
+    def test_clone_of_another_repo_is_not_updated(self):
+        make_repo(self.upstream, "zlib.h", "v1")
+        with patch("builtins.print"):
+            create_libpack.clone("zlib", self.upstream, "v1")
+            self.assertFalse(create_libpack.update_clone("zlib", "https://elsewhere/zlib", "v1"))
+        self.assertFalse(os.path.exists("zlib"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import unittest
+
+import jobserver
+
+""" Developer tests for the jobserver module. """
+
+
+def _take_and_return(_):
+    server = jobserver.current()
+    with server.building():
+        granted = server.acquire()
+        server.release(granted)
+    return granted
+
+
+class TestJobServer(unittest.TestCase):
+
+    def test_lone_package_gets_the_whole_budget(self):
+        server = jobserver.JobServer(16)
+        with server.building():
+            granted = server.acquire()
+            self.assertEqual(granted, 16)
+            server.release(granted)
+        self.assertEqual(server.free(), 16)
+
+    def test_overlapping_packages_get_a_fair_share(self):
+        server = jobserver.JobServer(16)
+        with server.building(), server.building(), server.building():
+            first = server.acquire()
+            second = server.acquire()
+            self.assertEqual((first, second), (5, 5))
+            self.assertEqual(server.free(), 6)
+            server.release(first)
+            server.release(second)
+
+    def test_grants_are_capped(self):
+        server = jobserver.JobServer(16, max_share=4)
+        with server.building():
+            granted = server.acquire()
+            single = server.acquire(1)
+            self.assertEqual((granted, single), (4, 1))
+            self.assertEqual(server.free(), 11)
+            server.release(granted)
+            server.release(single)
+
+    def test_acquire_blocks_until_tokens_are_free(self):
+        server = jobserver.JobServer(2)
+        held = server.acquire()
+        self.assertEqual(server.free(), 0)
+        grants = []
+        waiter = threading.Thread(target=lambda: grants.append(server.acquire()))
+        waiter.start()
+        waiter.join(0.05)
+        self.assertEqual(grants, [])
+        server.release(held)
+        waiter.join(5)
+        self.assertEqual(grants, [2])
+
+    def test_budget_is_shared_with_worker_processes(self):
+        server = jobserver.JobServer(4)
+        with ProcessPoolExecutor(
+            max_workers=2, initializer=jobserver.install, initargs=(server,)
+        ) as executor:
+            grants = list(executor.map(_take_and_return, range(4)))
+        self.assertTrue(all(1 <= granted <= 4 for granted in grants))
+        self.assertEqual(server.free(), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
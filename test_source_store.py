@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import compile_all
+import create_libpack
+from compile_all import BuildMode
+import source_store
+
+""" Developer tests for the source_store module. """
+
+
+class TestSourceStore(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = source_store.SourceStore(os.path.join(self.temp_dir, "sources"))
+        self.original_dir = os.getcwd()
+        os.makedirs(os.path.join(self.temp_dir, "working"))
+        os.chdir(os.path.join(self.temp_dir, "working"))
+
+    def tearDown(self) -> None:
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir, onerror=create_libpack.remove_readonly)
+        super().tearDown()
+
+    @staticmethod
+    def populate(path: str):
+        os.makedirs(path)
+        with open(os.path.join(path, "zlib.h"), "w", encoding="utf-8") as f:
+            f.write("zlib.h")
+
+    def test_checkout_is_added_once_and_made_read_only(self):
+        item = {"name": "zlib", "git-repo": "https://some.url/zlib", "git-ref": "v1"}
+        populate = MagicMock(side_effect=self.populate)
+        path = self.store.add(item, populate)
+        self.assertEqual(self.store.add(item, populate), path)
+        populate.assert_called_once()
+        mode = os.stat(os.path.join(path, "zlib.h")).st_mode
+        self.assertFalse(mode & stat.S_IWUSR)
+        bumped = dict(item, **{"git-ref": "v2"})
+        self.assertNotEqual(self.store.path(bumped), path)
+
+    def test_failed_checkout_leaves_nothing_behind(self):
+        item = {"name": "zlib", "git-repo": "https://some.url/zlib"}
+
+        def fail(path):
+            os.makedirs(path)
+            exit(1)
+
+        with self.assertRaises(SystemExit):
+            self.store.add(item, fail)
+        self.assertFalse(os.path.exists(self.store.root) and os.listdir(self.store.root))
+
+    def test_link_and_unlink(self):
+        os.makedirs("real")
+        self.assertIsNone(source_store.linked("real"))
+        self.assertIsNone(source_store.linked("missing"))
+        target = os.path.join(self.temp_dir, "target")
+        os.makedirs(target)
+        source_store.link(target, "zlib")
+        self.assertEqual(source_store.linked("zlib"), os.path.realpath(target))
+        source_store.unlink("zlib")
+        self.assertFalse(os.path.lexists("zlib"))
+        self.assertTrue(os.path.isdir(target))
+
+    @patch("create_libpack.clone")
+    def test_both_modes_share_one_checkout(self, clone_mock: MagicMock):
+        clone_mock.side_effect = lambda path, *_: self.populate(path)
+        config = {
+            "content": [
+                {"name": "zlib", "git-repo": "https://some.url/zlib", "git-ref": "v1"},
+                {"name": "python", "git-repo": "https://some.url/python", "git-ref": "v1"},
+            ]
+        }
+        with patch("create_libpack.shared_sources", self.store), patch("builtins.print"):
+            for mode in (BuildMode.DEBUG, BuildMode.RELEASE):
+                os.makedirs(os.path.join("..", str(mode)))
+                os.chdir(os.path.join("..", str(mode)))
+                create_libpack.fetch_remote_data(config, mode, True)
+                self.assertIsNotNone(source_store.linked("zlib"))
+                self.assertIsNone(source_store.linked("python"))  # Builds in its source tree
+                self.assertEqual(
+                    create_libpack.fetch_plan(config["content"][0], mode, True, set())[0], "keep"
+                )
+        # zlib once for both modes, python once per mode
+        self.assertEqual(clone_mock.call_count, 3)
+
+    def test_linked_sources_build_in_the_working_directory(self):
+        item = {"name": "zlib", "git-repo": "https://some.url/zlib", "git-ref": "v1"}
+        source_store.link(self.store.add(item, self.populate), "zlib")
+        config = {"FreeCAD-version": "0.22", "LibPack-version": "3.0.0", "content": [item]}
+        compiler = compile_all.Compiler(config, "bison_path")
+        compiler._current_package = "zlib"
+        os.chdir("zlib")
+        compiler._cmake_create_build_dir()
+        working = os.path.join(self.temp_dir, "working")
+        self.assertEqual(os.getcwd(), os.path.realpath(os.path.join(working, "zlib-build-release")))
+        self.assertEqual(compiler._cmake_source_dir, os.path.realpath(self.store.path(item)))
+        self.assertEqual(os.listdir(self.store.path(item)), ["zlib.h"])
+
+
+if __name__ == "__main__":
+    unittest.main()
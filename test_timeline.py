@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import json
+import os
+import tempfile
+import unittest
+
+import timeline
+
+""" Developer tests for the timeline module. """
+
+
+class TestTimeline(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        timeline.take()
+
+    def tearDown(self) -> None:
+        timeline.take()
+        super().tearDown()
+
+    def test_failed_phase_is_recorded(self):
+        with self.assertRaises(SystemExit):
+            with timeline.phase("zlib", "build"):
+                exit(1)
+        (event,) = timeline.take()
+        self.assertEqual((event["package"], event["phase"], event["ok"]), ("zlib", "build", False))
+
+    def test_chrome_trace_has_one_row_per_package(self):
+        timeline.merge(
+            [
+                {"package": "zlib", "phase": "build", "start": 10.0, "end": 12.5, "ok": True},
+                {"package": "tcl", "phase": "build", "start": 11.0, "end": 13.0, "ok": True},
+                {"package": "zlib", "phase": "install", "start": 12.5, "end": 13.0, "ok": True},
+            ]
+        )
+        trace = timeline.chrome_trace(timeline.events())["traceEvents"]
+        phases = [e for e in trace if e["ph"] == "X"]
+        self.assertEqual(len(phases), 3)
+        self.assertEqual(phases[0]["ts"], 0)
+        self.assertEqual(phases[0]["dur"], 2500000)
+        self.assertEqual(phases[0]["tid"], phases[2]["tid"])
+        self.assertNotEqual(phases[0]["tid"], phases[1]["tid"])
+
+    def test_write_creates_both_files(self):
+        with timeline.phase("zlib", "configure"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            timeline.write(directory)
+            with open(os.path.join(directory, timeline.TIMELINE_FILE), encoding="utf-8") as f:
+                self.assertIn("configure", json.load(f)["packages"]["zlib"])
+            self.assertTrue(os.path.exists(os.path.join(directory, timeline.TRACE_FILE)))
+
+    def test_history_keeps_recent_successful_durations(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, timeline.HISTORY_FILE)
+            for duration in (100.0, 200.0):
+                timeline.take()
+                timeline.merge(
+                    [
+                        {
+                            "package": "vtk",
+                            "phase": "package",
+                            "start": 0.0,
+                            "end": duration,
+                            "ok": True,
+                        },
+                        {
+                            "package": "qt",
+                            "phase": "package",
+                            "start": 0.0,
+                            "end": 5.0,
+                            "ok": False,
+                        },
+                    ]
+                )
+                timeline.update_history(path)
+            history = timeline.load_history(path)
+        self.assertEqual(timeline.estimate(history, "vtk", "package"), 150.0)
+        self.assertIsNone(timeline.estimate(history, "qt", "package"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import compile_all
+import unified_patch
+
+""" Developer tests for the unified_patch module. """
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 21))
+
+PATCH = """diff --git a/src/file.txt b/src/file.txt
+index 0000000..1111111 100644
+--- a/src/file.txt
++++ b/src/file.txt
+@@ -2,7 +2,7 @@ some function
+ line 2
+ line 3
+ line 4
+-line 5
++line five
+ line 6
+ line 7
+ line 8
+@@ -14,6 +14,8 @@
+ line 14
+ line 15
+ line 16
++line 16a
++line 16b
+ line 17
+ line 18
+ line 19
+"""
+
+
+class TestUnifiedPatch(unittest.TestCase):
+    def apply(self, text: str, patch_data: str = PATCH):
+        (file_patch,) = unified_patch.parse(patch_data)
+        self.assertEqual(file_patch.path, "src/file.txt")
+        return unified_patch.apply(file_patch, text)
+
+    def test_hunks_apply_at_their_line_numbers(self):
+        result, failed = self.apply(ORIGINAL)
+        self.assertEqual(failed, [])
+        lines = result.splitlines()
+        self.assertEqual(lines[4], "line five")
+        self.assertEqual(lines[16:18], ["line 16a", "line 16b"])
+        self.assertEqual(len(lines), 22)
+
+    def test_hunks_apply_when_the_file_has_moved(self):
+        result, failed = self.apply("header 1\nheader 2\nheader 3\n" + ORIGINAL)
+        self.assertEqual(failed, [])
+        self.assertEqual(result.splitlines()[7], "line five")
+        self.assertEqual(result.splitlines()[19], "line 16a")
+
+    def test_changed_context_applies_with_fuzz_only(self):
+        result, failed = self.apply(ORIGINAL.replace("line 2\n", "line two\n"))
+        self.assertEqual(failed, [])
+        self.assertEqual(result.splitlines()[4], "line five")
+        result, failed = self.apply(ORIGINAL.replace("line 5\n", "line V\n"))
+        self.assertEqual(len(failed), 1)
+        self.assertIn("hunk 1 of 2 (@@ -2,7 +2,7 @@", failed[0])
+        self.assertEqual(result.splitlines()[16], "line 16a")
+
+    def test_line_endings_are_kept(self):
+        result, failed = self.apply(ORIGINAL.replace("\n", "\r\n"))
+        self.assertEqual(failed, [])
+        self.assertNotIn("\n", result.replace("\r\n", ""))
+        self.assertIn("line five\r\n", result)
+
+    def test_new_file_and_missing_final_newline(self):
+        patch_data = (
+            "--- /dev/null\n+++ b/src/file.txt\n@@ -0,0 +1,2 @@\n+first\n+second\n"
+            "\\ No newline at end of file\n"
+        )
+        (file_patch,) = unified_patch.parse(patch_data)
+        self.assertTrue(file_patch.creates)
+        self.assertEqual(unified_patch.apply(file_patch, ""), ("first\nsecond", []))
+
+    def test_format_patch_signature_is_not_part_of_the_hunk(self):
+        patch_data = (
+            "From 0123456789abcdef Mon Sep 17 00:00:00 2001\nSubject: [PATCH] Rename line 5\n\n"
+            "---\n src/file.txt | 2 +-\n 1 file changed, 1 insertion(+), 1 deletion(-)\n\n"
+            + PATCH.split("@@ -14")[0]
+            + "-- \n2.39.0\n\n"
+        )
+        result, failed = self.apply(ORIGINAL, patch_data)
+        self.assertEqual(failed, [])
+        self.assertEqual(result, ORIGINAL.replace("line 5\n", "line five\n"))
+
+    def test_hunk_lines_that_look_like_file_headers(self):
+        patch_data = (
+            "--- a/src/file.txt\n+++ b/src/file.txt\n@@ -1,3 +1,3 @@\n line 1\n"
+            "--- line 2\n+++ line 2\n line 3\n"
+        )
+        result, failed = self.apply(ORIGINAL.replace("line 2\n", "-- line 2\n"), patch_data)
+        self.assertEqual(failed, [])
+        self.assertEqual(result.splitlines()[:3], ["line 1", "++ line 2", "line 3"])
+        with self.assertRaises(ValueError):
+            unified_patch.parse(patch_data.rsplit(" line 3\n", 1)[0])
+
+    def test_patch_files_accepts_both_formats(self):
+        with tempfile.TemporaryDirectory() as temp:
+            os.makedirs(os.path.join(temp, "src"))
+            with open(os.path.join(temp, "src", "file.txt"), "w", encoding="utf-8") as f:
+                f.write(ORIGINAL)
+            unified = os.path.join(temp, "01-unified.patch")
+            with open(unified, "w", encoding="utf-8") as f:
+                f.write(PATCH)
+            legacy = os.path.join(temp, "02-legacy.patch")
+            with open(legacy, "w", encoding="utf-8") as f:
+                f.write(
+                    "@@@ src/file.txt @@@\n@@ -1,10 +1,10 @@\n-line 1%0A\n+line one%0A\n line 2%0A\n"
+                )
+            self.assertEqual(compile_all.check_patches([unified, legacy], temp), [])
+            with patch("builtins.print"):
+                compile_all.patch_files([unified, legacy], temp)
+            with open(os.path.join(temp, "src", "file.txt"), "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[:5], ["line one", "line 2", "line 3", "line 4", "line five"])
+
+
+if __name__ == "__main__":
+    unittest.main()
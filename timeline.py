@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# Wall-clock timings of each phase of a LibPack build (fetch, patch, configure, build, install,
+# pip, and the post-processing passes), written next to manifest.json both as a plain JSON
+# timeline and in the Chrome trace_event format, which chrome://tracing and ui.perfetto.dev load
+# directly.
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+TIMELINE_FILE = "timeline.json"
+TRACE_FILE = "timeline.trace.json"
+HISTORY_FILE = "build-history.json"
+
+# How many past durations of each phase build-history.json keeps, and which phases it tracks
+HISTORY_LENGTH = 5
+HISTORY_PHASES = ("fetch", "patch", "package", "restore")
+
+_events: List[dict] = []
+_lock = threading.Lock()
+
+
+@contextmanager
+def phase(package: str, name: str) -> Iterator[dict]:
+    """Time the enclosed block as one phase of one package. The phase is recorded even if the
+    block fails, with "ok" set to False. The block is given the event being recorded, so that it
+    can still change the name of the phase once it knows more about what it did."""
+    event = {
+        "package": package,
+        "phase": name,
+        "start": time.time(),
+        "ok": False,
+        "pid": os.getpid(),
+    }
+    try:
+        yield event
+        event["ok"] = True
+    finally:
+        event["end"] = time.time()
+        with _lock:
+            _events.append(event)
+
+
+def take() -> List[dict]:
+    """Remove and return everything recorded so far in this process. Package build workers hand
+    their events back to the scheduling process this way."""
+    global _events
+    with _lock:
+        taken, _events = _events, []
+    return taken
+
+
+def merge(events: List[dict]):
+    """Add events recorded by another process."""
+    with _lock:
+        _events.extend(events)
+
+
+def events() -> List[dict]:
+    with _lock:
+        return sorted(_events, key=lambda e: e["start"])
+
+
+def package_totals(recorded: List[dict]) -> Dict[str, Dict[str, float]]:
+    """Seconds spent in each phase of each package, summed over repeated phases."""
+    totals: Dict[str, Dict[str, float]] = {}
+    for event in recorded:
+        phases = totals.setdefault(event["package"], {})
+        phases[event["phase"]] = phases.get(event["phase"], 0.0) + event["end"] - event["start"]
+    return totals
+
+
+def chrome_trace(recorded: List[dict]) -> dict:
+    """The events in Chrome's trace_event format: one complete ("X") event per phase, with one
+    row per package so that overlapping package builds are laid out side by side."""
+    if not recorded:
+        return {"traceEvents": [], "displayTimeUnit": "ms"}
+    origin = min(e["start"] for e in recorded)
+    rows: Dict[str, int] = {}
+    trace = []
+    for event in recorded:
+        if event["package"] not in rows:
+            rows[event["package"]] = len(rows) + 1
+            trace.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": 1,
+                    "tid": rows[event["package"]],
+                    "args": {"name": event["package"]},
+                }
+            )
+        trace.append(
+            {
+                "name": event["phase"],
+                "cat": event["package"],
+                "ph": "X",
+                "ts": round((event["start"] - origin) * 1e6),
+                "dur": round((event["end"] - event["start"]) * 1e6),
+                "pid": 1,
+                "tid": rows[event["package"]],
+                "args": {"ok": event["ok"]},
+            }
+        )
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def write(directory: str):
+    """Write timeline.json and timeline.trace.json into directory."""
+    recorded = events()
+    if not recorded or not os.path.isdir(directory):
+        return
+    with open(os.path.join(directory, TIMELINE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"events": recorded, "packages": package_totals(recorded)}, f, indent="    ")
+    with open(os.path.join(directory, TRACE_FILE), "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(recorded), f)
+
+
+def load_history(path: str) -> Dict[str, Dict[str, List[float]]]:
+    """Recent durations in seconds of each tracked phase of each package, from past runs."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_history(path: str):
+    """Add the successful phases recorded in this run to the history file at path."""
+    history = load_history(path)
+    for event in events():
+        if not event["ok"] or event["phase"] not in HISTORY_PHASES:
+            continue
+        durations = history.setdefault(event["package"], {}).setdefault(event["phase"], [])
+        durations.append(round(event["end"] - event["start"], 1))
+        del durations[:-HISTORY_LENGTH]
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent="    ")
+    os.replace(temp_path, path)
+
+
+def estimate(
+    history: Dict[str, Dict[str, List[float]]], package: str, name: str
+) -> Optional[float]:
+    """The expected duration of a phase, the mean of its recorded durations, or None if it has
+    never been recorded."""
+    durations = history.get(package, {}).get(name)
+    if not durations:
+        return None
+    return sum(durations) / len(durations)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+# SPDX-FileNotice: Part of the FreeCAD project.
+
+# Line-based unified diffs (the output of "git diff" or "diff -u"), the second patch format accepted
+# in the "patches" list of config.json beside the "@@@ filename @@@" format of generate_patch.py.
+# Each hunk is located by comparing whole lines, first at the line number it names (shifted by
+# however far earlier hunks moved) and then at increasing distances from it up to MAX_OFFSET lines,
+# so applying a patch costs time proportional to the size of the file rather than the character
+# by character fuzzy matching of diff_match_patch. A hunk whose context no longer matches exactly
+# may still apply with up to FUZZ lines of context ignored at each end, as GNU patch does.
+
+import re
+from typing import List, Optional, Tuple
+
+# How many lines away from the line number it names a hunk is looked for
+MAX_OFFSET = 1000
+
+# How many lines of leading and trailing context a hunk may ignore to apply
+FUZZ = 2
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class Hunk:
+    """One hunk: its header line, the line number it starts at in the original file, and its lines
+    as (kind, text) pairs, where kind is " " (context), "-" (removed) or "+" (added), and text
+    includes the line ending unless the line is the last of a file with no final newline."""
+
+    def __init__(self, header: str, old_start: int):
+        self.header = header
+        self.old_start = old_start
+        self.lines: List[Tuple[str, str]] = []
+
+    def old_lines(self, fuzz: int = 0) -> Tuple[int, List[str]]:
+        """The lines this hunk expects to find, without up to fuzz context lines at either end,
+        and how many leading lines were dropped."""
+        lines = [text for kind, text in self.lines if kind != "+"]
+        leading = _context_run(self.lines, fuzz)
+        trailing = _context_run(list(reversed(self.lines)), fuzz)
+        return leading, lines[leading : len(lines) - trailing]
+
+    def new_lines(self, fuzz: int = 0) -> List[str]:
+        """The lines this hunk replaces old_lines(fuzz) with."""
+        lines = [text for kind, text in self.lines if kind != "-"]
+        leading = _context_run(self.lines, fuzz)
+        trailing = _context_run(list(reversed(self.lines)), fuzz)
+        return lines[leading : len(lines) - trailing]
+
+
+class FilePatch:
+    """The hunks of a unified diff that apply to one file. creates is set for a file the diff
+    adds, which has no original to patch."""
+
+    def __init__(self, path: str, creates: bool):
+        self.path = path
+        self.creates = creates
+        self.hunks: List[Hunk] = []
+
+
+def is_unified(patch_data: str) -> bool:
+    """Whether patch data is a unified diff rather than the "@@@ filename @@@" format."""
+    return not patch_data.startswith("@@@ ")
+
+
+def _strip_prefix(path: str) -> str:
+    """A path from a "---" or "+++" line, without any timestamp or the a/ or b/ added by git."""
+    path = path.split("\t")[0].strip()
+    if path.startswith(("a/", "b/")):
+        path = path[2:]
+    return path
+
+
+def parse(patch_data: str) -> List[FilePatch]:
+    """Split a unified diff into its files and hunks. Each hunk takes as many lines as the counts
+    in its header call for, as GNU patch does, so a hunk line that looks like a "---" or "+++"
+    line is still part of the hunk. Anything outside the "---", "+++" and hunk lines (a commit
+    message, "diff --git" and "index" lines, the signature of "git format-patch") is ignored."""
+    files: List[FilePatch] = []
+    hunk: Optional[Hunk] = None
+    old_left = new_left = 0  # How many more original and patched lines the current hunk has
+    old_path = None
+    lines = patch_data.splitlines(keepends=True)
+    for number, line in enumerate(lines, start=1):
+        if hunk is not None and line.startswith("\\"):
+            # "\ No newline at end of file" applies to the line before it
+            if hunk.lines:
+                kind, text = hunk.lines[-1]
+                hunk.lines[-1] = (kind, text.rstrip("\r\n"))
+        elif old_left or new_left:
+            if line in ("\n", "\r\n"):
+                line = " " + line  # Some editors strip the single space of an empty context line
+            kind = line[:1]
+            if (
+                kind not in (" ", "-", "+")
+                or (kind != "+" and not old_left)
+                or (kind != "-" and not new_left)
+            ):
+                raise ValueError(
+                    f"line {number}: hunk {hunk.header} is shorter than its header says"
+                )
+            hunk.lines.append((kind, line[1:]))
+            old_left -= kind != "+"
+            new_left -= kind != "-"
+        elif line.startswith("--- ") and (number < len(lines) and lines[number].startswith("+++ ")):
+            old_path = _strip_prefix(line[4:])
+            hunk = None
+        elif line.startswith("+++ ") and old_path is not None:
+            new_path = _strip_prefix(line[4:])
+            if new_path == "/dev/null":
+                raise ValueError(f"line {number}: deleting {old_path} is not supported")
+            files.append(FilePatch(new_path, old_path == "/dev/null"))
+            old_path = None
+        elif line.startswith("@@ ") and files:
+            match = _HUNK_HEADER.match(line)
+            if match is None:
+                raise ValueError(f"line {number}: malformed hunk header {line.strip()}")
+            hunk = Hunk(line.strip(), int(match.group(1)))
+            old_left = int(match.group(2) or 1)
+            new_left = int(match.group(4) or 1)
+            files[-1].hunks.append(hunk)
+        else:
+            hunk = None
+    if old_left or new_left:
+        raise ValueError(f"hunk {hunk.header} is shorter than its header says")
+    return files
+
+
+def apply(file_patch: FilePatch, text: str) -> Tuple[str, List[str]]:
+    """Apply the hunks of file_patch to text, returning the patched text and a description of every
+    hunk that did not apply. Lines are compared without their line endings, and lines a hunk adds
+    get the line ending the file already uses."""
+    lines = text.splitlines(keepends=True)
+    newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+    failed = []
+    offset = 0  # How far the hunks applied so far have moved the rest of the file
+    earliest = 0  # Hunks apply in order, so none may start before the end of the previous one
+    for index, hunk in enumerate(file_patch.hunks, start=1):
+        found = _locate(lines, hunk, max(hunk.old_start - 1, 0) + offset, earliest)
+        if found is None:
+            failed.append(
+                f"{file_patch.path}: hunk {index} of {len(file_patch.hunks)} ({hunk.header})"
+            )
+            continue
+        start, fuzz = found
+        skipped, old = hunk.old_lines(fuzz)
+        new = [_with_newline(line, newline) for line in hunk.new_lines(fuzz)]
+        if start + len(old) < len(lines) and new and not new[-1].endswith("\n"):
+            new[-1] += newline  # Only the last line of the file may lack a line ending
+        lines[start : start + len(old)] = new
+        # Later hunks are displaced by as much as this one was, plus the lines it added or removed
+        offset = (start - skipped) - max(hunk.old_start - 1, 0) + len(new) - len(old)
+        earliest = start + len(new)
+    return "".join(lines), failed
+
+
+def _locate(
+    lines: List[str], hunk: Hunk, expected: int, earliest: int
+) -> Optional[Tuple[int, int]]:
+    """Where in lines the hunk applies, as (first line, fuzz needed), trying the least fuzz first
+    and, for each amount of fuzz, the nearest position to expected first."""
+    for fuzz in range(FUZZ + 1):
+        skipped, old = hunk.old_lines(fuzz)
+        if fuzz and not old:
+            break  # Nothing left to match against
+        wanted = [line.rstrip("\r\n") for line in old]
+        target = expected + skipped
+        for distance in range(MAX_OFFSET + 1):
+            for start in (target - distance, target + distance) if distance else (target,):
+                if start < earliest or start + len(wanted) > len(lines):
+                    continue
+                if all(lines[start + i].rstrip("\r\n") == wanted[i] for i in range(len(wanted))):
+                    return start, fuzz
+    return None
+
+
+def _context_run(lines: List[Tuple[str, str]], limit: int) -> int:
+    """How many of the first lines (at most limit) are context."""
+    count = 0
+    for kind, _ in lines[:limit]:
+        if kind != " ":
+            break
+        count += 1
+    return count
+
+
+def _with_newline(line: str, newline: str) -> str:
+    if line.endswith("\r\n"):
+        return line[:-2] + newline
+    if line.endswith("\n"):
+        return line[:-1] + newline
+    return line